@@ -0,0 +1,46 @@
+"""
+Gunicorn settings for the Mini-App API
+
+    gunicorn -c api/gunicorn.conf.py api.wsgi:app
+
+Threaded workers suit these routes: each request spends most of its time waiting on the
+database, and a worker's threads share its connection pool (keep API_THREADS at or below
+DB_POOL_SIZE + DB_MAX_OVERFLOW).
+
+Graceful reload: `kill -HUP <master pid>` starts fresh workers and lets the old ones
+finish their requests (up to API_GRACEFUL_TIMEOUT). Because the app is preloaded,
+new code needs a restart or `kill -USR2` (re-exec the master) followed by `kill -QUIT`
+of the old master.
+"""
+import os
+import multiprocessing
+
+bind = f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', '5000')}"
+
+workers = int(os.getenv('API_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.getenv('API_THREADS', 4))
+backlog = int(os.getenv('API_BACKLOG', 2048))
+
+# Import the app (and create the schema, run migrations) once in the master
+preload_app = True
+
+# Keep idle connections from the tunnel/proxy open between a Mini-App's requests
+keepalive = int(os.getenv('API_KEEPALIVE', 5))
+timeout = int(os.getenv('API_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('API_GRACEFUL_TIMEOUT', 30))
+
+# Recycle workers now and then so slow leaks can't accumulate
+max_requests = int(os.getenv('API_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.getenv('API_MAX_REQUESTS_JITTER', 500))
+
+accesslog = os.getenv('API_ACCESS_LOG') or None  # '-' for stdout
+errorlog = '-'
+loglevel = os.getenv('API_LOG_LEVEL', 'info')
+proc_name = 'law-firm-api'
+
+
+def post_fork(server, worker):
+    # Connections opened by the preloaded master must not be shared with workers
+    from api.wsgi import after_fork
+    after_fork()
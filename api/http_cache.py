@@ -0,0 +1,124 @@
+"""
+HTTP Caching & Compression
+Strong ETags derived from the data a route depends on, so a matching If-None-Match is
+answered 304 before any JSON is built, and gzip/brotli compression of larger responses
+negotiated from Accept-Encoding.
+"""
+import os
+import gzip
+import hashlib
+
+from flask import request, make_response
+
+from api.serialization import json_response
+
+try:
+    import brotli
+except ImportError:  # optional: without it responses are gzip-compressed only
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv('API_COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.getenv('API_GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('API_BROTLI_QUALITY', 5))
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript')
+
+# A compressed representation gets its own strong ETag: "<etag>-<encoding>"
+_ENCODING_SUFFIXES = ('-br', '-gzip')
+
+
+def compute_etag(version):
+    """ETag for the requested URL given the version of the data behind it.
+
+    `version` is any value whose repr changes when the response would: row values,
+    an updated_at watermark, counts, etc.
+    """
+    key = repr((request.path, request.query_string, version)).encode()
+    return hashlib.blake2b(key, digest_size=16).hexdigest()
+
+
+def _client_etags():
+    """{ETag without encoding suffix: ETag as the client sent it} from If-None-Match"""
+    tags = {}
+    for tag in request.headers.get('If-None-Match', '').split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        base = tag
+        for suffix in _ENCODING_SUFFIXES:
+            if tag.endswith(suffix):
+                base = tag[:-len(suffix)]
+                break
+        if base:
+            tags[base] = tag
+    return tags
+
+
+def conditional_json(version, build):
+    """304 if the client already has this version, else json_response(build()); both carry the
+    ETag of the representation the client holds (compress_response suffixes a 200's)"""
+    etag = compute_etag(version)
+    tags = _client_etags()
+    if etag in tags or '*' in tags:
+        response = make_response('', 304)
+        # The stored (possibly compressed) response keeps the ETag it was served with
+        response.set_etag(tags.get(etag, etag))
+        response.vary.add('Accept-Encoding')
+    else:
+        response = json_response(build())
+        response.set_etag(etag)
+    # Clients may keep the body but must revalidate before using it
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _negotiate(accept_encoding):
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    wildcard = accepted.get('*', 0)
+    if brotli is not None and accepted.get('br', wildcard) > 0:
+        return 'br'
+    if accepted.get('gzip', wildcard) > 0:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """after_request hook: compress bodies of COMPRESS_MIN_BYTES or more when the client accepts it"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    encoding = _negotiate(request.headers.get('Accept-Encoding', ''))
+    if encoding is None:
+        return response
+
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+
+def init_compression(app):
+    """Compress the app's responses (see compress_response)"""
+    app.after_request(compress_response)
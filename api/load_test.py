@@ -0,0 +1,168 @@
+"""
+API Load Test
+A small wrk-style load generator: many concurrent keep-alive HTTP/1.1 connections replay
+the Mini-App's startup requests against a running API and report throughput and latency
+percentiles per route. Plain asyncio streams keep the client cheap enough not to be the
+bottleneck on the same machine.
+
+    gunicorn -c api/gunicorn.conf.py api.wsgi:app &
+    python -m api.load_test --url http://127.0.0.1:5000 --telegram-id 123 --concurrency 50
+
+--revalidate sends If-None-Match with the ETag from each route's first response, the
+way the Mini-App does on reopen.
+"""
+import ssl
+import time
+import asyncio
+import argparse
+import statistics
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+ROUTES = (
+    '/api/bootstrap/{telegram_id}',
+    '/api/user/{telegram_id}',
+    '/api/cases/{telegram_id}',
+    '/api/agenda/{telegram_id}',
+    '/api/stats/{telegram_id}',
+    '/api/notifications',
+    '/api/staff',
+)
+
+
+def _percentile(samples, share):
+    return samples[min(len(samples) - 1, int(len(samples) * share))]
+
+
+class _Connection:
+    """One keep-alive HTTP/1.1 connection (reopened when the server closes it)"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == 'https' else None
+        self.host_header = parts.netloc
+        self.reader = self.writer = None
+
+    async def get(self, path, headers=None):
+        """(status, headers, body) for a GET"""
+        reused = self.writer is not None
+        if not reused:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        lines = [f"GET {path} HTTP/1.1", f"Host: {self.host_header}", "Accept-Encoding: gzip"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+
+        try:
+            status_line = await self.reader.readuntil(b'\r\n')
+        except asyncio.IncompleteReadError as e:
+            if not reused or e.partial:
+                raise
+            # The server closed an idle keep-alive connection (e.g. a recycled worker):
+            # retry on a new one, as browsers do
+            self.close()
+            return await self.get(path, headers)
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding') == 'chunked':
+            body = b''
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                body += chunk[:-2]
+        else:
+            body = await self.reader.readexactly(int(response_headers.get('content-length', 0)))
+
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, response_headers, body
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def run(url, telegram_id, concurrency, duration, revalidate):
+    paths = [route.format(telegram_id=telegram_id) for route in ROUTES]
+    latencies = defaultdict(list)
+    statuses = defaultdict(int)
+    received = 0
+    etags = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset):
+        nonlocal received
+        connection = _Connection(url)
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            headers = {'If-None-Match': etags[path]} if revalidate and path in etags else None
+            started = time.perf_counter()
+            try:
+                status, response_headers, body = await connection.get(path, headers)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                statuses['error'] += 1
+                connection.close()
+                continue
+            latencies[path].append(time.perf_counter() - started)
+            statuses[status] += 1
+            received += len(body)
+            if status == 200 and 'etag' in response_headers:
+                etags.setdefault(path, response_headers['etag'])
+        connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    everything = sorted(sample for samples in latencies.values() for sample in samples)
+    return {
+        'requests': len(everything),
+        'elapsed_s': round(elapsed, 2),
+        'requests_per_s': round(len(everything) / elapsed, 1),
+        'p50_ms': round(_percentile(everything, 0.50) * 1000, 1) if everything else None,
+        'p95_ms': round(_percentile(everything, 0.95) * 1000, 1) if everything else None,
+        'p99_ms': round(_percentile(everything, 0.99) * 1000, 1) if everything else None,
+        'kb_received': round(received / 1024, 1),
+        'statuses': dict(statuses),
+        'routes': {
+            path: {
+                'requests': len(samples),
+                'p50_ms': round(statistics.median(samples) * 1000, 1),
+                'p95_ms': round(_percentile(sorted(samples), 0.95) * 1000, 1),
+            }
+            for path, samples in latencies.items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--telegram-id', type=int, required=True, help="an onboarded user's Telegram id")
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20, help="seconds")
+    parser.add_argument('--revalidate', action='store_true', help="send If-None-Match like a returning Mini-App")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.telegram_id, args.concurrency, args.duration, args.revalidate))
+    routes = result.pop('routes')
+    print('total :', result)
+    for path, row in sorted(routes.items()):
+        print(f"  {path:<28}", row)
+
+
+if __name__ == '__main__':
+    main()
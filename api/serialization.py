@@ -0,0 +1,129 @@
+"""
+JSON Serialization
+Fast response encoding for the Mini-App API: payloads are built from column-only query
+rows mapped to dicts in bulk, with datetimes left as-is, and encoded by orjson (which
+writes datetimes as ISO 8601 itself). Falls back to the standard library when orjson
+is not installed.
+
+    python -m api.serialization [rows]  - before/after cost of /api/staff and /api/cases
+"""
+import json
+from datetime import date, datetime
+
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is used instead
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    """Encode a payload to JSON bytes (datetimes as ISO 8601)"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode()
+
+
+def json_response(payload, status=200):
+    """Flask response with `payload` encoded by dumps()"""
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
+
+
+def rows_to_dicts(rows, fields):
+    """[{field: value}] for column-only query rows (or namedtuples) selected in `fields` order"""
+    return [dict(zip(fields, row)) for row in rows]
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    import time
+    import statistics
+    from datetime import timedelta
+
+    import tempfile
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    # A throwaway file database (the pool rebuilds its engine, which would empty a :memory: one)
+    os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkdtemp()}/serialization_bench.db"
+    from flask import jsonify
+    from api.server import app, db, _staff_payload, _cases_payload
+    from database.models import User, Case
+    from database.case_list import MAX_PAGE_SIZE
+
+    session = db.session()
+    now = datetime.utcnow()
+    session.bulk_insert_mappings(User, [
+        {'telegram_id': 10 ** 6 + i, 'full_name': f'Staff {i}', 'position': 'Associate', 'departments': 'Litigation',
+         'status': 'active', 'last_seen': now - timedelta(minutes=i % 30), 'latitude': 6.5, 'longitude': 3.4}
+        for i in range(rows)
+    ])
+    owner = session.query(User.id).filter_by(telegram_id=10 ** 6).scalar()
+    session.bulk_insert_mappings(Case, [
+        {'case_number': f'BENCH-{i}', 'title': 'Benchmark matter', 'client_name': 'Client', 'case_type': 'civil',
+         'status': 'active', 'priority': 'normal', 'assigned_to': owner, 'filing_date': now,
+         'deadline': now + timedelta(days=30), 'updated_at': now - timedelta(minutes=i)}
+        for i in range(rows)
+    ])
+    session.commit()
+    user = session.get(User, owner)
+
+    # The previous implementation: full ORM entities, per-field isoformat(), jsonify
+    def staff_before():
+        users = session.query(User).filter_by(status='active').all()
+        return jsonify({'staff': [{
+            'id': u.id, 'full_name': u.full_name, 'position': u.position, 'departments': u.departments,
+            'photo_file_id': u.photo_file_id, 'latitude': u.latitude, 'longitude': u.longitude,
+            'last_seen': u.last_seen.isoformat() if u.last_seen else None,
+            'is_online': (now - u.last_seen).total_seconds() < 300 if u.last_seen else False,
+        } for u in users]})
+
+    def cases_before():
+        cases = session.query(Case).filter_by(assigned_to=owner).all()
+        return jsonify({'cases': [{
+            'id': c.id, 'case_number': c.case_number, 'title': c.title, 'client_name': c.client_name,
+            'case_type': c.case_type, 'status': c.status, 'priority': c.priority,
+            'filing_date': c.filing_date.isoformat() if c.filing_date else None,
+            'next_court_date': c.next_court_date.isoformat() if c.next_court_date else None,
+            'deadline': c.deadline.isoformat() if c.deadline else None,
+        } for c in cases]})
+
+    def cases_after():
+        # Pages are capped at MAX_PAGE_SIZE, so walk them all to serialize the same rows
+        pages = []
+        cursor = None
+        while True:
+            payload = _cases_payload(session, user, cursor, limit=MAX_PAGE_SIZE)
+            pages.append(json_response(payload))
+            cursor = payload['next_cursor']
+            if not cursor:
+                return pages
+
+    def timed(build, repeat=7):
+        samples = []
+        for _ in range(repeat):
+            session.expunge_all()
+            started = time.perf_counter()
+            responses = build()
+            samples.append(time.perf_counter() - started)
+        if not isinstance(responses, list):
+            responses = [responses]
+        return statistics.median(samples) * 1000, sum(len(r.get_data()) for r in responses)
+
+    encoder = 'orjson' if orjson is not None else 'json'
+    with app.app_context():
+        for name, before, after in (
+            ('/api/staff', staff_before, lambda: json_response(_staff_payload(session))),
+            ('/api/cases', cases_before, cases_after),
+        ):
+            before_ms, before_size = timed(before)
+            after_ms, after_size = timed(after)
+            print(f"{name:<12} {rows} rows: before {before_ms:7.1f} ms ({before_size} B), "
+                  f"after ({encoder}) {after_ms:7.1f} ms ({after_size} B), {before_ms / after_ms:.1f}x")
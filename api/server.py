@@ -10,168 +10,353 @@ import os
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from database.models import init_db, get_session, User, Case, CourtDate, ComplianceTask, TimeEntry, Notification
+from database.models import User, Notification
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from database.pool import init_pool
+from database.document_index import get_document_index
+from database.agenda import load_agenda, agenda_version
+from database.dashboard_stats import dashboard_stats
+from database.billing_rollups import create_tables as create_billing_rollups
+from database.case_list import load_case_page, count_cases, case_list_version, decode_cursor, MAX_PAGE_SIZE
+from database.presence import get_presence_tracker
+from api.http_cache import conditional_json, init_compression
+from api.serialization import json_response, rows_to_dicts
+from bot.push import get_push_hub
+from sqlalchemy import func, inspect as sa_inspect
 import os
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for Mini-App access
+CORS(app, expose_headers=['ETag'])  # Enable CORS for Mini-App access
+init_compression(app)
+
+# Initialize database (shared pool, one session per request)
+db = init_pool()
+db.init_flask(app)
+engine = db.engine
+document_index = get_document_index(engine.url)
+create_billing_rollups(engine)  # dashboard stats read the rollup tables; the bot writes them
+presence = get_presence_tracker(engine)  # staff online status, answered from memory
+push_hub = get_push_hub(engine)  # events for open Mini-Apps, streamed by the bot's webhook server
+
+# Where open Mini-Apps subscribe to pushed events (the bot's webhook server); relative URLs
+# resolve against the API's origin. Unset when nothing serves the stream: clients don't connect
+PUSH_EVENTS_URL = os.getenv('PUSH_EVENTS_URL') or None
+
+# Cases per /api/cases page unless ?limit= asks for fewer/more (capped at MAX_PAGE_SIZE)
+CASES_PAGE_SIZE = int(os.getenv('API_CASES_PAGE_SIZE', 50))
+
+def _user_payload(user):
+    """Serialize a user's profile for the Mini-App"""
+    return {
+        'id': user.id,
+        'telegram_id': user.telegram_id,
+        'full_name': user.full_name,
+        'email': user.email,
+        'phone': user.phone,
+        'departments': user.departments,
+        'position': user.position,
+        'role': user.role,
+        'address': user.address,
+        'photo_file_id': user.photo_file_id,
+        'latitude': user.latitude,
+        'longitude': user.longitude,
+        'last_seen': user.last_seen,
+        'status': user.status
+    }
+
+
+# Payload keys, in the column order of the rows they are mapped from
+CASE_FIELDS = ('id', 'case_number', 'title', 'client_name', 'case_type', 'status', 'priority',
+               'filing_date', 'next_court_date', 'deadline')
+COURT_DATE_FIELDS = ('id', 'case_number', 'court_name', 'hearing_date', 'purpose')
+TASK_FIELDS = ('id', 'title', 'due_date', 'status')
+TIME_ENTRY_FIELDS = ('id', 'duration', 'description', 'date')
+NOTIFICATION_FIELDS = ('id', 'title', 'message', 'notification_type', 'priority', 'created_at')
+STAFF_FIELDS = ('id', 'full_name', 'position', 'departments', 'photo_file_id', 'latitude', 'longitude', 'last_seen')
+
+
+def _cases_payload(session, user, cursor=None, direction='next', limit=CASES_PAGE_SIZE):
+    """Build one page of the cases section for a user (most recently updated first)"""
+    page = load_case_page(session, assigned_to=user.id, cursor=cursor, direction=direction, limit=limit)
+
+    return {
+        'cases': rows_to_dicts(page.cases, CASE_FIELDS),
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    }
+
+
+def _agenda_payload(session, user, agenda=None):
+    """Build the agenda section (court dates, tasks, time entries) for a user"""
+    agenda = agenda or load_agenda(session, user.id)
+
+    return {
+        'court_dates': rows_to_dicts(agenda.court_dates, COURT_DATE_FIELDS),
+        'tasks': rows_to_dicts(agenda.tasks, TASK_FIELDS),
+        'time_entries': rows_to_dicts(agenda.time_entries, TIME_ENTRY_FIELDS),
+        'total_hours': agenda.total_hours
+    }
+
+
+def _stats_payload(session, user, stats=None):
+    """Build the dashboard counters section (shared, briefly cached per user)"""
+    stats = stats or dashboard_stats.get(session, user.id)
+
+    return {
+        'active_cases': stats.active_cases,
+        'time_entries_today': stats.time_entries_today,
+        'court_dates_week': stats.court_dates_week,
+        'pending_leave': stats.pending_leave,
+        'billable_hours_month': round(stats.billable_hours_month, 2),
+    }
+
+
+def _notifications_since():
+    # Notifications from the last 48 hours
+    return datetime.utcnow() - timedelta(hours=48)
+
+
+def _notifications_payload(session):
+    """Build the latest notifications section"""
+    notifications = session.query(
+        Notification.id, Notification.title, Notification.message, Notification.notification_type,
+        Notification.priority, Notification.created_at
+    ).filter(
+        Notification.created_at >= _notifications_since()
+    ).order_by(
+        Notification.created_at.desc()
+    ).limit(20).all()
+
+    return {'notifications': rows_to_dicts(notifications, NOTIFICATION_FIELDS)}
+
+
+def _staff_rows(session):
+    """Columns of all active users shown in the staff section, with last_seen from the
+    presence tracker (to the minute, so each request's own activity doesn't change the ETag)"""
+    seen = presence.snapshot()
+    return [
+        (*row, seen[row.id].replace(second=0, microsecond=0) if row.id in seen else None)
+        for row in session.query(
+            User.id, User.full_name, User.position, User.departments, User.photo_file_id,
+            User.latitude, User.longitude
+        ).filter_by(status='active')
+    ]
+
+
+def _staff_online(users, now=None):
+    """Online flag per staff row (active within the presence tracker's window)"""
+    now = now or datetime.utcnow()
+    return [presence.is_online(row[0], now) for row in users]
+
+
+def _staff_payload(session, users=None):
+    """Build the staff section with online status"""
+    users = users if users is not None else _staff_rows(session)
+
+    staff = rows_to_dicts(users, STAFF_FIELDS)
+    for member, online in zip(staff, _staff_online(users)):
+        member['is_online'] = online
+
+    return {'staff': staff}
+
+
+def _active_user(session, telegram_id):
+    """The User for a Mini-App request (None if unknown), recording their activity"""
+    user = session.query(User).filter_by(telegram_id=telegram_id).first()
+    if user:
+        presence.touch(user.id)
+    return user
+
+
+# --- Section versions ---
+# Each returns (version, build): `version` changes whenever the section's JSON would, and
+# is cheap to compute, so conditional_json() can answer 304 without building the payload.
+
+def _user_section(session, user):
+    version = tuple(getattr(user, attr.key) for attr in sa_inspect(user).mapper.column_attrs)
+    return version, lambda: _user_payload(user)
+
+
+def _cases_section(session, user, cursor=None, direction='next', limit=CASES_PAGE_SIZE):
+    version = case_list_version(session, assigned_to=user.id)
+    return version, lambda: _cases_payload(session, user, cursor, direction, limit)
+
+
+def _agenda_section(session, user):
+    now = datetime.now()
+    version = agenda_version(session, user.id, now=now)
+    return version, lambda: _agenda_payload(session, user, load_agenda(session, user.id, now=now))
+
+
+def _stats_section(session, user):
+    stats = dashboard_stats.get(session, user.id)
+    # The counters only: computed_at changes whenever a cache entry is refreshed
+    return stats._replace(computed_at=None), lambda: _stats_payload(session, user, stats)
+
+
+def _notifications_section(session):
+    # Notifications are created and deleted, never edited
+    version = tuple(session.query(func.count(Notification.id), func.max(Notification.id)).filter(
+        Notification.created_at >= _notifications_since()
+    ).one())
+    return version, lambda: _notifications_payload(session)
+
+
+def _staff_section(session):
+    users = _staff_rows(session)
+    return (users, tuple(_staff_online(users))), lambda: _staff_payload(session, users)
+
+
+# Sections served by /api/bootstrap; the user-scoped ones need a resolved User
+BOOTSTRAP_SECTIONS = ('user', 'cases', 'agenda', 'stats', 'notifications', 'staff')
+USER_SECTIONS = ('user', 'cases', 'agenda', 'stats')
+
+
+@app.route('/api/bootstrap/<int:telegram_id>', methods=['GET'])
+def get_bootstrap(telegram_id):
+    """Get everything the Mini-App needs on startup in one round trip.
+
+    Optional ``?sections=cases,agenda`` limits the response to those sections.
+    Each section has the same shape as its standalone route; user-scoped
+    sections are null when the user has not onboarded yet. ``events_url`` is
+    where to subscribe to pushed events, or null when push is unavailable.
+    """
+    requested = request.args.get('sections')
+    if requested:
+        sections = [s.strip() for s in requested.split(',') if s.strip()]
+        unknown = [s for s in sections if s not in BOOTSTRAP_SECTIONS]
+        if unknown:
+            return jsonify({'error': f"Unknown sections: {', '.join(unknown)}"}), 400
+    else:
+        sections = list(BOOTSTRAP_SECTIONS)
+
+    session = db.session()
+    try:
+        user = None
+        if any(s in USER_SECTIONS for s in sections):
+            user = _active_user(session, telegram_id)
+
+        parts = []
+        for section in sections:
+            if section in USER_SECTIONS and not user:
+                parts.append((section, None, lambda: None))
+            elif section == 'user':
+                parts.append((section, *_user_section(session, user)))
+            elif section == 'cases':
+                parts.append((section, *_cases_section(session, user)))
+            elif section == 'agenda':
+                parts.append((section, *_agenda_section(session, user)))
+            elif section == 'stats':
+                parts.append((section, *_stats_section(session, user)))
+            elif section == 'notifications':
+                parts.append((section, *_notifications_section(session)))
+            elif section == 'staff':
+                parts.append((section, *_staff_section(session)))
+
+        return conditional_json(
+            (PUSH_EVENTS_URL, *((section, version) for section, version, _ in parts)),
+            lambda: {'events_url': PUSH_EVENTS_URL, **{section: build() for section, _, build in parts}}
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-# Initialize database
-engine = init_db()
 
 @app.route('/api/user/<int:telegram_id>', methods=['GET'])
 def get_user(telegram_id):
     """Get user profile data"""
-    session = get_session(engine)
+    session = db.session()
     try:
-        user = session.query(User).filter_by(telegram_id=telegram_id).first()
+        user = _active_user(session, telegram_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        return jsonify({
-            'id': user.id,
-            'telegram_id': user.telegram_id,
-            'full_name': user.full_name,
-            'email': user.email,
-            'phone': user.phone,
-            'departments': user.departments,
-            'position': user.position,
-            'role': user.role,
-            'address': user.address,
-            'photo_file_id': user.photo_file_id,
-            'latitude': user.latitude,
-            'longitude': user.longitude,
-            'last_seen': user.last_seen.isoformat() if user.last_seen else None,
-            'status': user.status
-        })
+        return conditional_json(*_user_section(session, user))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        session.close()
 
 @app.route('/api/cases/<int:telegram_id>', methods=['GET'])
 def get_cases(telegram_id):
-    """Get user's cases"""
-    session = get_session(engine)
+    """Get a page of the user's cases.
+
+    ``?cursor=`` continues from a previous page's ``next_cursor`` (or ``prev_cursor``
+    with ``&direction=prev``); ``?limit=`` sets the page size, at most MAX_PAGE_SIZE.
+    """
+    try:
+        limit = min(int(request.args.get('limit', CASES_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    direction = request.args.get('direction', 'next')
+    if direction not in ('next', 'prev'):
+        return jsonify({'error': "direction must be 'next' or 'prev'"}), 400
+    cursor = request.args.get('cursor')
+    try:
+        if cursor:
+            decode_cursor(cursor)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    session = db.session()
     try:
-        user = session.query(User).filter_by(telegram_id=telegram_id).first()
+        user = _active_user(session, telegram_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        cases = session.query(Case).filter_by(assigned_to=user.id).all()
+        return conditional_json(*_cases_section(session, user, cursor, direction, limit))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/cases/<int:telegram_id>/count', methods=['GET'])
+def get_case_count(telegram_id):
+    """Get the number of cases assigned to the user"""
+    session = db.session()
+    try:
+        user = _active_user(session, telegram_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
         
-        return jsonify({
-            'cases': [{
-                'id': c.id,
-                'case_number': c.case_number,
-                'title': c.title,
-                'client_name': c.client_name,
-                'case_type': c.case_type,
-                'status': c.status,
-                'priority': c.priority,
-                'filing_date': c.filing_date.isoformat() if c.filing_date else None,
-                'next_court_date': c.next_court_date.isoformat() if c.next_court_date else None,
-                'deadline': c.deadline.isoformat() if c.deadline else None,
-            } for c in cases]
-        })
+        return jsonify({'count': count_cases(session, assigned_to=user.id)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        session.close()
 
 @app.route('/api/agenda/<int:telegram_id>', methods=['GET'])
 def get_agenda(telegram_id):
     """Get user's agenda (court dates, tasks, time entries)"""
-    session = get_session(engine)
+    session = db.session()
     try:
-        user = session.query(User).filter_by(telegram_id=telegram_id).first()
+        user = _active_user(session, telegram_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        today = datetime.now().date()
-        week_from_now = today + timedelta(days=7)
-        
-        # Court Dates
-        court_dates = session.query(CourtDate).join(Case).filter(
-            Case.assigned_to == user.id,
-            CourtDate.hearing_date >= datetime.now(),
-            CourtDate.hearing_date <= datetime.combine(week_from_now, datetime.max.time())
-        ).order_by(CourtDate.hearing_date).all()
-        
-        # Tasks
-        tasks = session.query(ComplianceTask).filter(
-            ComplianceTask.assigned_to == user.id,
-            ComplianceTask.status == 'pending'
-        ).all()
-        
-        # Time Entries (Today)
-        time_entries = session.query(TimeEntry).filter(
-            TimeEntry.user_id == user.id,
-            func.date(TimeEntry.date) == today
-        ).all()
-        
-        return jsonify({
-            'court_dates': [{
-                'id': cd.id,
-                'case_number': cd.case.case_number,
-                'court_name': cd.court_name,
-                'hearing_date': cd.hearing_date.isoformat(),
-                'purpose': cd.purpose
-            } for cd in court_dates],
-            'tasks': [{
-                'id': t.id,
-                'title': t.title,
-                'due_date': t.due_date.isoformat() if t.due_date else None,
-                'status': t.status
-            } for t in tasks],
-            'time_entries': [{
-                'id': te.id,
-                'duration': te.duration_minutes / 60,  # Convert to hours
-                'description': te.description,
-                'date': te.date.isoformat()
-            } for te in time_entries],
-            'total_hours': sum(te.duration_minutes for te in time_entries) / 60
-        })
+        return conditional_json(*_agenda_section(session, user))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/stats/<int:telegram_id>', methods=['GET'])
+def get_stats(telegram_id):
+    """Get user's dashboard counters"""
+    session = db.session()
+    try:
+        user = _active_user(session, telegram_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+
+        return conditional_json(*_stats_section(session, user))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        session.close()
 
 @app.route('/api/notifications', methods=['GET'])
 def get_notifications():
     """Get latest notifications"""
-    session = get_session(engine)
+    session = db.session()
     try:
-        # Filter notifications from the last 48 hours
-        forty_eight_hours_ago = datetime.utcnow() - timedelta(hours=48)
-        
-        notifications = session.query(Notification).filter(
-            Notification.created_at >= forty_eight_hours_ago
-        ).order_by(
-            Notification.created_at.desc()
-        ).limit(20).all()
-        
-        return jsonify({
-            'notifications': [{
-                'id': n.id,
-                'title': n.title,
-                'message': n.message,
-                'notification_type': n.notification_type,
-                'priority': n.priority,
-                'created_at': n.created_at.isoformat()
-            } for n in notifications]
-        })
+        return conditional_json(*_notifications_section(session))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        session.close()
 
 @app.route('/api/notifications/<int:notification_id>', methods=['DELETE'])
 def delete_notification(notification_id):
     """Delete a notification"""
-    session = get_session(engine)
+    session = db.session()
     try:
         notification = session.query(Notification).get(notification_id)
         if not notification:
@@ -179,42 +364,70 @@ def delete_notification(notification_id):
             
         session.delete(notification)
         session.commit()
+        push_hub.publish('notification_deleted', {'id': notification_id})
         return jsonify({'success': True})
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 500
-    finally:
-        session.close()
 
 @app.route('/api/staff', methods=['GET'])
 def get_staff():
     """Get all staff members with status"""
-    session = get_session(engine)
+    session = db.session()
     try:
-        # Get all active users
-        users = session.query(User).filter_by(status='active').all()
-        
-        # Determine online status (last seen within 5 minutes)
-        now = datetime.utcnow()
-        
-        return jsonify({
-            'staff': [{
-                'id': u.id,
-                'full_name': u.full_name,
-                'position': u.position,
-                'departments': u.departments,
-                'photo_file_id': u.photo_file_id,
-                'latitude': u.latitude,
-                'longitude': u.longitude,
-                'last_seen': u.last_seen.isoformat() if u.last_seen else None,
-                'is_online': (now - u.last_seen).total_seconds() < 300 if u.last_seen else False
-            } for u in users]
+        return conditional_json(*_staff_section(session))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/documents/search/<int:telegram_id>', methods=['GET'])
+def search_documents(telegram_id):
+    """Full-text search over uploaded documents, for onboarded users who aren't blocked
+    (the same rule as /searchdocs).
+
+    Query params: ``q`` (required), ``page`` (default 1), ``per_page`` (default 10, max 100).
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing search query (q)'}), 400
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 10))
+    except ValueError:
+        return jsonify({'error': 'page and per_page must be integers'}), 400
+
+    session = db.session()
+    try:
+        user = _active_user(session, telegram_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        if user.status == 'blocked':
+            return jsonify({'error': 'Access denied'}), 403
+
+        results = document_index.search(query, page=page, per_page=per_page)
+        return json_response({
+            'query': results.query,
+            'total': results.total,
+            'page': results.page,
+            'per_page': results.per_page,
+            'results': [{
+                'id': hit.document_id,
+                'filename': hit.filename,
+                'file_type': hit.file_type,
+                'uploaded_by': hit.uploaded_by,
+                'indexed_at': hit.indexed_at,
+                'snippet': hit.snippet,
+                'score': hit.score
+            } for hit in results.hits]
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        session.close()
+
+@app.route('/api/metrics/pool', methods=['GET'])
+def get_pool_metrics():
+    """Get database pool occupancy and checkout/wait metrics"""
+    return jsonify(db.pool_metrics())
 
 if __name__ == '__main__':
+    # Development server only; production runs `gunicorn -c api/gunicorn.conf.py api.wsgi:app`
     port = int(os.getenv('API_PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
+    app.run(host='0.0.0.0', port=port, debug=os.getenv('API_DEBUG', '0') == '1')
@@ -0,0 +1,17 @@
+"""
+Production WSGI Entry Point
+The Mini-App API for a multi-worker server:
+
+    gunicorn -c api/gunicorn.conf.py api.wsgi:app
+
+Settings (workers, threads, keep-alive, timeouts) live in api/gunicorn.conf.py and are
+tuned with API_* environment variables. The app is preloaded in the master, so the
+schema setup and migrations in init_pool() run once rather than once per worker.
+"""
+from api.server import app, db, document_index
+
+
+def after_fork():
+    """Give a freshly forked worker its own database connections"""
+    db.after_fork()
+    document_index.reset_connections()
@@ -0,0 +1,153 @@
+"""
+Shared AI Client
+One AsyncOpenAI client per process (connection reuse), with a concurrency cap,
+retries with backoff on 429/5xx and per-call latency/token metrics.
+Set OPENAI_BASE_URL to point it at a local stub server.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+
+class AIClientError(Exception):
+    """Raised when the AI service can't produce an answer"""
+
+
+class AIClient:
+    """Async chat-completions client with a semaphore cap and retry policy.
+
+    Settings default to OPENAI_MAX_CONCURRENCY, OPENAI_MAX_RETRIES and OPENAI_TIMEOUT.
+    """
+
+    def __init__(self, api_key=None, base_url=None, max_concurrency=None,
+                 max_retries=None, timeout=None, backoff_base=1.0, backoff_max=30.0):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency or int(os.getenv('OPENAI_MAX_CONCURRENCY', 4))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('OPENAI_MAX_RETRIES', 3))
+        self.timeout = timeout or float(os.getenv('OPENAI_TIMEOUT', 60))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client = None
+        self._slots = None
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def configured(self):
+        return bool(self.api_key or os.getenv('OPENAI_API_KEY'))
+
+    def _get_client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(
+                api_key=self.api_key or os.getenv('OPENAI_API_KEY'),
+                base_url=self.base_url or os.getenv('OPENAI_BASE_URL') or None,
+                timeout=self.timeout,
+                max_retries=0,  # retries are handled here so they count against our metrics
+            )
+        return self._client
+
+    def _retry_delay(self, attempt, error):
+        # Honour Retry-After from 429s when the server sends it
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        delay = self.backoff_base * (2 ** attempt)
+        return min(delay, self.backoff_max) * (0.5 + random.random() / 2)
+
+    @staticmethod
+    def _is_retryable(error):
+        import openai
+        if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+            return True
+        return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+    async def chat(self, messages, model=DEFAULT_MODEL, temperature=0.3, max_tokens=1000):
+        """Run a chat completion and return the reply text ('' if the model sent nothing)"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                return await self._chat_with_retries(messages, model, temperature, max_tokens)
+            finally:
+                self.in_flight -= 1
+
+    async def _chat_with_retries(self, messages, model, temperature, max_tokens):
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = await self._get_client().chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                )
+            except Exception as e:
+                if attempt < self.max_retries and self._is_retryable(e):
+                    delay = self._retry_delay(attempt, e)
+                    attempt += 1
+                    self.retries += 1
+                    logger.warning(f"AI call failed ({e}); retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                self.failures += 1
+                raise AIClientError(str(e)) from e
+
+            self._record(time.perf_counter() - started, getattr(response, 'usage', None))
+            if response and response.choices and response.choices[0].message.content:
+                return response.choices[0].message.content
+            return ""
+
+    def _record(self, latency, usage):
+        self.calls += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+        logger.info(
+            f"AI call took {latency:.2f}s"
+            + (f" ({usage.prompt_tokens} prompt / {usage.completion_tokens} completion tokens)" if usage else "")
+        )
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'retries': self.retries,
+            'in_flight': self.in_flight,
+            'max_concurrency': self.max_concurrency,
+            'avg_latency_s': round(self.total_latency / self.calls, 3) if self.calls else 0.0,
+            'max_latency_s': round(self.max_latency, 3),
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+# Process-wide instance used by the bot handlers
+ai_client = AIClient()
@@ -0,0 +1,197 @@
+"""
+Document Analysis Cache
+Content-addressed store of full extracted text and AI summaries, keyed by SHA-256 of the
+uploaded bytes (Telegram's file_unique_id is a fast pre-check that skips the download).
+Partial (per-chunk) AI results are kept alongside, keyed by a hash of the chunk text.
+Size-bounded with least-recently-used eviction.
+"""
+import os
+import hashlib
+import logging
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import (
+    MetaData, Table, Column, String, Text, Integer, BigInteger, DateTime,
+    select, update, delete, func
+)
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+analysis_cache_table = Table(
+    'document_analysis_cache', metadata,
+    Column('sha256', String(64), primary_key=True),
+    Column('file_unique_id', String(128), index=True),
+    Column('filename', String(255)),
+    Column('document_id', Integer),
+    Column('text_content', Text),
+    Column('ai_summary', Text),
+    Column('chunk_keys', Text),
+    Column('size_bytes', BigInteger, nullable=False),
+    Column('created_at', DateTime, default=datetime.utcnow),
+    Column('last_used_at', DateTime, default=datetime.utcnow, index=True),
+)
+
+chunk_cache_table = Table(
+    'document_chunk_cache', metadata,
+    Column('chunk_key', String(64), primary_key=True),
+    Column('result', Text, nullable=False),
+    Column('size_bytes', BigInteger, nullable=False),
+    Column('created_at', DateTime, default=datetime.utcnow),
+    Column('last_used_at', DateTime, default=datetime.utcnow, index=True),
+)
+
+CachedAnalysis = namedtuple('CachedAnalysis', [
+    'sha256', 'filename', 'document_id', 'text_content', 'ai_summary', 'chunk_keys'
+])
+
+
+def sha256_file(file_path, chunk_size=1024 * 1024):
+    """Hash a file without reading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """Persistent analysis cache in the bot's database.
+
+    Bounded by ANALYSIS_CACHE_MAX_ENTRIES and ANALYSIS_CACHE_MAX_MB (text + summary size);
+    chunk results by ANALYSIS_CHUNK_CACHE_MAX_ENTRIES.
+    """
+
+    def __init__(self, engine, max_entries=None, max_bytes=None, max_chunk_entries=None):
+        self.engine = engine
+        self.max_entries = max_entries or int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', 5000))
+        self.max_bytes = max_bytes or int(float(os.getenv('ANALYSIS_CACHE_MAX_MB', 512)) * 1024 * 1024)
+        self.max_chunk_entries = max_chunk_entries or int(os.getenv('ANALYSIS_CHUNK_CACHE_MAX_ENTRIES', 50000))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.chunk_hits = 0
+        self.chunk_misses = 0
+        # Columns added later come from database.migrations (migration 4: chunk_keys)
+        metadata.create_all(engine)
+
+    def lookup(self, sha256=None, file_unique_id=None):
+        """Find a cached analysis by content hash or Telegram file_unique_id"""
+        t = analysis_cache_table
+        if sha256:
+            condition = t.c.sha256 == sha256
+        elif file_unique_id:
+            condition = t.c.file_unique_id == file_unique_id
+        else:
+            return None
+
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                select(t.c.sha256, t.c.filename, t.c.document_id, t.c.text_content, t.c.ai_summary, t.c.chunk_keys)
+                .where(condition).limit(1)
+            ).first()
+            if row is None:
+                # The file_unique_id pre-check is followed by a hash lookup; count the miss once
+                if sha256:
+                    self.misses += 1
+                return None
+            values = {'last_used_at': datetime.utcnow()}
+            if sha256 and file_unique_id:
+                values['file_unique_id'] = file_unique_id
+            conn.execute(update(t).where(t.c.sha256 == row.sha256).values(**values))
+
+        self.hits += 1
+        return CachedAnalysis(*row[:5], chunk_keys=row.chunk_keys.split() if row.chunk_keys else [])
+
+    def text_excerpt(self, sha256, max_chars):
+        """The first max_chars of a cached document's text ('' if not cached)"""
+        t = analysis_cache_table
+        with self.engine.connect() as conn:
+            excerpt = conn.execute(
+                select(func.substr(t.c.text_content, 1, max_chars)).where(t.c.sha256 == sha256)
+            ).scalar()
+        return excerpt or ''
+
+    def store(self, sha256, file_unique_id, filename, text_content, ai_summary, document_id=None, chunk_keys=None):
+        t = analysis_cache_table
+        size = len(text_content.encode('utf-8')) + len(ai_summary.encode('utf-8'))
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            conn.execute(delete(t).where(t.c.sha256 == sha256))
+            conn.execute(t.insert().values(
+                sha256=sha256, file_unique_id=file_unique_id, filename=filename,
+                document_id=document_id, text_content=text_content, ai_summary=ai_summary,
+                chunk_keys=" ".join(chunk_keys or []),
+                size_bytes=size, created_at=now, last_used_at=now,
+            ))
+            self._evict(conn, t, t.c.sha256, self.max_entries, self.max_bytes)
+
+    def get_chunk(self, chunk_key):
+        """Cached result for one analysis chunk, or None"""
+        return self.get_chunks([chunk_key]).get(chunk_key)
+
+    def get_chunks(self, chunk_keys):
+        """Cached results for several chunks, as {chunk_key: result}"""
+        t = chunk_cache_table
+        if not chunk_keys:
+            return {}
+        with self.engine.begin() as conn:
+            found = dict(conn.execute(
+                select(t.c.chunk_key, t.c.result).where(t.c.chunk_key.in_(chunk_keys))
+            ).all())
+            if found:
+                conn.execute(
+                    update(t).where(t.c.chunk_key.in_(list(found))).values(last_used_at=datetime.utcnow())
+                )
+        self.chunk_hits += len(found)
+        self.chunk_misses += len(set(chunk_keys)) - len(found)
+        return found
+
+    def store_chunk(self, chunk_key, result):
+        t = chunk_cache_table
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            conn.execute(delete(t).where(t.c.chunk_key == chunk_key))
+            conn.execute(t.insert().values(
+                chunk_key=chunk_key, result=result, size_bytes=len(result.encode('utf-8')),
+                created_at=now, last_used_at=now,
+            ))
+            self._evict(conn, t, t.c.chunk_key, self.max_chunk_entries, self.max_bytes)
+
+    def _evict(self, conn, t, key_column, max_entries, max_bytes):
+        count, total = conn.execute(select(func.count(), func.coalesce(func.sum(t.c.size_bytes), 0))).one()
+        if count <= max_entries and total <= max_bytes:
+            return
+
+        # Keep the most recently used entries that fit both bounds
+        keep_total = 0
+        stale = []
+        rows = conn.execute(select(key_column, t.c.size_bytes).order_by(t.c.last_used_at.desc()))
+        for index, row in enumerate(rows):
+            keep_total += row.size_bytes
+            if index >= max_entries or keep_total > max_bytes:
+                stale.append(row[0])
+        if stale:
+            conn.execute(delete(t).where(key_column.in_(stale)))
+            self.evictions += len(stale)
+            logger.info(f"Evicted {len(stale)} entries from {t.name}")
+
+    def stats(self):
+        t = analysis_cache_table
+        with self.engine.connect() as conn:
+            count, total = conn.execute(select(func.count(), func.coalesce(func.sum(t.c.size_bytes), 0))).one()
+            chunks = conn.execute(select(func.count()).select_from(chunk_cache_table)).scalar()
+        return {
+            'entries': count,
+            'size_mb': round(total / (1024 * 1024), 2),
+            'max_entries': self.max_entries,
+            'max_mb': round(self.max_bytes / (1024 * 1024), 2),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'chunk_entries': chunks,
+            'chunk_hits': self.chunk_hits,
+            'chunk_misses': self.chunk_misses,
+        }
@@ -0,0 +1,250 @@
+"""
+Broadcast Dispatcher
+Concurrent fan-out of one message to many chats within Telegram's flood limits:
+a global token bucket, per-chat spacing, RetryAfter handling and per-recipient
+delivery status recorded against the Notification. Only needs bot.send_message,
+so it runs against a fake bot in tests.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, BigInteger, String, Text, DateTime,
+    Index, select, update, func, bindparam
+)
+from telegram.error import RetryAfter, Forbidden, BadRequest, NetworkError
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+delivery_table = Table(
+    'notification_deliveries', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('notification_id', Integer, nullable=False),
+    Column('user_id', Integer),
+    Column('telegram_id', BigInteger, nullable=False),
+    Column('status', String(16), nullable=False, default='pending'),  # pending, sent, failed, blocked
+    Column('attempts', Integer, nullable=False, default=0),
+    Column('error', Text),
+    Column('updated_at', DateTime, default=datetime.utcnow),
+    Index('ix_notification_deliveries_notification_status', 'notification_id', 'status'),
+)
+
+Recipient = namedtuple('Recipient', ['user_id', 'telegram_id'])
+BroadcastResult = namedtuple('BroadcastResult', ['total', 'sent', 'failed', 'blocked', 'elapsed'])
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (flood control from the server)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatLimiter:
+    """Keeps at least `interval` seconds between messages to the same chat"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next_at = {}
+
+    async def wait(self, chat_id):
+        now = time.monotonic()
+        if len(self._next_at) > 10000:
+            self._next_at = {chat: at for chat, at in self._next_at.items() if at > now}
+        ready_at = self._next_at.get(chat_id, now)
+        self._next_at[chat_id] = max(ready_at, now) + self.interval
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+
+def _retry_seconds(error):
+    delay = error.retry_after
+    return delay.total_seconds() if hasattr(delay, 'total_seconds') else float(delay)
+
+
+class BroadcastDispatcher:
+    """Sends one message to many recipients concurrently within rate limits.
+
+    Limits default to BROADCAST_RATE (messages/s overall), BROADCAST_BURST (messages
+    allowed back to back), BROADCAST_CHAT_INTERVAL (seconds between messages to one chat),
+    BROADCAST_CONCURRENCY and BROADCAST_MAX_RETRIES.
+    """
+
+    def __init__(self, engine, rate=None, burst=None, chat_interval=None, concurrency=None,
+                 max_retries=None, progress_interval=3.0, flush_every=50):
+        self.engine = engine
+        self.rate = rate or float(os.getenv('BROADCAST_RATE', 25))
+        # A small burst keeps every one-second window within the rate
+        self.burst = burst or float(os.getenv('BROADCAST_BURST', 1))
+        self.chat_interval = chat_interval if chat_interval is not None else float(os.getenv('BROADCAST_CHAT_INTERVAL', 1.0))
+        self.concurrency = concurrency or int(os.getenv('BROADCAST_CONCURRENCY', 20))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('BROADCAST_MAX_RETRIES', 3))
+        self.progress_interval = progress_interval
+        self.flush_every = flush_every
+        self.bucket = TokenBucket(self.rate, self.burst)
+        self.chats = ChatLimiter(self.chat_interval)
+        metadata.create_all(engine)
+
+    async def send(self, bot, notification_id, recipients, text, parse_mode=None, on_progress=None):
+        """Deliver `text` to every recipient; returns a BroadcastResult.
+
+        Resumable: recipients that already have a final delivery status for this
+        notification (e.g. before a restart) are counted but not messaged again.
+        on_progress(done, total, counts) is awaited at most every progress_interval seconds
+        and once at the end.
+        """
+        recipients = list(recipients)
+        started = time.monotonic()
+        finished = await asyncio.to_thread(self._create_deliveries, notification_id, recipients)
+
+        counts = {'sent': 0, 'failed': 0, 'blocked': 0}
+        for status in finished.values():
+            counts[status] += 1
+        pending_updates = []
+        queue = asyncio.Queue()
+        for recipient in recipients:
+            if recipient.telegram_id not in finished:
+                queue.put_nowait(recipient)
+        last_progress = time.monotonic()
+
+        async def report(final=False):
+            nonlocal last_progress
+            if on_progress is None:
+                return
+            now = time.monotonic()
+            if final or now - last_progress >= self.progress_interval:
+                last_progress = now
+                try:
+                    await on_progress(sum(counts.values()), len(recipients), dict(counts))
+                except Exception as e:
+                    logger.warning(f"Broadcast progress callback failed: {e}")
+
+        async def worker():
+            while True:
+                try:
+                    recipient = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                status, attempts, error = await self._deliver(bot, recipient.telegram_id, text, parse_mode)
+                counts[status] += 1
+                pending_updates.append((recipient.telegram_id, status, attempts, error))
+                if len(pending_updates) >= self.flush_every:
+                    batch = pending_updates[:]
+                    pending_updates.clear()
+                    await asyncio.to_thread(self._record, notification_id, batch)
+                await report()
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, queue.qsize()) or 1)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers:
+                w.cancel()
+            if pending_updates:
+                await asyncio.to_thread(self._record, notification_id, pending_updates)
+
+        await report(final=True)
+        result = BroadcastResult(len(recipients), counts['sent'], counts['failed'], counts['blocked'],
+                                 round(time.monotonic() - started, 2))
+        logger.info(f"Broadcast {notification_id} finished: {result}")
+        return result
+
+    async def _deliver(self, bot, chat_id, text, parse_mode):
+        """Send to one chat, retrying flood control and network errors; returns (status, attempts, error)"""
+        attempts = 0
+        while True:
+            await self.chats.wait(chat_id)
+            await self.bucket.acquire()
+            attempts += 1
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                return 'sent', attempts, None
+            except RetryAfter as e:
+                delay = _retry_seconds(e)
+                logger.warning(f"Flood control while broadcasting; pausing {delay:.1f}s")
+                self.bucket.pause(delay)
+                error = str(e)
+            except Forbidden as e:
+                # Bot blocked by the user or kicked from the chat; retrying won't help
+                return 'blocked', attempts, str(e)
+            except BadRequest as e:
+                return 'failed', attempts, str(e)
+            except NetworkError as e:
+                error = str(e)
+                await asyncio.sleep(min(2 ** attempts, 30))
+            except Exception as e:
+                logger.error(f"Broadcast to {chat_id} failed: {e}")
+                return 'failed', attempts, str(e)
+
+            if attempts > self.max_retries:
+                return 'failed', attempts, error
+
+    def _create_deliveries(self, notification_id, recipients):
+        """Add pending rows for new recipients; returns {telegram_id: status} of finished ones"""
+        t = delivery_table
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            existing = dict(conn.execute(
+                select(t.c.telegram_id, t.c.status).where(t.c.notification_id == notification_id)
+            ).all())
+            new = [r for r in recipients if r.telegram_id not in existing]
+            if new:
+                conn.execute(t.insert(), [{
+                    'notification_id': notification_id, 'user_id': r.user_id, 'telegram_id': r.telegram_id,
+                    'status': 'pending', 'attempts': 0, 'updated_at': now,
+                } for r in new])
+        return {chat: status for chat, status in existing.items() if status != 'pending'}
+
+    def _record(self, notification_id, results):
+        t = delivery_table
+        now = datetime.utcnow()
+        statement = (
+            update(t)
+            .where(t.c.notification_id == bindparam('n_id'), t.c.telegram_id == bindparam('chat_id'))
+            .values(status=bindparam('new_status'), attempts=bindparam('n_attempts'),
+                    error=bindparam('last_error'), updated_at=now)
+        )
+        with self.engine.begin() as conn:
+            conn.execute(statement, [{
+                'n_id': notification_id, 'chat_id': telegram_id, 'new_status': status,
+                'n_attempts': attempts, 'last_error': error,
+            } for telegram_id, status, attempts, error in results])
+
+    def delivery_counts(self, notification_id):
+        """{status: count} for one notification's recipients"""
+        t = delivery_table
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(t.c.status, func.count()).where(t.c.notification_id == notification_id).group_by(t.c.status)
+            ).all()
+        return dict(rows)
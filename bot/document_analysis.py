@@ -0,0 +1,269 @@
+"""
+Chunked Document Analysis
+Map-reduce AI analysis for long documents: text is split on page/section boundaries,
+chunks are analyzed concurrently (capped by the shared AI client) and the notes are
+merged into the standard 7-section summary. Partial results are cached by content hash.
+"""
+import os
+import re
+import asyncio
+import hashlib
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Bump when prompts change so cached partial results are not reused
+PROMPT_VERSION = 1
+
+# Page separator used in extracted text (form feed, as in pdftotext output)
+PAGE_BREAK = "\f"
+
+# Preferred split points inside a page: blank lines and numbered/titled headings
+SECTION_BREAK = re.compile(r'\n\s*\n|\n(?=(?:ARTICLE|Article|SECTION|Section|CLAUSE|Clause|SCHEDULE|Schedule|\d+(?:\.\d+)*\.?)\s)')
+
+SECTIONS_SPEC = """1. **Document Type**: Identify the type (Contract, Brief, Correspondence, etc.)
+2. **Summary**: 2-3 sentence summary
+3. **Key Parties**: List important parties/entities
+4. **Important Dates**: Extract significant dates
+5. **Legal Issues**: Main legal matters
+6. **Action Items**: Required actions
+7. **Risk Assessment**: Brief risk assessment"""
+
+FULL_PROMPT = """You are a legal document analyzer. Analyze this document and provide:
+
+{sections}
+
+Filename: {filename}
+
+Content:
+{content}
+
+Format your response clearly and concisely."""
+
+MAP_PROMPT = """You are a legal document analyzer. Below is one part of a longer legal document.
+Take concise notes on this part only, under these headings (write "None" where nothing applies):
+Document Type, Summary, Key Parties, Important Dates, Legal Issues, Action Items, Risks.
+Keep every date, deadline, amount and obligation you find.
+
+Content:
+{content}"""
+
+COMBINE_PROMPT = """You are a legal document analyzer. Below are notes taken from consecutive parts of one legal document.
+Merge them into one set of notes under the same headings, removing duplicates but keeping every date, deadline, amount and obligation.
+
+Notes:
+{content}"""
+
+REDUCE_PROMPT = """You are a legal document analyzer. Below are notes taken from consecutive parts of one legal document.
+Combine them into a single analysis of the whole document and provide:
+
+{sections}
+
+Filename: {filename}
+
+Notes:
+{content}
+
+Format your response clearly and concisely."""
+
+SYSTEM_PROMPT = "You are a legal document analysis expert."
+
+DocumentAnalysis = namedtuple('DocumentAnalysis', ['summary', 'chunk_keys'])
+
+
+def split_text(text, max_chars):
+    """Split text into pieces of at most max_chars, preferring section, then line boundaries"""
+    if len(text) <= max_chars:
+        return [text] if text.strip() else []
+
+    for pattern in (SECTION_BREAK, re.compile(r'\n')):
+        parts = [p for p in pattern.split(text) if p.strip()]
+        if len(parts) > 1:
+            pieces = []
+            for part in parts:
+                pieces.extend(split_text(part, max_chars))
+            return _pack(pieces, max_chars, "\n\n")
+
+    # No usable boundary (e.g. one huge line): hard cut
+    return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+
+def _pack(pieces, max_chars, joiner):
+    chunks = []
+    current = []
+    size = 0
+    for piece in pieces:
+        if current and size + len(joiner) + len(piece) > max_chars:
+            chunks.append(joiner.join(current))
+            current, size = [], 0
+        size += (len(joiner) if current else 0) + len(piece)
+        current.append(piece)
+    if current:
+        chunks.append(joiner.join(current))
+    return chunks
+
+
+class ChunkPacker:
+    """Greedily packs streamed pages into chunks of at most max_chars"""
+
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self._pages = []
+        self._size = 0
+
+    def feed(self, page_text):
+        """Add a page; returns the chunks that are now complete"""
+        ready = []
+        for piece in split_text(page_text, self.max_chars):
+            if self._pages and self._size + len(piece) + 1 > self.max_chars:
+                ready.append(self._take())
+            self._pages.append(piece)
+            self._size += len(piece) + 1
+        return ready
+
+    def flush(self):
+        return [self._take()] if self._pages else []
+
+    def _take(self):
+        chunk = PAGE_BREAK.join(self._pages)
+        self._pages, self._size = [], 0
+        return chunk
+
+
+def split_passages(text, max_chars=None):
+    """Split a document into small retrieval passages (RETRIEVAL_CHUNK_CHARS, default 1500)"""
+    packer = ChunkPacker(max_chars or int(os.getenv('RETRIEVAL_CHUNK_CHARS', 1500)))
+    passages = []
+    for page in text.split(PAGE_BREAK):
+        passages.extend(packer.feed(page))
+    passages.extend(packer.flush())
+    return [p.replace(PAGE_BREAK, "\n") for p in passages]
+
+
+async def _as_pages(text_or_pages):
+    if isinstance(text_or_pages, str):
+        for page in text_or_pages.split(PAGE_BREAK):
+            yield page
+    else:
+        async for page in text_or_pages:
+            yield page
+
+
+class DocumentAnalyzer:
+    """Runs map-reduce analysis through the shared AI client with per-chunk caching.
+
+    Sizes default to ANALYSIS_CHUNK_CHARS and ANALYSIS_REDUCE_CHARS.
+    """
+
+    def __init__(self, ai_client, cache, chunk_chars=None, reduce_chars=None):
+        self.ai_client = ai_client
+        self.cache = cache
+        self.chunk_chars = chunk_chars or int(os.getenv('ANALYSIS_CHUNK_CHARS', 12000))
+        self.reduce_chars = reduce_chars or int(os.getenv('ANALYSIS_REDUCE_CHARS', 24000))
+
+    @staticmethod
+    def chunk_key(kind, content):
+        return hashlib.sha256(f"v{PROMPT_VERSION}:{kind}\n{content}".encode('utf-8')).hexdigest()
+
+    async def _cached_chat(self, kind, content, prompt, max_tokens):
+        key = self.chunk_key(kind, content)
+        cached = self.cache.get_chunk(key)
+        if cached is not None:
+            return key, cached
+
+        result = await self.ai_client.chat(
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=max_tokens
+        )
+        if result:
+            self.cache.store_chunk(key, result)
+        return key, result
+
+    async def _map(self, chunk):
+        return await self._cached_chat('map', chunk, MAP_PROMPT.format(content=chunk), max_tokens=600)
+
+    async def analyze(self, text_or_pages, filename):
+        """Analyze extracted text (str) or an async iterable of page texts.
+
+        Chunks are dispatched while pages are still arriving; at most a few are held at once.
+        """
+        packer = ChunkPacker(self.chunk_chars)
+        max_pending = self.ai_client.max_concurrency * 2
+        tasks = []
+        first_chunk = None
+
+        async def dispatch(chunk):
+            nonlocal first_chunk
+            if first_chunk is None and not tasks:
+                # Hold the first chunk back: if it is the only one, it gets the full prompt
+                first_chunk = chunk
+                return
+            if first_chunk is not None:
+                tasks.append(asyncio.ensure_future(self._map(first_chunk)))
+                first_chunk = None
+            tasks.append(asyncio.ensure_future(self._map(chunk)))
+            while sum(not t.done() for t in tasks) >= max_pending:
+                await asyncio.wait([t for t in tasks if not t.done()], return_when=asyncio.FIRST_COMPLETED)
+
+        try:
+            async for page in _as_pages(text_or_pages):
+                for chunk in packer.feed(page):
+                    await dispatch(chunk)
+            for chunk in packer.flush():
+                await dispatch(chunk)
+
+            if first_chunk is not None and not tasks:
+                # Short document: single pass with the standard prompt
+                prompt = FULL_PROMPT.format(sections=SECTIONS_SPEC, filename=filename, content=first_chunk)
+                _, summary = await self._cached_chat(f'full:{filename}', first_chunk, prompt, max_tokens=1000)
+                return DocumentAnalysis(summary, [])
+
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            raise
+
+        chunk_keys = [key for key, _ in results]
+        notes = [f"[Part {i}]\n{note}" for i, (_, note) in enumerate(results, start=1) if note]
+        logger.info(f"Analyzed {filename} in {len(results)} chunks")
+        summary = await self._reduce(notes, filename)
+        return DocumentAnalysis(summary, chunk_keys)
+
+    async def _reduce(self, notes, filename):
+        # Combine notes in rounds until they fit into one final prompt
+        while sum(len(n) for n in notes) > self.reduce_chars and len(notes) > 1:
+            groups = _pack(notes, self.reduce_chars, "\n\n")
+            if len(groups) == len(notes):
+                groups = ["\n\n".join(notes[i:i + 2]) for i in range(0, len(notes), 2)]
+            combined = await asyncio.gather(*(
+                self._cached_chat('combine', group, COMBINE_PROMPT.format(content=group), max_tokens=800)
+                for group in groups
+            ))
+            notes = [note for _, note in combined if note]
+
+        content = "\n\n".join(notes)
+        prompt = REDUCE_PROMPT.format(sections=SECTIONS_SPEC, filename=filename, content=content)
+        _, summary = await self._cached_chat(f'reduce:{filename}', content, prompt, max_tokens=1000)
+        return summary
+
+    def notes_for(self, chunk_keys, max_chars):
+        """Cached per-chunk notes for a document, in order, trimmed to max_chars"""
+        found = self.cache.get_chunks(chunk_keys)
+        parts = []
+        size = 0
+        for i, key in enumerate(chunk_keys, start=1):
+            note = found.get(key)
+            if not note:
+                continue
+            part = f"[Part {i}]\n{note}"
+            if size + len(part) > max_chars:
+                break
+            parts.append(part)
+            size += len(part) + 2
+        return "\n\n".join(parts)
@@ -0,0 +1,275 @@
+"""
+Document Text Extraction
+Runs PDF/Word/Excel parsing in a worker process pool so the bot's event loop stays responsive.
+This module must stay importable without the bot/database side effects (workers import it).
+"""
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionError(Exception):
+    """Raised when a worker job times out or the worker dies"""
+
+
+def iter_pdf_pages(pdf_reader, start=0, stop=None):
+    """Yield (page_index, page_text) lazily; unreadable pages yield empty text"""
+    stop = len(pdf_reader.pages) if stop is None else stop
+    for i in range(start, stop):
+        try:
+            page_text = pdf_reader.pages[i].extract_text() or ""
+        except Exception as page_error:
+            logger.warning(f"Error extracting page {i+1}: {page_error}")
+            page_text = ""
+        yield i, page_text
+
+
+def extract_pdf_pages(file_path: str, start: int, count: int):
+    """Extract one batch of pages; returns (num_pages, [page_text, ...])"""
+    import PyPDF2
+
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file, strict=False)  # Non-strict mode
+        num_pages = len(pdf_reader.pages)
+        stop = min(start + count, num_pages)
+        return num_pages, [page_text for _, page_text in iter_pdf_pages(pdf_reader, start, stop)]
+
+
+def text_sidecar_path(file_path: str) -> str:
+    """Where the full extracted text of an upload is streamed to"""
+    return f"{file_path}.txt"
+
+
+def extract_text_from_file(file_path: str) -> str:
+    """Extract text content from various file types"""
+    import PyPDF2
+    from docx import Document as DocxDocument
+    import json
+    import markdown
+    from openpyxl import load_workbook
+    
+    file_extension = file_path.lower().split('.')[-1]
+    
+    try:
+        if file_extension == 'pdf':
+            # Extract from PDF with improved error handling
+            try:
+                with open(file_path, 'rb') as file:
+                    pdf_reader = PyPDF2.PdfReader(file, strict=False)  # Non-strict mode
+                    num_pages = len(pdf_reader.pages)
+                    text = "\n".join(page_text for _, page_text in iter_pdf_pages(pdf_reader) if page_text)
+                    
+                    if text.strip():
+                        return text.strip()
+                    else:
+                        return f"PDF has {num_pages} pages but no extractable text found. It may be scanned/image-based."
+                        
+            except Exception as pdf_error:
+                logger.error(f"PDF extraction error: {pdf_error}")
+                return f"Error reading PDF: {str(pdf_error)}. The file may be corrupted or password-protected."
+                
+        elif file_extension in ['docx', 'doc']:
+            # Extract from Word document
+            doc = DocxDocument(file_path)
+            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
+            if text.strip():
+                return text.strip()
+            else:
+                return "Word document appears to be empty or contains only images."
+            
+        elif file_extension == 'txt':
+            # Extract from text file
+            with open(file_path, 'r', encoding='utf-8') as file:
+                content = file.read().strip()
+                return content if content else "Text file is empty."
+        
+        elif file_extension == 'md':
+            # Extract from Markdown file
+            with open(file_path, 'r', encoding='utf-8') as file:
+                md_content = file.read()
+                # Convert markdown to plain text (strip formatting)
+                html = markdown.markdown(md_content)
+                # Simple HTML tag removal
+                import re
+                text = re.sub('<[^<]+?>', '', html)
+                return text.strip() if text.strip() else "Markdown file is empty."
+        
+        elif file_extension == 'json':
+            # Extract from JSON file
+            with open(file_path, 'r', encoding='utf-8') as file:
+                json_data = json.load(file)
+                # Convert JSON to formatted string
+                formatted_json = json.dumps(json_data, indent=2)
+                return f"JSON Content:\n{formatted_json}"
+        
+        elif file_extension in ['xlsx', 'xls']:
+            # Extract from Excel file
+            wb = load_workbook(file_path, data_only=True, read_only=True)
+            parts = []
+            for sheet_name in wb.sheetnames:
+                sheet = wb[sheet_name]
+                parts.append(f"\n=== Sheet: {sheet_name} ===")
+                for row in sheet.iter_rows(values_only=True):
+                    row_text = "\t".join([str(cell) if cell is not None else "" for cell in row])
+                    if row_text.strip():
+                        parts.append(row_text)
+            wb.close()
+            text = "\n".join(parts)
+            return text.strip() if text.strip() else "Excel file appears to be empty."
+                
+        else:
+            return f"Unsupported file type: {file_extension}. Supported: PDF, DOCX, TXT, MD, JSON, XLSX"
+            
+    except Exception as e:
+        logger.error(f"Error extracting text from {file_path}: {e}")
+        return f"Error extracting text: {str(e)}"
+
+
+class ExtractionPool:
+    """Process pool for extract_text_from_file with a job cap, per-job timeout and queue metrics.
+
+    Settings default to EXTRACTION_WORKERS, EXTRACTION_MAX_JOBS and EXTRACTION_TIMEOUT.
+    The job cap is at most the number of workers, so an admitted job starts at once and
+    its timeout measures the parse, not time spent queued inside the executor.
+    """
+
+    def __init__(self, max_workers=None, max_jobs=None, timeout=None):
+        self.max_workers = max_workers or int(os.getenv('EXTRACTION_WORKERS', min(4, os.cpu_count() or 1)))
+        self.max_jobs = min(max_jobs or int(os.getenv('EXTRACTION_MAX_JOBS', self.max_workers)), self.max_workers)
+        self.timeout = timeout or float(os.getenv('EXTRACTION_TIMEOUT', 120))
+        self.pdf_batch_size = int(os.getenv('EXTRACTION_PDF_BATCH_PAGES', 20))
+        self._executor = None
+        self._generation = 0  # bumped whenever the executor is torn down
+        self._timed_out = set()  # generations torn down because a job timed out
+        self._pending = {}  # generation -> jobs submitted to it and not yet collected
+        self._slots = None
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.recycles = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            # fork by default: spawn would re-run the bot module's start-up code in every worker.
+            # Workers only parse files, so they never touch the inherited DB pool or event loop.
+            default_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+            context = multiprocessing.get_context(os.getenv('EXTRACTION_START_METHOD', default_method))
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        return self._executor
+
+    def _recycle_executor(self, generation, timed_out=False):
+        """Tear down the executor (unless that already happened since `generation`),
+        killing its workers so abandoned parses don't keep holding them"""
+        if generation != self._generation or self._executor is None:
+            return
+        if timed_out:
+            self._timed_out.add(generation)
+        executor, self._executor = self._executor, None
+        self._generation += 1
+        self.recycles += 1
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _collected(self, generation):
+        """Account for a finished job; a torn-down generation is forgotten once its last job is"""
+        self._pending[generation] -= 1
+        if not self._pending[generation]:
+            del self._pending[generation]
+            if generation != self._generation:
+                self._timed_out.discard(generation)
+
+    async def _run(self, func, *args):
+        """Run func(*args) in a worker under the job cap and timeout; raises ExtractionError"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_jobs)
+
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            for attempt in range(2):
+                generation = self._generation
+                future = loop.run_in_executor(self._get_executor(), func, *args)
+                self._pending[generation] = self._pending.get(generation, 0) + 1
+                try:
+                    result = await asyncio.wait_for(future, timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    # A worker can't be interrupted mid-parse: replace the pool so it is freed
+                    self.timeouts += 1
+                    self._recycle_executor(generation, timed_out=True)
+                    raise ExtractionError(f"timed out after {self.timeout:.0f} seconds.")
+                except BrokenProcessPool as e:
+                    if attempt == 0 and generation in self._timed_out:
+                        # Killed along with a timed-out job: try once on the new pool
+                        continue
+                    self._recycle_executor(generation)
+                    self.failed += 1
+                    raise ExtractionError(f"the extraction worker crashed ({e}).")
+                finally:
+                    self._collected(generation)
+                self.completed += 1
+                return result
+        except ExtractionError:
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    async def extract(self, file_path: str) -> str:
+        """Extract text in a worker process; returns an 'Error ...' string on timeout or failure"""
+        try:
+            return await self._run(extract_text_from_file, file_path)
+        except Exception as e:
+            logger.error(f"Extraction failed for {file_path}: {e}")
+            return f"Error extracting text: {str(e)}"
+
+    async def iter_pdf_pages(self, file_path: str, batch_size=None):
+        """Async generator of (page_index, page_text, num_pages), extracted batch by batch.
+
+        Only one batch is in memory at a time, so callers can stop early or stream to disk.
+        """
+        batch_size = batch_size or self.pdf_batch_size
+        start = 0
+        num_pages = None
+        while num_pages is None or start < num_pages:
+            num_pages, texts = await self._run(extract_pdf_pages, file_path, start, batch_size)
+            for offset, page_text in enumerate(texts):
+                yield start + offset, page_text, num_pages
+            start += batch_size
+
+    def stats(self):
+        return {
+            'workers': self.max_workers,
+            'max_jobs': self.max_jobs,
+            'queue_depth': self.queued,
+            'running': self.running,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'recycles': self.recycles,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Process-wide instance used by the bot handlers
+extraction_pool = ExtractionPool()
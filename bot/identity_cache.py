@@ -0,0 +1,100 @@
+"""
+Identity Cache
+Bounded LRU + TTL cache for telegram_id -> User lookups on hot paths
+(blocked-user middleware, admin checks). Writers invalidate entries.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict, namedtuple
+
+from database.models import User
+
+# The User fields hot paths need; safe to use after the session is closed
+UserIdentity = namedtuple('UserIdentity', [
+    'id', 'telegram_id', 'username', 'full_name', 'role', 'status',
+    'onboarding_completed', 'departments', 'position',
+])
+
+_MISSING = object()
+
+
+class IdentityCache:
+    """Thread-safe LRU cache of UserIdentity records keyed by telegram_id.
+
+    Unknown users are cached as None so non-staff updates don't hit the DB either.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = maxsize or int(os.getenv('IDENTITY_CACHE_SIZE', 2048))
+        self.ttl = ttl if ttl is not None else float(os.getenv('IDENTITY_CACHE_TTL', 300))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_id, default=_MISSING):
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[telegram_id]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(telegram_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, telegram_id, identity):
+        with self._lock:
+            self._entries[telegram_id] = (identity, time.monotonic() + self.ttl)
+            self._entries.move_to_end(telegram_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def resolve(self, session, telegram_id):
+        """Return the cached identity, loading it with `session` on a miss (None if unknown)"""
+        identity = self.get(telegram_id)
+        if identity is not _MISSING:
+            return identity
+
+        user = session.query(User).filter_by(telegram_id=telegram_id).first()
+        identity = identity_from_user(user) if user else None
+        self.put(telegram_id, identity)
+        return identity
+
+    def invalidate(self, telegram_id):
+        with self._lock:
+            self._entries.pop(telegram_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+def identity_from_user(user):
+    return UserIdentity(
+        id=user.id,
+        telegram_id=user.telegram_id,
+        username=user.username,
+        full_name=user.full_name,
+        role=user.role,
+        status=user.status,
+        onboarding_completed=bool(user.onboarding_completed),
+        departments=user.departments,
+        position=user.position,
+    )
+
+
+# Process-wide instance used by the bot handlers
+identity_cache = IdentityCache()
@@ -0,0 +1,329 @@
+"""
+Durable Job Queue
+Background work (broadcasts, document analysis, reminders) stored in the bot's database
+so it survives restarts. Jobs have priorities, retries with backoff, optional idempotency
+keys and a lease that lets a restarted process pick up work a dead one was running.
+"""
+import os
+import json
+import socket
+import asyncio
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, String, Text, DateTime, Index,
+    select, update, func, or_, and_
+)
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+jobs_table = Table(
+    'background_jobs', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('kind', String(64), nullable=False),
+    Column('payload', Text, nullable=False),
+    Column('priority', Integer, nullable=False, default=0),  # higher runs first
+    Column('status', String(16), nullable=False, default='queued'),  # queued, running, done, failed
+    Column('attempts', Integer, nullable=False, default=0),
+    Column('max_attempts', Integer, nullable=False, default=3),
+    Column('idempotency_key', String(255), unique=True),
+    Column('run_after', DateTime, nullable=False, default=datetime.utcnow),
+    Column('locked_by', String(128)),
+    Column('locked_until', DateTime),
+    Column('last_error', Text),
+    Column('result', Text),
+    Column('created_at', DateTime, default=datetime.utcnow),
+    Column('finished_at', DateTime),
+    Index('ix_background_jobs_claim', 'status', 'priority', 'run_after'),
+)
+
+Job = namedtuple('Job', ['id', 'kind', 'payload', 'priority', 'status', 'attempts', 'max_attempts',
+                         'idempotency_key', 'run_after', 'last_error', 'created_at', 'finished_at'])
+
+# Priorities used by the bot
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+
+class PermanentJobError(Exception):
+    """Raised by a job handler when retrying can't succeed"""
+
+
+def _row_to_job(row):
+    return Job(row.id, row.kind, json.loads(row.payload), row.priority, row.status, row.attempts,
+               row.max_attempts, row.idempotency_key, row.run_after, row.last_error,
+               row.created_at, row.finished_at)
+
+
+class JobQueue:
+    """Database-backed queue with asyncio workers.
+
+    Settings default to JOB_WORKERS, JOB_POLL_INTERVAL, JOB_LEASE_SECONDS and JOB_MAX_ATTEMPTS.
+    Handlers are registered per kind as ``async def handler(application, payload, job)``.
+    """
+
+    def __init__(self, engine, workers=None, poll_interval=None, lease_seconds=None,
+                 max_attempts=None, backoff_base=5.0, backoff_max=600.0):
+        self.engine = engine
+        self.workers = workers or int(os.getenv('JOB_WORKERS', 3))
+        self.poll_interval = poll_interval or float(os.getenv('JOB_POLL_INTERVAL', 1.0))
+        self.lease_seconds = lease_seconds or int(os.getenv('JOB_LEASE_SECONDS', 120))
+        self.max_attempts = max_attempts or int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers = {}
+        self._tasks = []
+        self._wakeup = None
+        self._application = None
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        metadata.create_all(engine)
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    # --- Producers ---
+
+    def enqueue(self, kind, payload, priority=PRIORITY_NORMAL, idempotency_key=None,
+                run_after=None, max_attempts=None):
+        """Store a job and return its id; an existing job with the same idempotency key is reused"""
+        job_id = self._insert(kind, payload, priority, idempotency_key, run_after, max_attempts)
+        self._wake()
+        return job_id
+
+    async def enqueue_async(self, kind, payload, priority=PRIORITY_NORMAL, idempotency_key=None,
+                            run_after=None, max_attempts=None):
+        """enqueue() without blocking the event loop on the insert"""
+        job_id = await asyncio.to_thread(self._insert, kind, payload, priority, idempotency_key,
+                                         run_after, max_attempts)
+        self._wake()
+        return job_id
+
+    def _wake(self):
+        # Workers also poll, so producers outside the bot's event loop need no wakeup
+        if self._wakeup is not None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._wakeup.set()
+
+    def _insert(self, kind, payload, priority, idempotency_key, run_after, max_attempts):
+        t = jobs_table
+        values = {
+            'kind': kind,
+            'payload': json.dumps(payload),
+            'priority': priority,
+            'status': 'queued',
+            'attempts': 0,
+            'max_attempts': max_attempts or self.max_attempts,
+            'idempotency_key': idempotency_key,
+            'run_after': run_after or datetime.utcnow(),
+            'created_at': datetime.utcnow(),
+        }
+        try:
+            with self.engine.begin() as conn:
+                job_id = conn.execute(t.insert().values(**values)).inserted_primary_key[0]
+        except IntegrityError:
+            if idempotency_key is None:
+                raise
+            with self.engine.connect() as conn:
+                job_id = conn.execute(select(t.c.id).where(t.c.idempotency_key == idempotency_key)).scalar()
+            logger.info(f"Job {idempotency_key} already queued as #{job_id}")
+        return job_id
+
+    # --- Claiming and completion (blocking; called via asyncio.to_thread) ---
+
+    def _claim(self):
+        t = jobs_table
+        now = datetime.utcnow()
+        # Lease expired: the process running it died (perhaps because of the job itself)
+        abandoned = and_(t.c.status == 'running', t.c.locked_until < now)
+        runnable = and_(t.c.run_after <= now, or_(
+            t.c.status == 'queued',
+            and_(abandoned, t.c.attempts < t.c.max_attempts),
+        ))
+        kinds = list(self._handlers)
+        with self.engine.begin() as conn:
+            # A job that keeps killing its process (OOM, a crashing parser) must not rerun forever
+            exhausted = conn.execute(
+                update(t).where(abandoned, t.c.attempts >= t.c.max_attempts).values(
+                    status='failed', finished_at=now, locked_by=None, locked_until=None,
+                    last_error='The worker process died while running the job (lease expired)',
+                )
+            ).rowcount
+            if exhausted:
+                self.failed += exhausted
+                logger.error(f"Failed {exhausted} job(s) whose worker died on every attempt")
+            candidates = conn.execute(
+                select(t.c.id).where(runnable, t.c.kind.in_(kinds))
+                .order_by(t.c.priority.desc(), t.c.run_after, t.c.id).limit(5)
+            ).scalars().all()
+            for job_id in candidates:
+                # Optimistic claim: only one worker's UPDATE matches
+                claimed = conn.execute(
+                    update(t).where(t.c.id == job_id, runnable).values(
+                        status='running', locked_by=self.worker_id,
+                        locked_until=now + timedelta(seconds=self.lease_seconds),
+                        attempts=t.c.attempts + 1,
+                    )
+                ).rowcount
+                if claimed:
+                    return _row_to_job(conn.execute(select(t).where(t.c.id == job_id)).one())
+        return None
+
+    def _extend_lease(self, job_id):
+        t = jobs_table
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(t).where(t.c.id == job_id, t.c.locked_by == self.worker_id)
+                .values(locked_until=datetime.utcnow() + timedelta(seconds=self.lease_seconds))
+            )
+
+    def _finish(self, job, result):
+        t = jobs_table
+        with self.engine.begin() as conn:
+            conn.execute(update(t).where(t.c.id == job.id).values(
+                status='done', result=json.dumps(result) if result is not None else None,
+                last_error=None, locked_by=None, locked_until=None, finished_at=datetime.utcnow(),
+            ))
+
+    def _release(self, job):
+        t = jobs_table
+        with self.engine.begin() as conn:
+            conn.execute(update(t).where(t.c.id == job.id, t.c.locked_by == self.worker_id).values(
+                status='queued', attempts=t.c.attempts - 1, locked_by=None, locked_until=None,
+            ))
+
+    def _fail(self, job, error, permanent=False):
+        t = jobs_table
+        now = datetime.utcnow()
+        if permanent or job.attempts >= job.max_attempts:
+            values = {'status': 'failed', 'finished_at': now}
+        else:
+            delay = min(self.backoff_base * (2 ** (job.attempts - 1)), self.backoff_max)
+            values = {'status': 'queued', 'run_after': now + timedelta(seconds=delay)}
+        with self.engine.begin() as conn:
+            conn.execute(update(t).where(t.c.id == job.id).values(
+                last_error=error[:2000], locked_by=None, locked_until=None, **values
+            ))
+        return values['status']
+
+    # --- Workers ---
+
+    async def start(self, application):
+        """Start worker coroutines (call from post_init)"""
+        self._application = application
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Started {self.workers} job workers ({self.worker_id})")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, number):
+        while True:
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                logger.error(f"Job worker {number} could not claim work: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(job)
+
+    async def _run(self, job):
+        handler = self._handlers[job.kind]
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        try:
+            result = await handler(self._application, job.payload, job)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so the next start picks it up right away
+            try:
+                self._release(job)
+            except Exception as e:
+                logger.warning(f"Could not release job #{job.id}; it will rerun when its lease expires: {e}")
+            raise
+        except Exception as e:
+            permanent = isinstance(e, PermanentJobError)
+            status = await asyncio.to_thread(self._fail, job, str(e), permanent)
+            if status == 'failed':
+                self.failed += 1
+                logger.error(f"Job #{job.id} ({job.kind}) failed after {job.attempts} attempt(s): {e}")
+            else:
+                self.retried += 1
+                logger.warning(f"Job #{job.id} ({job.kind}) attempt {job.attempts} failed, will retry: {e}")
+        else:
+            await asyncio.to_thread(self._finish, job, result)
+            self.completed += 1
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self._extend_lease, job_id)
+            except Exception as e:
+                logger.warning(f"Could not extend lease for job #{job_id}: {e}")
+
+    # --- Inspection ---
+
+    def recent(self, limit=10, status=None):
+        t = jobs_table
+        query = select(t).order_by(t.c.id.desc()).limit(limit)
+        if status:
+            query = query.where(t.c.status == status)
+        with self.engine.connect() as conn:
+            return [_row_to_job(row) for row in conn.execute(query)]
+
+    def get(self, job_id):
+        t = jobs_table
+        with self.engine.connect() as conn:
+            row = conn.execute(select(t).where(t.c.id == job_id)).first()
+        return _row_to_job(row) if row else None
+
+    def counts(self):
+        """{status: count} across all jobs"""
+        t = jobs_table
+        with self.engine.connect() as conn:
+            return dict(conn.execute(select(t.c.status, func.count()).group_by(t.c.status)).all())
+
+    def retry(self, job_id):
+        """Requeue a failed job now; returns True if it was failed"""
+        t = jobs_table
+        with self.engine.begin() as conn:
+            requeued = conn.execute(
+                update(t).where(t.c.id == job_id, t.c.status == 'failed')
+                .values(status='queued', attempts=0, run_after=datetime.utcnow(), finished_at=None)
+            ).rowcount
+        if requeued:
+            self._wake()
+        return bool(requeued)
+
+    def stats(self):
+        return {
+            'workers': len(self._tasks),
+            'completed': self.completed,
+            'failed': self.failed,
+            'retried': self.retried,
+            **{f'status_{k}': v for k, v in self.counts().items()},
+        }
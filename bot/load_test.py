@@ -0,0 +1,210 @@
+"""
+Update Processing Load Test
+Replays thousands of synthetic updates through an in-process Application (Telegram API
+calls answered locally) to compare sequential processing with ChatOrderedUpdateProcessor:
+throughput, latency of quick commands behind slow ones, and per-chat ordering.
+
+    python -m bot.load_test --updates 5000 --chats 300
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+from telegram import Update
+from telegram.request import BaseRequest
+from telegram.ext import (
+    Application, CommandHandler, MessageHandler, ConversationHandler, filters
+)
+
+from bot.update_processor import ChatOrderedUpdateProcessor
+
+STEP_ONE, STEP_TWO = range(2)
+
+
+class LocalRequest(BaseRequest):
+    """Answers Bot API calls in-process after a simulated network delay"""
+
+    def __init__(self, latency=0.005):
+        self.latency = latency
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        await asyncio.sleep(self.latency)
+        if endpoint == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'load_test_bot'}
+        elif endpoint == 'sendMessage':
+            chat_id = request_data.parameters.get('chat_id', 0) if request_data else 0
+            result = {'message_id': 1, 'date': int(time.time()), 'chat': {'id': chat_id, 'type': 'private'}, 'text': ''}
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+def synthetic_updates(count, chats, slow_share, seed=7):
+    """Update dicts: mostly quick commands, some slow analyses and two-step conversations"""
+    rng = random.Random(seed)
+    step = {}
+    updates = []
+    for update_id in range(1, count + 1):
+        chat_id = 1000 + rng.randrange(chats)
+        roll = rng.random()
+        if chat_id in step:
+            # Finish an open conversation with the next message from this chat
+            text = f"answer {step[chat_id]}"
+            step[chat_id] = step[chat_id] + 1 if step[chat_id] < 2 else None
+            if step[chat_id] is None:
+                del step[chat_id]
+        elif roll < slow_share:
+            text = '/analyze'
+        elif roll < slow_share + 0.1:
+            text = '/onboard'
+            step[chat_id] = 1
+        else:
+            text = '/myagenda'
+        message = {
+            'message_id': update_id, 'date': 0, 'text': text,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'User'},
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        updates.append({'update_id': update_id, 'message': message})
+    return updates
+
+
+async def run(updates, processor, slow_seconds, fast_seconds):
+    """Process all updates; returns a result dict"""
+    enqueued = {}
+    finished = {}
+    last_seen = {}
+    violations = 0
+    conversations = 0
+    done = asyncio.Event()
+
+    def finish(update):
+        # Each chat's updates must complete in the order they arrived
+        nonlocal violations
+        chat_id = update.effective_chat.id
+        if last_seen.get(chat_id, 0) > update.update_id:
+            violations += 1
+        last_seen[chat_id] = update.update_id
+        finished[update.update_id] = time.perf_counter()
+        if len(finished) == len(updates):
+            done.set()
+
+    async def myagenda(update, context):
+        await asyncio.sleep(fast_seconds)
+        await context.bot.send_message(update.effective_chat.id, 'agenda')
+        finish(update)
+
+    async def analyze(update, context):
+        await asyncio.sleep(slow_seconds)
+        await context.bot.send_message(update.effective_chat.id, 'analysis')
+        finish(update)
+
+    async def onboard(update, context):
+        await context.bot.send_message(update.effective_chat.id, 'name?')
+        finish(update)
+        return STEP_ONE
+
+    async def step_one(update, context):
+        await context.bot.send_message(update.effective_chat.id, 'email?')
+        finish(update)
+        return STEP_TWO
+
+    async def step_two(update, context):
+        nonlocal conversations
+        await context.bot.send_message(update.effective_chat.id, 'done')
+        conversations += 1
+        finish(update)
+        return ConversationHandler.END
+
+    async def unexpected(update, context):
+        # A message handled outside its conversation state means ordering broke
+        nonlocal violations
+        violations += 1
+        finish(update)
+
+    builder = Application.builder().token('1:load-test').request(LocalRequest()).updater(None)
+    if processor is not None:
+        builder = builder.concurrent_updates(processor)
+    application = builder.build()
+    application.add_handler(ConversationHandler(
+        entry_points=[CommandHandler('onboard', onboard)],
+        states={
+            STEP_ONE: [MessageHandler(filters.TEXT & ~filters.COMMAND, step_one)],
+            STEP_TWO: [MessageHandler(filters.TEXT & ~filters.COMMAND, step_two)],
+        },
+        fallbacks=[],
+    ))
+    application.add_handler(CommandHandler('myagenda', myagenda))
+    application.add_handler(CommandHandler('analyze', analyze))
+    application.add_handler(MessageHandler(filters.ALL, unexpected))
+    if processor is not None:
+        processor.instrument(application)
+
+    async with application:
+        await application.start()
+        started = time.perf_counter()
+        for data in updates:
+            update = Update.de_json(data, application.bot)
+            enqueued[update.update_id] = time.perf_counter()
+            await application.update_queue.put(update)
+        await done.wait()
+        elapsed = time.perf_counter() - started
+        await application.stop()
+
+    quick = [finished[u['update_id']] - enqueued[u['update_id']] for u in updates
+             if u['message']['text'] == '/myagenda']
+    quick.sort()
+    return {
+        'updates': len(updates),
+        'elapsed_s': round(elapsed, 2),
+        'updates_per_s': round(len(updates) / elapsed, 1),
+        'myagenda_p50_s': round(statistics.median(quick), 3) if quick else None,
+        'myagenda_p95_s': round(quick[int(len(quick) * 0.95) - 1], 3) if quick else None,
+        'conversations_completed': conversations,
+        'order_violations': violations,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--chats', type=int, default=300)
+    parser.add_argument('--slow-share', type=float, default=0.02, help="share of slow /analyze updates")
+    parser.add_argument('--slow-ms', type=float, default=500)
+    parser.add_argument('--fast-ms', type=float, default=5)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--max-in-flight', type=int, default=256)
+    parser.add_argument('--skip-sequential', action='store_true', help="only run the concurrent processor")
+    args = parser.parse_args()
+
+    updates = synthetic_updates(args.updates, args.chats, args.slow_share)
+    slow, fast = args.slow_ms / 1000, args.fast_ms / 1000
+
+    if not args.skip_sequential:
+        print('sequential :', asyncio.run(run(updates, None, slow, fast)))
+    processor = ChatOrderedUpdateProcessor(args.concurrency, args.max_in_flight)
+    print('concurrent :', asyncio.run(run(updates, processor, slow, fast)))
+    print('processor  :', processor.stats())
+    for row in processor.handler_stats():
+        print('  handler  :', row)
+
+
+if __name__ == '__main__':
+    main()
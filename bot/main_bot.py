@@ -4,7 +4,7 @@ Handles all bot operations, commands, and automation
 """
 import os
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import sys
 import os
 # Fix import path to allow importing from database directory
@@ -12,7 +12,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, CallbackQueryHandler,
-    ConversationHandler, filters, ContextTypes, PicklePersistence
+    ConversationHandler, filters, ContextTypes, ApplicationHandlerStop
 )
 from dotenv import load_dotenv
 import asyncio
@@ -23,9 +23,26 @@ from dotenv import load_dotenv
 load_dotenv('config/.env')
 
 from database.models import (
-    init_db, get_session, User, Case, CourtDate, 
-    TimeEntry, LeaveRequest, Notification, ComplianceTask, Document, PaymentRequest
+    User, Case, CourtDate, 
+    TimeEntry, Notification, ComplianceTask, Document, PaymentRequest
 )
+from database.pool import init_pool
+from bot.identity_cache import identity_cache
+from bot.extraction import extraction_pool, text_sidecar_path, ExtractionError
+from bot.ai_client import ai_client
+from bot.analysis_cache import AnalysisCache, sha256_file
+from bot.document_analysis import DocumentAnalyzer, DocumentAnalysis, PAGE_BREAK, split_passages
+from database.document_index import get_document_index
+from bot.broadcast import BroadcastDispatcher, Recipient
+from bot.jobs import JobQueue, PermanentJobError, PRIORITY_HIGH, PRIORITY_NORMAL
+from bot.persistence import DatabasePersistence
+from database.agenda import load_agenda
+from database.dashboard_stats import dashboard_stats
+from database.billing_rollups import BillingRollups
+from database.case_list import load_case_page, count_cases
+from database.presence import get_presence_tracker
+from bot.update_processor import ChatOrderedUpdateProcessor
+from bot.push import get_push_hub
 import uuid
 from bot.scheduler import start_scheduler
 
@@ -39,8 +56,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize database
-engine = init_db()
+# Initialize database (shared pool; handlers get one session per update)
+db = init_pool()
+engine = db.engine
+
+# Duplicate uploads reuse stored extraction + analysis
+analysis_cache = AnalysisCache(engine)
+# Long documents are analyzed map-reduce style, chunk results cached by hash
+document_analyzer = DocumentAnalyzer(ai_client, analysis_cache)
+# Full-text index over uploaded documents (SQLite FTS5 file next to the DB)
+document_index = get_document_index(engine.url)
+# Rate-limited concurrent fan-out for /broadcast
+broadcaster = BroadcastDispatcher(engine)
+# Durable background work (document analysis, broadcasts, reminders); handlers enqueue and return
+job_queue = JobQueue(engine)
+# Per-user/case daily and monthly time totals, kept current by time-entry writers
+billing_rollups = BillingRollups(engine)
+# Staff activity kept in memory; last_seen is written in batches
+presence = get_presence_tracker(engine)
+# Notification/presence events for open Mini-Apps, shared with the API through the database
+push_hub = get_push_hub(engine)
+# Updates run concurrently across chats (one slow handler doesn't hold up other users), in order within a chat
+update_processor = ChatOrderedUpdateProcessor()
 
 # Onboarding conversation states
 (ONBOARD_NAME, ONBOARD_EMAIL, ONBOARD_PHONE, ONBOARD_DEPARTMENT,
@@ -51,6 +88,19 @@ engine = init_db()
 # Profile editing conversation states
 (EDIT_PHONE, EDIT_EMAIL, EDIT_ADDRESS) = range(13, 16)
 
+# Characters of PDF text kept in memory while streaming (the full text goes to the sidecar file)
+DOCUMENT_EXCERPT_CHARS = 10000
+
+# Follow-ups send the passages that best match the question
+FOLLOWUP_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', 4))
+
+# Fallback context when no passages match: per-chunk notes budget, then the excerpt
+FOLLOWUP_NOTES_CHARS = 12000
+FOLLOWUP_EXCERPT_CHARS = 8000
+
+# Update types the handlers use; everything else is never sent to the bot
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
 # Department configuration
 DEPARTMENTS = {
     'partners': {'name': 'Partners & Management', 'icon': '👔', 'max_members': 3},
@@ -65,26 +115,18 @@ DEPARTMENTS = {
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start command - Welcome message"""
     user = update.effective_user
-    session = get_session(engine)
+    session = db.session()
     
     # Check if user exists
     db_user = session.query(User).filter_by(telegram_id=user.id).first()
     
     if db_user and db_user.onboarding_completed:
-        # Fetch latest broadcast
-        latest_broadcast = session.query(Notification).filter_by(notification_type='broadcast').order_by(Notification.created_at.desc()).first()
-        broadcast_param = ""
-        if latest_broadcast:
-            import urllib.parse
-            msg = urllib.parse.quote(latest_broadcast.message)
-            time = urllib.parse.quote(latest_broadcast.created_at.strftime('%d-%m-%Y %H:%M'))
-            broadcast_param = f"?broadcast={msg}&time={time}"
-
-        # Existing user - show main menu
+        # Existing user - show main menu (the Mini-App loads broadcasts itself and
+        # receives new ones over /api/events)
         keyboard = [
-            [InlineKeyboardButton("📱 Open Virtual Office", web_app=WebAppInfo(url=os.getenv('MINI_APP_URL') + broadcast_param))],
+            [InlineKeyboardButton("📱 Open Virtual Office", web_app=WebAppInfo(url=os.getenv('MINI_APP_URL')))],
             [InlineKeyboardButton("📋 My Agenda", callback_data='my_agenda')],
-            [InlineKeyboardButton("📊 Dashboard", web_app=WebAppInfo(url=os.getenv('MINI_APP_URL') + broadcast_param))],
+            [InlineKeyboardButton("📊 Dashboard", web_app=WebAppInfo(url=os.getenv('MINI_APP_URL')))],
             [InlineKeyboardButton("ℹ️ Help", callback_data='help')]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -403,7 +445,7 @@ async def confirm_onboarding(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.answer()
     
     user = update.effective_user
-    session = get_session(engine)
+    session = db.session()
     
     try:
         # Check if user exists
@@ -432,6 +474,7 @@ async def confirm_onboarding(update: Update, context: ContextTypes.DEFAULT_TYPE)
         db_user.status = 'active'
         
         session.commit()
+        identity_cache.invalidate(user.id)
         
         # Welcome message with main menu
         keyboard = [
@@ -479,7 +522,7 @@ async def dashboard_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.answer()
     
     user = update.effective_user
-    session = get_session(engine)
+    session = db.session()
     
     try:
         db_user = session.query(User).filter_by(telegram_id=user.id).first()
@@ -490,46 +533,8 @@ async def dashboard_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
             )
             return
         
-        # Get statistics
-        from sqlalchemy import func, and_
-        from datetime import datetime, timedelta
-        
-        today = datetime.now().date()
-        week_from_now = today + timedelta(days=7)
-        
-        # Count active cases
-        active_cases = session.query(Case).filter(
-            Case.assigned_to == db_user.id,
-            Case.status.in_(['open', 'in_progress'])
-        ).count()
-        
-        # Count pending time entries (today)
-        time_entries_today = session.query(TimeEntry).filter(
-            TimeEntry.user_id == db_user.id,
-            func.date(TimeEntry.date) == today
-        ).count()
-        
-        # Get upcoming court dates
-        upcoming_court_dates = session.query(CourtDate).join(Case).filter(
-            Case.assigned_to == db_user.id,
-            CourtDate.hearing_date >= datetime.now(),
-            CourtDate.hearing_date <= datetime.combine(week_from_now, datetime.max.time())
-        ).count()
-        
-        # Get leave request status
-        pending_leave = session.query(LeaveRequest).filter(
-            LeaveRequest.user_id == db_user.id,
-            LeaveRequest.status == 'pending'
-        ).count()
-        
-        # Get total billable hours this month
-        from datetime import date
-        first_day_month = date.today().replace(day=1)
-        total_hours = session.query(func.sum(TimeEntry.duration)).filter(
-            TimeEntry.user_id == db_user.id,
-            TimeEntry.date >= first_day_month,
-            TimeEntry.billable == True
-        ).scalar() or 0
+        # All counters in one query, cached briefly per user (Refresh taps reuse it)
+        stats = dashboard_stats.get(session, db_user.id)
         
         # Build dashboard message
         dashboard_text = (
@@ -537,12 +542,12 @@ async def dashboard_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
             f"🏢 **Department(s):** {db_user.departments}\n"
             f"💼 **Position:** {db_user.position}\n\n"
             f"**📈 Your Statistics:**\n"
-            f"• Active Cases: {active_cases}\n"
-            f"• Time Entries Today: {time_entries_today}\n"
-            f"• Upcoming Court Dates (7 days): {upcoming_court_dates}\n"
-            f"• Pending Leave Requests: {pending_leave}\n"
-            f"• Billable Hours (This Month): {total_hours:.1f}h\n\n"
-            f"_Last updated: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}_"
+            f"• Active Cases: {stats.active_cases}\n"
+            f"• Time Entries Today: {stats.time_entries_today}\n"
+            f"• Upcoming Court Dates (7 days): {stats.court_dates_week}\n"
+            f"• Pending Leave Requests: {stats.pending_leave}\n"
+            f"• Billable Hours (This Month): {stats.billable_hours_month:.1f}h\n\n"
+            f"_Last updated: {stats.computed_at.strftime('%B %d, %Y at %I:%M %p')}_"
         )
         
         keyboard = [
@@ -589,46 +594,84 @@ async def newcase(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+CASES_PAGE_SIZE = 10
+
+
+def _case_list_message(page, total=None):
+    """Message text and keyboard for a CasePage (total shown on the first page only)"""
+    if total is not None:
+        message = f"📋 **All Cases ({total} total)**\n\n"
+    else:
+        message = "📋 **All Cases**\n\n"
+    
+    keyboard = []
+    for case in page.cases:
+        status_emoji = "🟢" if case.status == "active" else "🟡" if case.status == "pending" else "🔴"
+        message += (
+            f"{status_emoji} **{case.case_number}**\n"
+            f"   {case.title}\n"
+            f"   Client: {case.client_name}\n"
+            f"   Status: {case.status.upper()}\n"
+            f"   Updated: {case.updated_at.strftime('%b %d, %Y')}\n\n"
+        )
+        
+        # Add button for each case
+        keyboard.append([InlineKeyboardButton(
+            f"📄 View {case.case_number}", 
+            callback_data=f'view_case_{case.id}'
+        )])
+    
+    if total is not None and total > len(page.cases):
+        message += f"\n_Showing {len(page.cases)} of {total} cases_"
+    
+    navigation = []
+    if page.prev_cursor:
+        navigation.append(InlineKeyboardButton("⬅️ Newer", callback_data=f'cases_prev_{page.prev_cursor}'))
+    if page.next_cursor:
+        navigation.append(InlineKeyboardButton("Older ➡️", callback_data=f'cases_next_{page.next_cursor}'))
+    if navigation:
+        keyboard.append(navigation)
+    
+    return message, InlineKeyboardMarkup(keyboard)
+
+
+async def casestatus_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the next/previous page of /casestatus"""
+    query = update.callback_query
+    await query.answer()
+    
+    direction, cursor = query.data[len('cases_'):].split('_', 1)
+    session = db.session()
+    try:
+        page = load_case_page(session, cursor=cursor, direction=direction, limit=CASES_PAGE_SIZE)
+        if not page.cases:
+            await query.edit_message_text("📋 No more cases.")
+            return
+        message, reply_markup = _case_list_message(page)
+        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='Markdown')
+    except ValueError:
+        await query.edit_message_text("❌ This case list has expired. Run /casestatus again.")
+    finally:
+        session.close()
+
+
 async def casestatus(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """/casestatus [id] - Check status of cases"""
-    session = get_session(engine)
+    session = db.session()
     
     try:
-        # If no args, show all cases
+        # If no args, show the most recently updated cases a page at a time
         if not context.args:
-            cases = session.query(Case).order_by(Case.updated_at.desc()).all()
+            page = load_case_page(session, limit=CASES_PAGE_SIZE)
             
-            if not cases:
+            if not page.cases:
                 await update.message.reply_text(
                     "📋 **No cases found**\n\n"
                     "There are currently no cases in the system."
                 )
                 return
             
-            # Build message with all cases
-            message = f"📋 **All Cases ({len(cases)} total)**\n\n"
-            
-            keyboard = []
-            for case in cases[:10]:  # Limit to 10 most recent
-                status_emoji = "🟢" if case.status == "active" else "🟡" if case.status == "pending" else "🔴"
-                message += (
-                    f"{status_emoji} **{case.case_number}**\n"
-                    f"   {case.title}\n"
-                    f"   Client: {case.client_name}\n"
-                    f"   Status: {case.status.upper()}\n"
-                    f"   Updated: {case.updated_at.strftime('%b %d, %Y')}\n\n"
-                )
-                
-                # Add button for each case
-                keyboard.append([InlineKeyboardButton(
-                    f"📄 View {case.case_number}", 
-                    callback_data=f'view_case_{case.id}'
-                )])
-            
-            if len(cases) > 10:
-                message += f"\n_Showing 10 of {len(cases)} cases_"
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            message, reply_markup = _case_list_message(page, total=count_cases(session))
             await update.message.reply_text(
                 message,
                 reply_markup=reply_markup,
@@ -745,7 +788,7 @@ async def resources(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def emergency(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """/emergency - Alert partners about urgent matter"""
     user = update.effective_user
-    session = get_session(engine)
+    session = db.session()
     
     try:
         db_user = session.query(User).filter_by(telegram_id=user.id).first()
@@ -869,7 +912,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """/profile - View/edit profile"""
     user = update.effective_user
-    session = get_session(engine)
+    session = db.session()
     
     try:
         db_user = session.query(User).filter_by(telegram_id=user.id).first()
@@ -1096,32 +1139,21 @@ async def myagenda_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user = update.effective_user
-    session = get_session(engine)
+    session = db.session()
     
     try:
         db_user = session.query(User).filter_by(telegram_id=user.id).first()
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # Get Court Dates for next 7 days
-        week_from_now = today_start + timedelta(days=7)
-        court_dates = session.query(CourtDate).join(Case).filter(
-            Case.assigned_to == db_user.id,
-            CourtDate.hearing_date >= today_start,
-            CourtDate.hearing_date <= week_from_now
-        ).order_by(CourtDate.hearing_date).limit(5).all()
-        
-        # Get Compliance Tasks
-        tasks = session.query(ComplianceTask).filter(
-            ComplianceTask.assigned_to == db_user.id,
-            ComplianceTask.status == 'pending'
-        ).order_by(ComplianceTask.deadline).limit(5).all()
+        # Same shared loader as /myagenda: one column-only query per section, no per-row loads
+        agenda = load_agenda(session, db_user.id)
+        court_dates = agenda.court_dates[:5]
+        tasks = agenda.tasks[:5]
 
         msg = f"📋 **My Agenda - {db_user.full_name}**\n\n"
         
         msg += "**🏛️ Upcoming Hearings (7 Days):**\n"
         if court_dates:
             for cd in court_dates:
-                msg += f"• {cd.hearing_date.strftime('%d/%m %H:%M')} - {cd.case.case_number}\n"
+                msg += f"• {cd.hearing_date.strftime('%d/%m %H:%M')} - {cd.case_number}\n"
         else:
             msg += "_No upcoming hearings this week._\n"
             
@@ -1246,253 +1278,382 @@ def main():
     
     # Start bot
     logger.info("🚀 City Law Firm Bot is starting...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 
 
 
-def extract_text_from_file(file_path: str) -> str:
-    """Extract text content from various file types"""
-    import PyPDF2
-    from docx import Document as DocxDocument
-    import json
-    import markdown
-    from openpyxl import load_workbook
-    
-    file_extension = file_path.lower().split('.')[-1]
-    
-    try:
-        if file_extension == 'pdf':
-            # Extract from PDF with improved error handling
-            try:
-                with open(file_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file, strict=False)  # Non-strict mode
-                    text = ""
-                    num_pages = len(pdf_reader.pages)
-                    
-                    for i, page in enumerate(pdf_reader.pages):
-                        try:
-                            page_text = page.extract_text()
-                            if page_text:
-                                text += page_text + "\n"
-                        except Exception as page_error:
-                            logger.warning(f"Error extracting page {i+1}: {page_error}")
-                            continue
-                    
-                    if text.strip():
-                        return text.strip()
-                    else:
-                        return f"PDF has {num_pages} pages but no extractable text found. It may be scanned/image-based."
-                        
-            except Exception as pdf_error:
-                logger.error(f"PDF extraction error: {pdf_error}")
-                return f"Error reading PDF: {str(pdf_error)}. The file may be corrupted or password-protected."
-                
-        elif file_extension in ['docx', 'doc']:
-            # Extract from Word document
-            doc = DocxDocument(file_path)
-            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-            if text.strip():
-                return text.strip()
-            else:
-                return "Word document appears to be empty or contains only images."
-            
-        elif file_extension == 'txt':
-            # Extract from text file
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read().strip()
-                return content if content else "Text file is empty."
-        
-        elif file_extension == 'md':
-            # Extract from Markdown file
-            with open(file_path, 'r', encoding='utf-8') as file:
-                md_content = file.read()
-                # Convert markdown to plain text (strip formatting)
-                html = markdown.markdown(md_content)
-                # Simple HTML tag removal
-                import re
-                text = re.sub('<[^<]+?>', '', html)
-                return text.strip() if text.strip() else "Markdown file is empty."
-        
-        elif file_extension == 'json':
-            # Extract from JSON file
-            with open(file_path, 'r', encoding='utf-8') as file:
-                json_data = json.load(file)
-                # Convert JSON to formatted string
-                formatted_json = json.dumps(json_data, indent=2)
-                return f"JSON Content:\n{formatted_json}"
-        
-        elif file_extension in ['xlsx', 'xls']:
-            # Extract from Excel file
-            wb = load_workbook(file_path, data_only=True)
-            text = ""
-            for sheet_name in wb.sheetnames:
-                sheet = wb[sheet_name]
-                text += f"\n=== Sheet: {sheet_name} ===\n"
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = "\t".join([str(cell) if cell is not None else "" for cell in row])
-                    if row_text.strip():
-                        text += row_text + "\n"
-            return text.strip() if text.strip() else "Excel file appears to be empty."
-                
-        else:
-            return f"Unsupported file type: {file_extension}. Supported: PDF, DOCX, TXT, MD, JSON, XLSX"
-            
-    except Exception as e:
-        logger.error(f"Error extracting text from {file_path}: {e}")
-        return f"Error extracting text: {str(e)}"
-
-
+async def analyze_document_with_ai(text_content, filename: str) -> DocumentAnalysis:
+    """Analyze document using OpenAI API.
 
-async def analyze_document_with_ai(text_content: str, filename: str) -> str:
-    """Analyze document using OpenAI API"""
-    from openai import OpenAI
-    
+    text_content is the extracted text or an async iterable of page texts; long documents
+    are split into chunks, analyzed concurrently and merged into one summary.
+    """
     try:
-        logger.info(f"Starting AI analysis for {filename}, text length: {len(text_content)} chars")
+        logger.info(f"Starting AI analysis for {filename}")
         
         # Configure OpenAI API
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            return "**AI Analysis Error:**\n\nOpenAI API key not configured. Please add OPENAI_API_KEY to .env file."
-        
-        client = OpenAI(api_key=api_key)
-        
-        # Limit text to avoid timeouts (10000 chars ~ 2500 tokens)
-        text_sample = text_content[:10000] if len(text_content) > 10000 else text_content
-        
-        # Create analysis prompt
-        prompt = f"""You are a legal document analyzer. Analyze this document and provide:
-
-1. **Document Type**: Identify the type (Contract, Brief, Correspondence, etc.)
-2. **Summary**: 2-3 sentence summary
-3. **Key Parties**: List important parties/entities
-4. **Important Dates**: Extract significant dates
-5. **Legal Issues**: Main legal matters
-6. **Action Items**: Required actions
-7. **Risk Assessment**: Brief risk assessment
-
-Filename: {filename}
-
-Content (first 10000 chars):
-{text_sample}
-
-Format your response clearly and concisely."""
-
-        logger.info("Sending request to OpenAI API...")
+        if not ai_client.configured:
+            if not isinstance(text_content, str):
+                async for _ in text_content:
+                    pass  # still extract the pages (sidecar and excerpt)
+            return DocumentAnalysis(
+                "**AI Analysis Error:**\n\nOpenAI API key not configured. Please add OPENAI_API_KEY to .env file.", []
+            )
         
-        # Generate analysis with OpenAI
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # Fast and cost-effective
-            messages=[
-                {"role": "system", "content": "You are a legal document analysis expert."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=1000,
-            timeout=60
-        )
+        # Generate analysis with OpenAI (shared async client, gpt-4o-mini: fast and cost-effective)
+        analysis = await document_analyzer.analyze(text_content, filename)
         
         logger.info("Received response from OpenAI API")
         
-        if response and response.choices and response.choices[0].message.content:
-            return response.choices[0].message.content
+        if analysis.summary:
+            return analysis
         else:
-            return "⚠️ **AI Analysis Unavailable**\n\nReceived empty response from AI service."
+            return DocumentAnalysis("⚠️ **AI Analysis Unavailable**\n\nReceived empty response from AI service.", [])
         
+    except ExtractionError:
+        raise
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Error in AI analysis: {error_msg}")
-        return (
+        return DocumentAnalysis(
             "⚠️ **AI Analysis Unavailable**\n\n"
             "The AI service could not be reached to analyze this document. "
             "However, the file has been securely saved to your case files.\n\n"
-            f"_Error details: {error_msg}_"
+            f"_Error details: {error_msg}_",
+            []
         )
 
 
+def _is_ai_error(ai_summary: str) -> bool:
+    """True if analyze_document_with_ai returned an error notice instead of an analysis"""
+    return ai_summary.startswith(("⚠️ **AI Analysis Unavailable**", "**AI Analysis Error:**"))
+
+
+async def _send_document_analysis(bot, chat_id: int, user_data: dict,
+                                  file_name: str, content_hash: str, ai_summary: str, cached: bool = False,
+                                  chunk_keys=None, document_id=None):
+    """Remember the document for follow-ups and send the analysis with action buttons"""
+    # Store document context for follow-up questions. user_data is persisted, so the
+    # text itself stays in the document index / analysis cache and is referenced here
+    user_data['last_document'] = {
+        'filename': file_name,
+        'document_id': document_id,
+        'content_hash': content_hash,
+        'analysis': ai_summary,
+        'chunk_keys': chunk_keys or []
+    }
+    
+    # Send analysis result with follow-up options
+    keyboard = [
+        [
+            InlineKeyboardButton("📤 Share", switch_inline_query=ai_summary[:50]),
+            InlineKeyboardButton("💾 Save to Case", callback_data='doc_save')
+        ],
+        [InlineKeyboardButton("✅ Done", callback_data='doc_done')],
+        [InlineKeyboardButton("💬 Ask Follow-up Question", callback_data='doc_continue')]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    title = "✅ **Initial Legal Analysis Complete**"
+    if cached:
+        title += "\n_Previously analyzed document, loaded from cache._"
+    
+    await bot.send_message(
+        chat_id=chat_id,
+        text=f"{title}\n\n{ai_summary}",
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
+
+
+class _StatusMessage:
+    """A sent message addressed by chat and message id, editable from background jobs"""
+
+    def __init__(self, bot, chat_id: int, message_id: int):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+
+    async def edit_text(self, text: str, **kwargs):
+        return await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message_id, **kwargs)
+
+
+def _scoped_job(handler):
+    """Give a job handler its own DB session scope, like an update gets"""
+    async def run(application, payload, job):
+        with db.scope():
+            return await handler(application, payload, job)
+    return run
+
+
+async def _stream_pdf_pages(file_path: str, status_msg, progress: dict):
+    """Yield a PDF's page texts as worker processes extract them.
+
+    Pages are also written to the upload's text sidecar, and the first
+    DOCUMENT_EXCERPT_CHARS are collected in progress['excerpt'], so large bundles
+    never sit in memory whole.
+    """
+    sidecar_path = text_sidecar_path(file_path)
+    partial_path = f"{sidecar_path}.part"
+    excerpt = []
+    excerpt_chars = 0
+    last_progress = 0.0
+
+    with open(partial_path, 'w', encoding='utf-8') as sidecar:
+        async for index, page_text, num_pages in extraction_pool.iter_pdf_pages(file_path):
+            progress['num_pages'] = num_pages
+            if index:
+                sidecar.write(PAGE_BREAK)
+            if page_text:
+                sidecar.write(page_text)
+                progress['chars'] += len(page_text)
+                if excerpt_chars < DOCUMENT_EXCERPT_CHARS:
+                    excerpt.append(page_text)
+                    excerpt_chars += len(page_text) + 1
+                    progress['excerpt'] = "\n".join(excerpt)[:DOCUMENT_EXCERPT_CHARS].strip()
+
+            # Page progress, throttled to stay inside Telegram's edit limits
+            now = asyncio.get_running_loop().time()
+            if now - last_progress >= 2 and index + 1 < num_pages:
+                last_progress = now
+                try:
+                    await status_msg.edit_text(
+                        f"📄 **File Received:** {os.path.basename(file_path)}\n"
+                        f"⚖️ **Initial Legal Analysis in progress...**\n\n"
+                        f"_Reading and analyzing page {index + 1} of {num_pages}..._",
+                        parse_mode='Markdown'
+                    )
+                except Exception:
+                    pass
+
+            yield page_text
+
+    os.replace(partial_path, sidecar_path)
+
+
+def _read_text_sidecar(file_path: str) -> str:
+    """Full extracted text of an upload written by _stream_pdf_pages ('' if there is none)"""
+    try:
+        with open(text_sidecar_path(file_path), encoding='utf-8', errors='replace') as f:
+            return f.read()
+    except FileNotFoundError:
+        return ''
+
+
 async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle file uploads and perform AI analysis"""
+    """Handle file uploads: replay a cached analysis or queue the document for analysis"""
     document = update.message.document
-    file_id = document.file_id
-    file_name = document.file_name
+    chat_id = update.effective_chat.id
+    
+    # Fast pre-check: Telegram gives re-sent files the same file_unique_id
+    cached = analysis_cache.lookup(file_unique_id=document.file_unique_id)
+    if cached:
+        await _send_document_analysis(context.bot, chat_id, context.user_data,
+                                      cached.filename, cached.sha256, cached.ai_summary,
+                                      cached=True, chunk_keys=cached.chunk_keys, document_id=cached.document_id)
+        return
+    
+    # Notify user
+    status_msg = await update.message.reply_text(
+        f"📄 **File Received:** {document.file_name}\n"
+        f"⚖️ **Initial Legal Analysis queued...**\n\n"
+        f"_You'll get the analysis here when it's ready._",
+        parse_mode='Markdown'
+    )
+    
+    # Download, extraction and AI analysis run as a durable background job
+    await job_queue.enqueue_async('document_analysis', {
+        'chat_id': chat_id,
+        'user_id': update.effective_user.id,
+        'file_id': document.file_id,
+        'file_unique_id': document.file_unique_id,
+        'file_name': document.file_name,
+        'mime_type': document.mime_type,
+        'file_size': document.file_size,
+        'status_message_id': status_msg.message_id,
+    }, priority=PRIORITY_HIGH, idempotency_key=f"document:{chat_id}:{update.message.message_id}")
+
+
+async def run_document_analysis_job(application: Application, payload: dict, job):
+    """Job: download, extract and analyze an uploaded document, then send the analysis"""
+    bot = application.bot
+    chat_id = payload['chat_id']
+    file_name = payload['file_name']
+    user_data = application.user_data[payload['user_id']]
+    status_msg = _StatusMessage(bot, chat_id, payload['status_message_id'])
     
     # Download file
-    new_file = await context.bot.get_file(file_id)
+    new_file = await bot.get_file(payload['file_id'])
     file_path = f"downloads/{file_name}"
     os.makedirs("downloads", exist_ok=True)
     await new_file.download_to_drive(file_path)
     
-    # Notify user
-    await update.message.reply_text(
-        f"📄 **File Received:** {file_name}\n"
-        f"⚖️ **Initial Legal Analysis in progress...**\n\n"
-        f"_Extracting text and analyzing content..._",
-        parse_mode='Markdown'
-    )
+    # Same bytes uploaded before (e.g. forwarded from another chat)?
+    content_hash = await asyncio.to_thread(sha256_file, file_path)
+    cached = analysis_cache.lookup(sha256=content_hash, file_unique_id=payload['file_unique_id'])
+    if cached:
+        await _send_document_analysis(bot, chat_id, user_data, cached.filename, cached.sha256, cached.ai_summary,
+                                      cached=True, chunk_keys=cached.chunk_keys, document_id=cached.document_id)
+        application.mark_data_for_update_persistence(user_ids=payload['user_id'])
+        return {'cached': True, 'document_id': cached.document_id}
     
-    # Extract text from file
-    text_content = extract_text_from_file(file_path)
+    try:
+        await status_msg.edit_text(
+            f"📄 **File Received:** {file_name}\n"
+            f"⚖️ **Initial Legal Analysis in progress...**\n\n"
+            f"_Extracting text and analyzing content..._",
+            parse_mode='Markdown'
+        )
+    except Exception:
+        pass
+    
+    # Extract text (in worker processes; other updates keep flowing) and analyze with AI.
+    # PDF pages are analyzed in chunks while later pages are still being extracted.
+    if file_name.lower().endswith('.pdf'):
+        progress = {'num_pages': 0, 'chars': 0, 'excerpt': ''}
+        try:
+            analysis = await analyze_document_with_ai(_stream_pdf_pages(file_path, status_msg, progress), file_name)
+        except ExtractionError as e:
+            text_content = f"Error reading PDF: {str(e)}"
+        except Exception as e:
+            logger.error(f"PDF extraction error: {e}")
+            text_content = f"Error reading PDF: {str(e)}. The file may be corrupted or password-protected."
+        else:
+            text_content = progress['excerpt']
+            if not progress['chars']:
+                text_content = (
+                    f"Error: PDF has {progress['num_pages']} pages but no extractable text found. "
+                    f"It may be scanned/image-based."
+                )
+    else:
+        text_content = await extraction_pool.extract(file_path)
+        analysis = None
     
     if text_content.startswith("Error") or text_content.startswith("Unsupported"):
-        await update.message.reply_text(
-            f"❌ {text_content}\n\n"
-            f"Supported formats: PDF, DOCX, TXT, MD, JSON, XLSX",
+        await bot.send_message(
+            chat_id=chat_id,
+            text=f"❌ {text_content}\n\n"
+                 f"Supported formats: PDF, DOCX, TXT, MD, JSON, XLSX",
             parse_mode='Markdown'
         )
-        return
+        return {'error': text_content}
+    
+    if analysis is None:
+        analysis = await analyze_document_with_ai(text_content, file_name)
+    ai_summary = analysis.summary
+    
+    # A PDF's text_content is only the opening excerpt; cache and index the full text
+    full_text = text_content
+    if file_name.lower().endswith('.pdf'):
+        full_text = await asyncio.to_thread(_read_text_sidecar, file_path) or text_content
     
-    # Analyze with AI
-    ai_summary = await analyze_document_with_ai(text_content, file_name)
+    # AI service down: let the queue retry later (finished chunks are cached) before giving up
+    if ai_summary.startswith("⚠️ **AI Analysis Unavailable**") and job.attempts < job.max_attempts:
+        try:
+            await status_msg.edit_text(
+                f"📄 **File Received:** {file_name}\n"
+                f"⏳ **AI service busy** - retrying the analysis shortly...",
+                parse_mode='Markdown'
+            )
+        except Exception:
+            pass
+        raise RuntimeError(f"AI analysis unavailable for {file_name}")
     
     # Save to DB
-    session = get_session(engine)
+    session = db.session()
     try:
-        user = update.effective_user
-        db_user = session.query(User).filter_by(telegram_id=user.id).first()
+        db_user = session.query(User).filter_by(telegram_id=payload['user_id']).first()
         
         new_doc = Document(
             filename=file_name,
             file_path=file_path,
-            file_type=document.mime_type,
-            file_size=document.file_size,
+            file_type=payload['mime_type'],
+            file_size=payload['file_size'],
             ai_summary=ai_summary,
             uploaded_by=db_user.id if db_user else None
         )
         session.add(new_doc)
         session.commit()
         
-        # Store document context for follow-up questions
-        context.user_data['last_document'] = {
-            'filename': file_name,
-            'text_content': text_content,
-            'analysis': ai_summary
-        }
+        # Only successful analyses are worth replaying for duplicate uploads
+        if not _is_ai_error(ai_summary):
+            analysis_cache.store(content_hash, payload['file_unique_id'], file_name, full_text, ai_summary,
+                                 new_doc.id, chunk_keys=analysis.chunk_keys)
         
-        # Send analysis result with follow-up options
-        keyboard = [
-            [
-                InlineKeyboardButton("📤 Share", switch_inline_query=ai_summary[:50]),
-                InlineKeyboardButton("💾 Save to Case", callback_data='doc_save')
-            ],
-            [InlineKeyboardButton("✅ Done", callback_data='doc_done')],
-            [InlineKeyboardButton("💬 Ask Follow-up Question", callback_data='doc_continue')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        await _send_document_analysis(bot, chat_id, user_data, file_name, content_hash, ai_summary,
+                                      chunk_keys=analysis.chunk_keys, document_id=new_doc.id)
+        application.mark_data_for_update_persistence(user_ids=payload['user_id'])
         
-        await update.message.reply_text(
-            f"✅ **Initial Legal Analysis Complete**\n\n{ai_summary}",
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        await _index_document(new_doc.id, file_name, '' if _is_ai_error(ai_summary) else ai_summary,
+                              full_text, payload['mime_type'], new_doc.uploaded_by)
+        return {'document_id': new_doc.id}
         
     except Exception as e:
         logger.error(f"Error saving document: {e}")
-        await update.message.reply_text("❌ Error saving document analysis.")
+        await bot.send_message(chat_id=chat_id, text="❌ Error saving document analysis.")
+        raise PermanentJobError(f"Error saving document: {e}")
     finally:
         session.close()
 
 
+async def _index_document(document_id: int, file_name: str, ai_summary: str,
+                          text_content: str, file_type: str, uploaded_by):
+    """Add a saved document (its full text) and its retrieval passages to the index"""
+    def _index():
+        document_index.add(document_id, file_name, ai_summary, text_content,
+                           file_type=file_type, uploaded_by=uploaded_by, chunks=split_passages(text_content))
+
+    try:
+        await asyncio.to_thread(_index)
+    except Exception as e:
+        logger.error(f"Error indexing document {document_id}: {e}")
+
+
+async def searchdocs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/searchdocs <terms> [page] - Search uploaded documents"""
+    session = db.session()
+    try:
+        identity = identity_cache.resolve(session, update.effective_user.id)
+    finally:
+        session.close()
+    if not identity:
+        await update.message.reply_text("⛔ Please complete onboarding with /start first.")
+        return
+    
+    args = list(context.args or [])
+    page = 1
+    if len(args) > 1 and args[-1].isdigit():
+        page = int(args.pop())
+    query = " ".join(args)
+    if not query:
+        await update.message.reply_text(
+            "🔎 **Search Documents**\n\n"
+            "Usage: `/searchdocs <terms> [page]`\n"
+            "Example: `/searchdocs lease termination`",
+            parse_mode='Markdown'
+        )
+        return
+    
+    results = await asyncio.to_thread(document_index.search, query, page, 5)
+    if not results.total:
+        await update.message.reply_text(f"🔎 No documents match \"{query}\".")
+        return
+    
+    pages = (results.total + results.per_page - 1) // results.per_page
+    if not results.hits:
+        await update.message.reply_text(f"🔎 Page {results.page} is past the last page ({pages}) for \"{query}\".")
+        return
+    message = f"🔎 **{results.total} document(s) match \"{query}\"** (page {results.page}/{pages})\n\n"
+    for hit in results.hits:
+        snippet = " ".join(hit.snippet.replace('*', '').replace('_', ' ').replace('`', "'").split())
+        message += f"📄 **{hit.filename}** (#{hit.document_id})\n_{snippet}_\n\n"
+    if results.page < pages:
+        message += f"Next page: `/searchdocs {query} {results.page + 1}`"
+    
+    await update.message.reply_text(message, parse_mode='Markdown')
+
+
 async def handle_payment_link_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """/paymentlink [amount] [case_ref] - Generate payment link (Super Admin only)"""
     user = update.effective_user
@@ -1527,7 +1688,7 @@ async def handle_payment_link_command(update: Update, context: ContextTypes.DEFA
         # Generate unique token
         token = str(uuid.uuid4())
         
-        session = get_session(engine)
+        session = db.session()
         try:
             # Create link record
             db_user = session.query(User).filter_by(telegram_id=user.id).first()
@@ -1579,7 +1740,7 @@ async def handle_web_app_data(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     if action == 'new_case':
         # Save to database
-        session = get_session(engine)
+        session = db.session()
         try:
             user = update.effective_user
             db_user = session.query(User).filter_by(telegram_id=user.id).first()
@@ -1603,6 +1764,7 @@ async def handle_web_app_data(update: Update, context: ContextTypes.DEFAULT_TYPE
             )
             session.add(new_case)
             session.commit()
+            dashboard_stats.invalidate(db_user.id)
             
             await update.message.reply_text(
                 f"✅ **New Case Saved Successfully**\n\n"
@@ -1645,7 +1807,7 @@ async def handle_web_app_data(update: Update, context: ContextTypes.DEFAULT_TYPE
         # e.g., await context.bot.send_message(chat_id=hr_user_id, text=f"New Leave Request from...")
 
     elif action == 'edit_profile':
-        session = get_session(engine)
+        session = db.session()
         try:
             user = update.effective_user
             db_user = session.query(User).filter_by(telegram_id=user.id).first()
@@ -1655,6 +1817,7 @@ async def handle_web_app_data(update: Update, context: ContextTypes.DEFAULT_TYPE
                 db_user.phone = data.get('phone', db_user.phone)
                 db_user.address = data.get('address', db_user.address)
                 session.commit()
+                identity_cache.invalidate(user.id)
                 
                 await update.message.reply_text(
                     f"✅ **Profile Updated Successfully**\n\n"
@@ -1751,6 +1914,17 @@ async def doc_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         )
 
 
+def _document_excerpt(doc_context: dict, max_chars: int) -> str:
+    """Opening text of the document behind a last_document entry"""
+    excerpt = ''
+    if doc_context.get('document_id'):
+        excerpt = document_index.document_text(doc_context['document_id'], max_chars)
+    if not excerpt and doc_context.get('content_hash'):
+        excerpt = analysis_cache.text_excerpt(doc_context['content_hash'], max_chars)
+    # Entries saved before document text was kept out of user_data
+    return excerpt or doc_context.get('text_content', '')[:max_chars]
+
+
 async def handle_document_followup(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle text messages for document follow-up questions"""
     # Check if we are awaiting a follow-up and have document context
@@ -1771,15 +1945,31 @@ async def handle_document_followup(update: Update, context: ContextTypes.DEFAULT
     processing_msg = await update.message.reply_text("🤔 Analyzing document context...")
     
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        # Retrieve only the passages of the whole document that match the question
+        passages = []
+        if doc_context.get('document_id'):
+            passages = await asyncio.to_thread(
+                document_index.top_passages, doc_context['document_id'], user_question, FOLLOWUP_TOP_K
+            )
+        
+        if passages:
+            content_label = "relevant passages"
+            document_text = "\n\n".join(f"[Passage {p.chunk_no + 1}]\n{p.text}" for p in passages)
+        else:
+            # Not indexed yet or nothing matched: whole-document notes, else the opening excerpt
+            document_text = document_analyzer.notes_for(doc_context.get('chunk_keys', []), FOLLOWUP_NOTES_CHARS)
+            content_label = "notes"
+            if not document_text:
+                document_text = await asyncio.to_thread(_document_excerpt, doc_context, FOLLOWUP_EXCERPT_CHARS)
+                content_label = "excerpt"
+        logger.info(f"Follow-up context: {len(passages)} passages, {len(document_text)} chars ({content_label})")
         
         # Create prompt with document context
         prompt = f"""You are a legal assistant helping with a document.
         
 Document Filename: {doc_context['filename']}
-Document Content (excerpt):
-{doc_context['text_content'][:8000]}
+Document Content ({content_label}):
+{document_text}
 
 Previous Analysis:
 {doc_context['analysis']}
@@ -1789,8 +1979,7 @@ User Question: {user_question}
 Answer the user's question based on the document content. If the answer is not in the document, state that clearly."""
 
         # Generate answer
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        answer = await ai_client.chat(
             messages=[
                 {"role": "system", "content": "You are a helpful legal assistant."},
                 {"role": "user", "content": prompt}
@@ -1799,8 +1988,6 @@ Answer the user's question based on the document content. If the answer is not i
             max_tokens=800
         )
         
-        answer = response.choices[0].message.content
-        
         # Send answer with options to continue or stop
         keyboard = [
             [InlineKeyboardButton("✅ Done", callback_data='doc_done')],
@@ -1826,7 +2013,7 @@ Answer the user's question based on the document content. If the answer is not i
 async def myagenda(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """/myagenda - View comprehensive daily schedule and tasks"""
     user = update.effective_user
-    session = get_session(engine)
+    session = db.session()
     
     # Handle both command and callback query contexts
     message = update.message if update.message else update.callback_query.message
@@ -1838,71 +2025,40 @@ async def myagenda(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await message.reply_text("⚠️ Please complete onboarding first using /start")
             return
         
-        today = datetime.now().date()
-        week_from_now = today + timedelta(days=7)
-        
-        # 1. Court Dates (Next 7 days)
-        court_dates = session.query(CourtDate).join(Case).filter(
-            Case.assigned_to == db_user.id,
-            CourtDate.hearing_date >= datetime.now(),
-            CourtDate.hearing_date <= datetime.combine(week_from_now, datetime.max.time())
-        ).order_by(CourtDate.hearing_date).all()
-        
-        # 2. Compliance Tasks (Pending)
-        tasks = session.query(ComplianceTask).filter(
-            ComplianceTask.assigned_to == db_user.id,
-            ComplianceTask.status == 'pending'
-        ).all()
-        
-        # 3. Time Entries (Today)
-        from sqlalchemy import func
-        time_entries = session.query(TimeEntry).filter(
-            TimeEntry.user_id == db_user.id,
-            func.date(TimeEntry.date) == today
-        ).all()
-        total_hours = sum(t.duration for t in time_entries)
+        # Court dates, tasks, today's time and the latest broadcast in a fixed number of queries
+        agenda = load_agenda(session, db_user.id)
         
         # Build Agenda Message
-        agenda_text = f"📅 **My Agenda - {today.strftime('%A, %B %d')}**\n\n"
+        agenda_text = f"📅 **My Agenda - {agenda.day.strftime('%A, %B %d')}**\n\n"
         
         # Court Dates Section
         agenda_text += "⚖️ **Upcoming Court Dates:**\n"
-        if court_dates:
-            for cd in court_dates:
+        if agenda.court_dates:
+            for cd in agenda.court_dates:
                 date_str = cd.hearing_date.strftime('%b %d %I:%M %p')
-                agenda_text += f"• {date_str}: {cd.case.case_number} - {cd.purpose or 'Hearing'}\n"
+                agenda_text += f"• {date_str}: {cd.case_number} - {cd.purpose or 'Hearing'}\n"
         else:
             agenda_text += "_No court dates in the next 7 days._\n"
         
         # Tasks Section
         agenda_text += "\n✅ **Pending Tasks:**\n"
-        if tasks:
-            for task in tasks:
+        if agenda.tasks:
+            for task in agenda.tasks:
                 due_str = task.deadline.strftime('%b %d') if task.deadline else "No deadline"
                 agenda_text += f"• {task.title} (Due: {due_str})\n"
         else:
             agenda_text += "_No pending tasks._\n"
             
         # Time Tracking Section
-        agenda_text += f"\n⏱️ **Time Logged Today:** {total_hours:.1f} hours\n"
-        if time_entries:
-            for entry in time_entries:
-                agenda_text += f"• {entry.duration}h - {entry.description}\n"
+        agenda_text += f"\n⏱️ **Time Logged Today:** {agenda.total_hours:.1f} hours\n"
+        for entry in agenda.time_entries:
+            agenda_text += f"• {entry.hours:g}h - {entry.description}\n"
         
-        # Fetch latest broadcast
-        latest_broadcast = session.query(Notification).filter_by(notification_type='broadcast').order_by(Notification.created_at.desc()).first()
-        broadcast_param = ""
-        if latest_broadcast:
-            import urllib.parse
-            msg = urllib.parse.quote(latest_broadcast.message)
-            time = urllib.parse.quote(latest_broadcast.created_at.strftime('%Y-%m-%d %H:%M'))
-            broadcast_param = f"?broadcast={msg}&time={time}"
-
         # Action Buttons
         keyboard = [
             [InlineKeyboardButton("➕ Log Time", web_app=WebAppInfo(url=os.getenv('MINI_APP_URL') + "#time"))],
             [InlineKeyboardButton("📂 New Case", web_app=WebAppInfo(url=os.getenv('MINI_APP_URL') + "#newcase"))],
-            [InlineKeyboardButton("📊 Dashboard", web_app=WebAppInfo(url=os.getenv('MINI_APP_URL') + broadcast_param))]
+            [InlineKeyboardButton("📊 Dashboard", web_app=WebAppInfo(url=os.getenv('MINI_APP_URL')))]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -1975,7 +2131,7 @@ async def process_agenda_input(update: Update, context: ContextTypes.DEFAULT_TYP
     """Process text input for adding agenda items"""
     user = update.effective_user
     text = update.message.text
-    session = get_session(engine)
+    session = db.session()
     
     try:
         db_user = session.query(User).filter_by(telegram_id=user.id).first()
@@ -2018,6 +2174,22 @@ async def process_agenda_input(update: Update, context: ContextTypes.DEFAULT_TYP
                 
                 session.add(court_date)
                 session.commit()
+                dashboard_stats.invalidate(db_user.id)
+                
+                # Court date reminder, 1 day before (hearing times are entered in local time)
+                remind_at = (hearing_date - timedelta(days=1)).astimezone(timezone.utc).replace(tzinfo=None)
+                if remind_at > datetime.utcnow():
+                    await schedule_reminder(
+                        update.effective_chat.id,
+                        f"⏰ **Court date tomorrow**\n\n"
+                        f"📅 {hearing_date.strftime('%d-%m-%Y %H:%M')}\n"
+                        f"🏛️ {court_name}\n"
+                        f"📋 Case: {case_number}\n"
+                        f"📝 Purpose: {purpose}",
+                        remind_at,
+                        key=f"court_date:{court_date.id}:24h",
+                        parse_mode='Markdown'
+                    )
                 
                 await update.message.reply_text(
                     f"✅ **Court Date Added!**\n\n"
@@ -2101,12 +2273,13 @@ async def promote_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     secret = context.args[0]
     # In production, use os.getenv('ADMIN_SECRET')
     if secret == "admin123":
-        session = get_session(engine)
+        session = db.session()
         try:
             user = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
             if user:
                 user.role = 'admin'
                 session.commit()
+                identity_cache.invalidate(update.effective_user.id)
                 await update.message.reply_text("✅ You are now an Admin!")
             else:
                 await update.message.reply_text("❌ User not found. Please start the bot first.")
@@ -2118,10 +2291,10 @@ async def promote_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def list_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """List all users (Admin only)"""
-    session = get_session(engine)
+    session = db.session()
     try:
         # Check admin
-        admin = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
+        admin = identity_cache.resolve(session, update.effective_user.id)
         if not admin or admin.role != 'admin':
             await update.message.reply_text("⛔ Admin access required.")
             return
@@ -2138,16 +2311,107 @@ async def list_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
         session.close()
 
 
+async def metrics(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show runtime metrics (Admin only)"""
+    session = db.session()
+    try:
+        admin = identity_cache.resolve(session, update.effective_user.id)
+        if not admin or admin.role != 'admin':
+            await update.message.reply_text("⛔ Admin access required.")
+            return
+    finally:
+        session.close()
+
+    pool = db.pool_metrics()
+    msg = (
+        "📈 **Runtime Metrics**\n\n"
+        "**🗄️ DB Pool:**\n"
+        f"• Size: {pool.get('pool_size', 'n/a')} (overflow {pool.get('overflow', 0)}/{pool.get('max_overflow', 0)})\n"
+        f"• Checked out: {pool.get('checked_out', 0)}\n"
+        f"• Checkouts: {pool['checkouts']} | Timeouts: {pool['timeouts']}\n"
+        f"• Wait: avg {pool['avg_wait_ms']}ms, max {pool['max_wait_ms']}ms\n"
+    )
+    cache = identity_cache.stats()
+    msg += (
+        "\n**👤 Identity Cache:**\n"
+        f"• Entries: {cache['size']}/{cache['maxsize']} (TTL {cache['ttl']:.0f}s)\n"
+        f"• Hits: {cache['hits']} | Misses: {cache['misses']}\n"
+    )
+    stats_cache = dashboard_stats.stats()
+    msg += (
+        "\n**📊 Dashboard Stats Cache:**\n"
+        f"• Entries: {stats_cache['size']} (TTL {stats_cache['ttl']:.0f}s) | "
+        f"Hits: {stats_cache['hits']} | Misses: {stats_cache['misses']}\n"
+    )
+    extraction = extraction_pool.stats()
+    msg += (
+        "\n**📄 Document Extraction:**\n"
+        f"• Queue depth: {extraction['queue_depth']} | Running: {extraction['running']}/{extraction['max_jobs']}\n"
+        f"• Completed: {extraction['completed']} | Failed: {extraction['failed']} | Timeouts: {extraction['timeouts']} | Pool restarts: {extraction['recycles']}\n"
+    )
+    ai = ai_client.stats()
+    msg += (
+        "\n**🤖 AI Calls:**\n"
+        f"• Calls: {ai['calls']} | In flight: {ai['in_flight']}/{ai['max_concurrency']}\n"
+        f"• Retries: {ai['retries']} | Failures: {ai['failures']}\n"
+        f"• Latency: avg {ai['avg_latency_s']}s, max {ai['max_latency_s']}s\n"
+        f"• Tokens: {ai['prompt_tokens']} prompt / {ai['completion_tokens']} completion\n"
+    )
+    doc_cache = analysis_cache.stats()
+    msg += (
+        "\n**🗂️ Analysis Cache:**\n"
+        f"• Entries: {doc_cache['entries']}/{doc_cache['max_entries']} ({doc_cache['size_mb']}/{doc_cache['max_mb']} MB)\n"
+        f"• Hits: {doc_cache['hits']} | Misses: {doc_cache['misses']} | Evictions: {doc_cache['evictions']}\n"
+        f"• Chunk results: {doc_cache['chunk_entries']} (hits {doc_cache['chunk_hits']}, misses {doc_cache['chunk_misses']})\n"
+    )
+    index = document_index.stats()
+    msg += (
+        "\n**🔎 Document Index:**\n"
+        f"• Documents: {index['documents']} ({index['size_mb']} MB)\n"
+    )
+    job_stats = job_queue.stats()
+    msg += (
+        "\n**🧰 Background Jobs:**\n"
+        f"• Queued: {job_stats.get('status_queued', 0)} | Running: {job_stats.get('status_running', 0)} "
+        f"| Failed: {job_stats.get('status_failed', 0)}\n"
+        f"• This process: {job_stats['completed']} done, {job_stats['retried']} retried, {job_stats['failed']} failed\n"
+    )
+    seen = presence.stats()
+    msg += (
+        "\n**🟢 Presence:**\n"
+        f"• Online: {seen['online']} of {seen['tracked']} | Pending writes: {seen['pending']}\n"
+        f"• Touches: {seen['touches']} | Flushes: {seen['flushes']} ({seen['rows_written']} rows, "
+        f"last {seen['last_flush_ms']}ms) | Failures: {seen['failures']}\n"
+    )
+    processing = update_processor.stats()
+    msg += (
+        "\n**⚡ Update Processing:**\n"
+        f"• In flight: {processing['in_flight']}/{processing['max_in_flight']} "
+        f"(running limit {processing['concurrency']}) | Chats: {processing['active_chats']}\n"
+        f"• Processed: {processing['processed']} | Wait: avg {processing['avg_wait_s']}s, max {processing['max_wait_s']}s\n"
+    )
+    for name, calls, errors, avg, slowest in update_processor.handler_stats(limit=5):
+        msg += f"• `{name}`: {calls} calls, avg {avg}s, max {slowest}s" + (f", {errors} errors" if errors else "") + "\n"
+    if isinstance(context.application.persistence, DatabasePersistence):
+        persisted = context.application.persistence.stats()
+        msg += (
+            "\n**💾 Persistence:**\n"
+            f"• Tracked keys: {persisted['tracked_keys']} | Pending: {persisted['pending']}\n"
+            f"• Rows written: {persisted['rows_written']} | Deleted: {persisted['rows_deleted']}\n"
+        )
+    await update.message.reply_text(msg, parse_mode='Markdown')
+
+
 async def block_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Block a user (Admin only)"""
     if not context.args:
         await update.message.reply_text("❌ Usage: /block_user <telegram_id>")
         return
         
-    session = get_session(engine)
+    session = db.session()
     try:
         # Check admin
-        admin = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
+        admin = identity_cache.resolve(session, update.effective_user.id)
         if not admin or admin.role != 'admin':
             await update.message.reply_text("⛔ Admin access required.")
             return
@@ -2157,6 +2421,7 @@ async def block_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if user:
             user.status = 'blocked'
             session.commit()
+            identity_cache.invalidate(target_id)
             await update.message.reply_text(f"🚫 User {user.full_name} has been BLOCKED.")
         else:
             await update.message.reply_text("❌ User not found.")
@@ -2172,10 +2437,10 @@ async def unblock_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Usage: /unblock_user <telegram_id>")
         return
         
-    session = get_session(engine)
+    session = db.session()
     try:
         # Check admin
-        admin = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
+        admin = identity_cache.resolve(session, update.effective_user.id)
         if not admin or admin.role != 'admin':
             await update.message.reply_text("⛔ Admin access required.")
             return
@@ -2185,6 +2450,7 @@ async def unblock_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if user:
             user.status = 'active'
             session.commit()
+            identity_cache.invalidate(target_id)
             await update.message.reply_text(f"✅ User {user.full_name} has been UNBLOCKED.")
         else:
             await update.message.reply_text("❌ User not found.")
@@ -2200,10 +2466,10 @@ async def delete_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Usage: /delete_user <telegram_id>")
         return
         
-    session = get_session(engine)
+    session = db.session()
     try:
         # Check admin
-        admin = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
+        admin = identity_cache.resolve(session, update.effective_user.id)
         if not admin or admin.role != 'admin':
             await update.message.reply_text("⛔ Admin access required.")
             return
@@ -2215,6 +2481,7 @@ async def delete_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # For now just delete user
             session.delete(user)
             session.commit()
+            identity_cache.invalidate(target_id)
             await update.message.reply_text(f"🗑️ User {user.full_name} has been DELETED.")
         else:
             await update.message.reply_text("❌ User not found.")
@@ -2224,25 +2491,37 @@ async def delete_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         session.close()
 
 # --- Middleware ---
+class ScopedSessionApplication(Application):
+    """Application that gives every update its own pooled DB session"""
+
+    async def process_update(self, update):
+        with db.scope():
+            await super().process_update(update)
+
+
 async def check_block(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Check if user is blocked"""
     if not update.effective_user:
         return
         
-    session = get_session(engine)
+    session = db.session()
     try:
-        user = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
-        if user and user.status == 'blocked':
-            # Stop processing
-            raise Application.StopPropagation
+        user = identity_cache.resolve(session, update.effective_user.id)
     finally:
         session.close()
 
+    if user and user.status == 'blocked':
+        # Stop processing
+        raise ApplicationHandlerStop
+
+    if user:
+        presence.touch(user.id)
+
 # --- Profile Actions ---
 
 async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """View and manage user profile"""
-    session = get_session(engine)
+    session = db.session()
     try:
         user = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
         if not user:
@@ -2305,12 +2584,13 @@ async def edit_profile_callback(update: Update, context: ContextTypes.DEFAULT_TY
 async def handle_edit_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle phone number update"""
     new_phone = update.message.text.strip()
-    session = get_session(engine)
+    session = db.session()
     try:
         user = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
         if user:
             user.phone = new_phone
             session.commit()
+            identity_cache.invalidate(update.effective_user.id)
             await update.message.reply_text(f"✅ Phone number updated to: {new_phone}")
         else:
             await update.message.reply_text("❌ User not found.")
@@ -2327,12 +2607,13 @@ async def handle_edit_email(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⚠️ Please enter a valid email address:")
         return EDIT_EMAIL
     
-    session = get_session(engine)
+    session = db.session()
     try:
         user = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
         if user:
             user.email = new_email
             session.commit()
+            identity_cache.invalidate(update.effective_user.id)
             await update.message.reply_text(f"✅ Email updated to: {new_email}")
         else:
             await update.message.reply_text("❌ User not found.")
@@ -2343,12 +2624,13 @@ async def handle_edit_email(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def handle_edit_address(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle address update"""
     new_address = update.message.text.strip()
-    session = get_session(engine)
+    session = db.session()
     try:
         user = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
         if user:
             user.address = new_address
             session.commit()
+            identity_cache.invalidate(update.effective_user.id)
             await update.message.reply_text(f"✅ Address updated to: {new_address}")
         else:
             await update.message.reply_text("❌ User not found.")
@@ -2374,12 +2656,13 @@ async def delete_account_callback(update: Update, context: ContextTypes.DEFAULT_
             reply_markup=reply_markup
         )
     elif query.data == 'delete_account_final':
-        session = get_session(engine)
+        session = db.session()
         try:
             user = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
             if user:
                 session.delete(user)
                 session.commit()
+                identity_cache.invalidate(update.effective_user.id)
                 await query.edit_message_text("🗑️ **Account Deleted.**\n\nGoodbye!")
             else:
                 await query.edit_message_text("❌ Error: User not found.")
@@ -2410,7 +2693,7 @@ async def logtime(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Invalid hours. Please use a number (e.g., 1.5).")
         return
 
-    session = get_session(engine)
+    session = db.session()
     try:
         user = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
         if not user:
@@ -2435,7 +2718,9 @@ async def logtime(update: Update, context: ContextTypes.DEFAULT_TYPE):
             billable=True
         )
         session.add(entry)
+        billing_rollups.record(session, entry)
         session.commit()
+        dashboard_stats.invalidate(user.id)
         
         await update.message.reply_text(
             f"✅ **Time Logged!**\n\n"
@@ -2450,6 +2735,14 @@ async def logtime(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # --- Notification Board ---
 
+def _broadcast_recipients(session):
+    """Recipients of a broadcast: every active user"""
+    return [
+        Recipient(user_id, telegram_id)
+        for user_id, telegram_id in session.query(User.id, User.telegram_id).filter(User.status == 'active')
+    ]
+
+
 async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a broadcast notification to all users (Admin only)"""
     if not context.args:
@@ -2458,44 +2751,161 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     message_text = " ".join(context.args)
     
-    session = get_session(engine)
+    session = db.session()
     try:
         # Check admin
-        admin = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
+        admin = identity_cache.resolve(session, update.effective_user.id)
         if not admin or admin.role != 'admin':
             await update.message.reply_text("⛔ Admin access required.")
             return
 
-        # Create Notification Record
+        # Create Notification Record (marked sent once delivery finishes)
         notification = Notification(
             title="📢 System Broadcast",
             message=message_text,
             notification_type="broadcast",
             created_by=admin.id,
-            sent=True,
-            sent_at=datetime.utcnow()
+            sent=False
         )
         session.add(notification)
         session.commit()
-        
-        # Send to all users
-        users = session.query(User).filter(User.status == 'active').all()
-        count = 0
-        for user in users:
-            try:
-                await context.bot.send_message(
-                    chat_id=user.telegram_id,
-                    text=f"📢 **ANNOUNCEMENT**\n\n{message_text}",
-                    parse_mode='Markdown'
-                )
-                count += 1
-            except Exception:
-                pass 
-        
-        await update.message.reply_text(f"✅ Broadcast sent to {count} users.")
-        
+        notification_id = notification.id
+        # Open Mini-Apps show it right away; Telegram delivery follows in the background
+        push_hub.publish('notification', {
+            'id': notification.id,
+            'title': notification.title,
+            'message': notification.message,
+            'notification_type': notification.notification_type,
+            'priority': notification.priority,
+            'created_at': notification.created_at,
+        })
+        
+        recipients = _broadcast_recipients(session)
+    finally:
+        session.close()
+    
+    status_msg = await update.message.reply_text(f"📢 Broadcast to {len(recipients)} users queued...")
+    
+    # Deliver as a durable background job so the admin (and everyone else) isn't blocked
+    await job_queue.enqueue_async('broadcast', {
+        'notification_id': notification_id,
+        'message_text': message_text,
+        'recipients': [list(recipient) for recipient in recipients],
+        'chat_id': update.effective_chat.id,
+        'status_message_id': status_msg.message_id,
+    }, priority=PRIORITY_NORMAL, idempotency_key=f"broadcast:{notification_id}")
+
+
+async def run_broadcast_job(application: Application, payload: dict, job):
+    """Job: fan a broadcast out, reporting progress on the admin's status message.
+
+    The recipients are the ones counted when the broadcast was queued; those already
+    delivered to (before a restart or retry) are skipped.
+    """
+    notification_id = payload['notification_id']
+    message_text = payload['message_text']
+    if 'recipients' in payload:
+        recipients = [Recipient(user_id, telegram_id) for user_id, telegram_id in payload['recipients']]
+    else:
+        # Queued before recipients were stored in the payload
+        session = db.session()
+        try:
+            recipients = _broadcast_recipients(session)
+        finally:
+            session.close()
+    status_msg = _StatusMessage(application.bot, payload['chat_id'], payload['status_message_id'])
+    
+    async def on_progress(done, total, counts):
+        try:
+            await status_msg.edit_text(
+                f"📢 Broadcasting... {done}/{total}\n"
+                f"✅ Sent: {counts['sent']} | ❌ Failed: {counts['failed']} | 🚫 Blocked: {counts['blocked']}"
+            )
+        except Exception:
+            pass
+    
+    result = await broadcaster.send(
+        application.bot, notification_id, recipients,
+        text=f"📢 **ANNOUNCEMENT**\n\n{message_text}",
+        parse_mode='Markdown',
+        on_progress=on_progress
+    )
+    
+    session = db.session()
+    try:
+        notification = session.get(Notification, notification_id)
+        if notification:
+            notification.sent = True
+            notification.sent_at = datetime.utcnow()
+            session.commit()
+    finally:
+        session.close()
+    
+    summary = f"✅ Broadcast sent to {result.sent} of {result.total} users in {result.elapsed}s."
+    if result.failed or result.blocked:
+        summary += f"\n❌ Failed: {result.failed} | 🚫 Blocked the bot: {result.blocked}"
+    try:
+        await status_msg.edit_text(summary)
+    except Exception:
+        pass
+    return result._asdict()
+
+
+async def run_reminder_job(application: Application, payload: dict, job):
+    """Job: deliver a scheduled reminder"""
+    await application.bot.send_message(
+        chat_id=payload['chat_id'],
+        text=payload['text'],
+        parse_mode=payload.get('parse_mode')
+    )
+
+
+async def schedule_reminder(chat_id: int, text: str, when: datetime, key: str = None, parse_mode: str = None) -> int:
+    """Queue a reminder for delivery at `when` (UTC); returns the job id.
+
+    Give a `key` (e.g. "court_date:42:24h") so rescheduling the same reminder is a no-op.
+    """
+    return await job_queue.enqueue_async('reminder', {'chat_id': chat_id, 'text': text, 'parse_mode': parse_mode},
+                                         priority=PRIORITY_HIGH, idempotency_key=key, run_after=when)
+
+
+async def jobs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/jobs [failed | retry <id>] - Background job queue status (Admin only)"""
+    session = db.session()
+    try:
+        admin = identity_cache.resolve(session, update.effective_user.id)
+        if not admin or admin.role != 'admin':
+            await update.message.reply_text("⛔ Admin access required.")
+            return
     finally:
         session.close()
+    
+    args = context.args or []
+    if len(args) == 2 and args[0] == 'retry' and args[1].isdigit():
+        if await asyncio.to_thread(job_queue.retry, int(args[1])):
+            await update.message.reply_text(f"🔁 Job #{args[1]} requeued.")
+        else:
+            await update.message.reply_text(f"❌ Job #{args[1]} is not a failed job.")
+        return
+    
+    status = 'failed' if args[:1] == ['failed'] else None
+    counts = await asyncio.to_thread(job_queue.counts)
+    recent = await asyncio.to_thread(job_queue.recent, 10, status)
+    
+    icons = {'queued': '⏳', 'running': '⚙️', 'done': '✅', 'failed': '❌'}
+    msg = "🧰 **Background Jobs**\n\n"
+    msg += " | ".join(f"{icons.get(k, '•')} {k}: {v}" for k, v in sorted(counts.items())) or "No jobs yet."
+    msg += f"\n\n**{'Failed' if status else 'Recent'} jobs:**\n"
+    for job in recent:
+        msg += (
+            f"{icons.get(job.status, '•')} #{job.id} {job.kind} - {job.status} "
+            f"({job.attempts}/{job.max_attempts}) {job.created_at.strftime('%b %d %H:%M')}\n"
+        )
+        if job.status == 'failed' and job.last_error:
+            msg += f"   _{job.last_error[:120].replace('_', ' ').replace('*', '')}_\n"
+    if status:
+        msg += "\nRetry with `/jobs retry <id>`"
+    await update.message.reply_text(msg, parse_mode='Markdown')
 
 async def setup_commands(application: Application):
     """Set up bot commands"""
@@ -2507,6 +2917,7 @@ async def setup_commands(application: Application):
         BotCommand("addagenda", "Add item to agenda"),
         BotCommand("newcase", "Create a new case"),
         BotCommand("casestatus", "Check case status"),
+        BotCommand("searchdocs", "Search uploaded documents"),
         BotCommand("logtime", "Log billable hours"),
         BotCommand("profile", "Manage profile"),
         BotCommand("resources", "Access legal resources"),
@@ -2514,17 +2925,47 @@ async def setup_commands(application: Application):
         BotCommand("refer", "Refer a client"),
         BotCommand("broadcast", "📢 Send broadcast (Admin)"),
         BotCommand("list_users", "👥 List users (Admin)"),
+        BotCommand("metrics", "📈 Runtime metrics (Admin)"),
+        BotCommand("jobs", "🧰 Background jobs (Admin)"),
     ]
     await application.bot.set_my_commands(commands)
 
 
+def publish_presence(change):
+    """Push a staff member coming online or going offline to open Mini-Apps"""
+    push_hub.publish('presence', {
+        'id': change.user_id,
+        'is_online': change.is_online,
+        'last_seen': change.last_seen,
+    })
+
+
+async def start_workers(application: Application):
+    """Register bot commands and start the background job workers"""
+    await setup_commands(application)
+    presence.add_listener(publish_presence)
+    job_queue.register('document_analysis', _scoped_job(run_document_analysis_job))
+    job_queue.register('broadcast', _scoped_job(run_broadcast_job))
+    job_queue.register('reminder', _scoped_job(run_reminder_job))
+    await job_queue.start(application)
+
+
+async def shutdown_workers(application: Application):
+    """Stop background workers and pools and close shared clients"""
+    await job_queue.stop()
+    extraction_pool.shutdown()
+    await ai_client.close()
+    # Write pending last_seen values
+    await asyncio.to_thread(presence.close)
+
+
 async def start_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle back to start callback"""
     query = update.callback_query
     await query.answer()
     
     user = update.effective_user
-    session = get_session(engine)
+    session = db.session()
     try:
         db_user = session.query(User).filter_by(telegram_id=user.id).first()
         if not db_user:
@@ -2563,40 +3004,22 @@ async def dashboard_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.answer()
     
     user = update.effective_user
-    session = get_session(engine)
+    session = db.session()
     try:
         db_user = session.query(User).filter_by(telegram_id=user.id).first()
-        today = datetime.now().date()
-        week_from_now = datetime.now() + timedelta(days=7)
-        
-        # Count active cases
-        active_cases = session.query(Case).filter(
-            Case.assigned_to == db_user.id,
-            Case.status.in_(['open', 'in_progress', 'active'])
-        ).count()
-        
-        # Upcoming court dates
-        upcoming_court = session.query(CourtDate).join(Case).filter(
-            Case.assigned_to == db_user.id,
-            CourtDate.hearing_date >= datetime.now(),
-            CourtDate.hearing_date <= week_from_now
-        ).count()
-        
-        # Pending leave
-        pending_leave = session.query(LeaveRequest).filter(
-            LeaveRequest.user_id == db_user.id,
-            LeaveRequest.status == 'pending'
-        ).count()
+        # All counters in one query, cached briefly per user (Refresh taps reuse it)
+        stats = dashboard_stats.get(session, db_user.id)
         
         dashboard_text = (
             f"📊 **Dashboard - {db_user.full_name}**\n\n"
             f"🏢 **Dept:** {db_user.departments}\n"
             f"💼 **Role:** {db_user.position}\n\n"
             f"**📈 Your Stats:**\n"
-            f"• Active Cases: {active_cases}\n"
-            f"• Court Dates (7d): {upcoming_court}\n"
-            f"• Pending Leave: {pending_leave}\n\n"
-            f"_Last updated: {datetime.now().strftime('%H:%M')}_"
+            f"• Active Cases: {stats.active_cases}\n"
+            f"• Court Dates (7d): {stats.court_dates_week}\n"
+            f"• Pending Leave: {stats.pending_leave}\n"
+            f"• Billable Hours (Month): {stats.billable_hours_month:.1f}h\n\n"
+            f"_Last updated: {stats.computed_at.strftime('%H:%M:%S')}_"
         )
         
         keyboard = [
@@ -2617,11 +3040,25 @@ async def dashboard_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     finally:
         session.close()
 
-def main():
-    """Start the bot"""
-    # Create application
-    persistence = PicklePersistence(filepath='conversationbot')
-    application = Application.builder().token(os.getenv('BOT_TOKEN')).persistence(persistence).post_init(setup_commands).build()
+def build_application() -> Application:
+    """Create the application with persistence and all handlers registered"""
+    persistence = DatabasePersistence(engine)
+    # One-time move of user_data and conversation states from the old pickle file
+    if os.path.exists('conversationbot'):
+        if persistence.import_pickle('conversationbot'):
+            os.replace('conversationbot', 'conversationbot.migrated')
+        else:
+            logger.warning("Ignoring legacy 'conversationbot' pickle: persistence table already has data")
+    application = (
+        Application.builder()
+        .token(os.getenv('BOT_TOKEN'))
+        .application_class(ScopedSessionApplication)
+        .persistence(persistence)
+        .concurrent_updates(update_processor)
+        .post_init(start_workers)
+        .post_shutdown(shutdown_workers)
+        .build()
+    )
     
     # Conversation handler
     onboarding_handler = ConversationHandler(
@@ -2662,6 +3099,9 @@ def main():
     # Admin Commands
     application.add_handler(CommandHandler('promote_admin', promote_admin))
     application.add_handler(CommandHandler('list_users', list_users))
+    application.add_handler(CommandHandler('metrics', metrics))
+    application.add_handler(CommandHandler('jobs', jobs))
+    application.add_handler(CommandHandler('searchdocs', searchdocs))
     application.add_handler(CommandHandler('block_user', block_user))
     application.add_handler(CommandHandler('unblock_user', unblock_user))
     application.add_handler(CommandHandler('delete_user', delete_user))
@@ -2673,6 +3113,7 @@ def main():
     application.add_handler(CommandHandler('addagenda', add_to_agenda))
     application.add_handler(CommandHandler('newcase', newcase))
     application.add_handler(CommandHandler('casestatus', casestatus))
+    application.add_handler(CallbackQueryHandler(casestatus_page_callback, pattern='^cases_(next|prev)_'))
     application.add_handler(CommandHandler('requestleave', requestleave))
     application.add_handler(CommandHandler('resources', resources))
     application.add_handler(CommandHandler('emergency', emergency))
@@ -2733,9 +3174,20 @@ def main():
     # Web App Data Handler
     application.add_handler(MessageHandler(filters.StatusUpdate.WEB_APP_DATA, handle_web_app_data))
     
-    # Start bot
+    update_processor.instrument(application)
+    return application
+
+
+def main():
+    """Start the bot: long polling, or a webhook server when BOT_MODE=webhook"""
+    application = build_application()
+    
     logger.info("🚀 City Law Firm Bot is starting...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if os.getenv('BOT_MODE', 'polling') == 'webhook':
+        from bot.webhook import run_webhook
+        run_webhook(application, allowed_updates=ALLOWED_UPDATES)
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 
 if __name__ == '__main__':
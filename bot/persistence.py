@@ -0,0 +1,311 @@
+"""
+Database Persistence
+python-telegram-bot persistence stored in the bot's database, one row per
+(kind, owner, key): e.g. one user's 'departments' entry or one conversation key.
+Only keys whose pickled value changed since the last write are upserted, in one
+batched transaction per persistence round, so flushes don't grow with the user base.
+
+    python -m bot.persistence  - self-check of change tracking against a throwaway database
+"""
+import os
+import json
+import pickle
+import asyncio
+import hashlib
+import logging
+from copy import deepcopy
+from datetime import datetime
+
+from sqlalchemy import (
+    MetaData, Table, Column, String, LargeBinary, DateTime,
+    select, delete, and_, or_
+)
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+persistence_table = Table(
+    'bot_persistence', metadata,
+    Column('kind', String(16), primary_key=True),   # user, chat, bot, callback, conversation
+    Column('owner', String(64), primary_key=True),  # user/chat id or conversation name
+    Column('key', String(255), primary_key=True),   # data key, or JSON conversation key
+    Column('value', LargeBinary, nullable=False),
+    Column('updated_at', DateTime, default=datetime.utcnow),
+)
+
+# Values above this size are still stored, but logged: big blobs belong elsewhere
+LARGE_VALUE_BYTES = 64 * 1024
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    """Reads PicklePersistence files; bot references it replaced are restored as None"""
+
+    def persistent_load(self, pid):
+        return None
+
+
+def _digest(blob):
+    return hashlib.blake2b(blob, digest_size=16).digest()
+
+
+class DatabasePersistence(BasePersistence):
+    """BasePersistence backed by a bot_persistence table (SQLite or Postgres).
+
+    update_interval defaults to PERSISTENCE_UPDATE_INTERVAL (seconds).
+    """
+
+    def __init__(self, engine, store_data=None, update_interval=None):
+        super().__init__(
+            store_data=store_data or PersistenceInput(),
+            update_interval=update_interval or float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', 60)),
+        )
+        self.engine = engine
+        self._stored = {}   # (kind, owner) -> {key: digest of the stored value}
+        self._pending = {}  # (kind, owner, key) -> pickled value, or None to delete
+        self._write_task = None
+        self.rows_written = 0
+        self.rows_deleted = 0
+        metadata.create_all(engine)
+
+    # --- Loading ---
+
+    def _load(self, kind, owner=None):
+        """{owner: {key: value}} for one kind (optionally one owner)"""
+        t = persistence_table
+        query = select(t.c.owner, t.c.key, t.c.value).where(t.c.kind == kind)
+        if owner is not None:
+            query = query.where(t.c.owner == owner)
+        result = {}
+        with self.engine.connect() as conn:
+            for row_owner, key, blob in conn.execute(query):
+                self._stored.setdefault((kind, row_owner), {})[key] = _digest(blob)
+                result.setdefault(row_owner, {})[key] = pickle.loads(blob)
+        return result
+
+    async def get_user_data(self):
+        rows = await asyncio.to_thread(self._load, 'user')
+        return {int(owner): data for owner, data in rows.items()}
+
+    async def get_chat_data(self):
+        rows = await asyncio.to_thread(self._load, 'chat')
+        return {int(owner): data for owner, data in rows.items()}
+
+    async def get_bot_data(self):
+        rows = await asyncio.to_thread(self._load, 'bot')
+        return rows.get('', {})
+
+    async def get_callback_data(self):
+        rows = await asyncio.to_thread(self._load, 'callback')
+        return rows.get('', {}).get('data')
+
+    async def get_conversations(self, name):
+        rows = await asyncio.to_thread(self._load, 'conversation', name)
+        return {tuple(json.loads(key)): state for key, state in rows.get(name, {}).items()}
+
+    # --- Change tracking ---
+
+    def _stage_value(self, kind, owner, key, value):
+        stored = self._stored.setdefault((kind, owner), {})
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = _digest(blob)
+        if stored.get(key) != digest:
+            if len(blob) > LARGE_VALUE_BYTES:
+                logger.warning(f"Persisting large {kind} value {owner}/{key} ({len(blob)} bytes)")
+            stored[key] = digest
+            self._pending[(kind, owner, key)] = blob
+
+    def _stage_delete(self, kind, owner, keys):
+        stored = self._stored.get((kind, owner), {})
+        for key in list(keys):
+            if stored.pop(key, None) is not None:
+                self._pending[(kind, owner, key)] = None
+
+    def _stage(self, kind, owner, data):
+        """Queue writes for the keys of `data` that changed, and deletes for removed keys"""
+        owner = str(owner)
+        current = {str(key): value for key, value in data.items()}
+        for key, value in current.items():
+            self._stage_value(kind, owner, key, value)
+        self._stage_delete(kind, owner, [k for k in self._stored.get((kind, owner), {}) if k not in current])
+        self._schedule_write()
+
+    def _schedule_write(self):
+        # All update_* calls of one persistence round land in a single write
+        if self._pending and (self._write_task is None or self._write_task.done()):
+            self._write_task = asyncio.get_running_loop().create_task(self._write_soon())
+
+    async def _write_soon(self):
+        await asyncio.sleep(0)
+        await self._write_pending()
+
+    async def _write_pending(self):
+        while self._pending:
+            batch, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                logger.error(f"Persistence write failed, will retry on next update: {e}")
+                # Keep newer staged values; forget digests so the keys are rewritten next round
+                for (kind, owner, key), blob in batch.items():
+                    self._pending.setdefault((kind, owner, key), blob)
+                    self._stored.get((kind, owner), {}).pop(key, None)
+                return
+
+    def _upsert(self, conn, rows):
+        t = persistence_table
+        dialect = self.engine.dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            # No portable upsert: replace the rows
+            self._delete(conn, [(r['kind'], r['owner'], r['key']) for r in rows])
+            conn.execute(t.insert(), rows)
+            return
+        statement = insert(t)
+        conn.execute(statement.on_conflict_do_update(
+            index_elements=[t.c.kind, t.c.owner, t.c.key],
+            set_={'value': statement.excluded.value, 'updated_at': statement.excluded.updated_at},
+        ), rows)
+
+    def _delete(self, conn, keys):
+        t = persistence_table
+        for start in range(0, len(keys), 200):
+            conn.execute(delete(t).where(or_(*(
+                and_(t.c.kind == kind, t.c.owner == owner, t.c.key == key)
+                for kind, owner, key in keys[start:start + 200]
+            ))))
+
+    def _write(self, batch):
+        now = datetime.utcnow()
+        rows = [{'kind': k[0], 'owner': k[1], 'key': k[2], 'value': blob, 'updated_at': now}
+                for k, blob in batch.items() if blob is not None]
+        removed = [k for k, blob in batch.items() if blob is None]
+        with self.engine.begin() as conn:
+            if rows:
+                self._upsert(conn, rows)
+            if removed:
+                self._delete(conn, removed)
+        self.rows_written += len(rows)
+        self.rows_deleted += len(removed)
+
+    # --- BasePersistence updates ---
+
+    async def update_user_data(self, user_id, data):
+        self._stage('user', user_id, data)
+
+    async def update_chat_data(self, chat_id, data):
+        self._stage('chat', chat_id, data)
+
+    async def update_bot_data(self, data):
+        self._stage('bot', '', data)
+
+    async def update_callback_data(self, data):
+        self._stage('callback', '', {'data': deepcopy(data)})
+
+    async def update_conversation(self, name, key, new_state):
+        key = json.dumps(list(key))
+        if new_state is None:
+            self._stage_delete('conversation', name, [key])
+        else:
+            self._stage_value('conversation', name, key, new_state)
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id):
+        self._stage_delete('user', str(user_id), list(self._stored.get(('user', str(user_id)), {})))
+        self._schedule_write()
+
+    async def drop_chat_data(self, chat_id):
+        self._stage_delete('chat', str(chat_id), list(self._stored.get(('chat', str(chat_id)), {})))
+        self._schedule_write()
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        if self._write_task is not None:
+            await self._write_task
+        await self._write_pending()
+
+    # --- Migration ---
+
+    def import_pickle(self, filepath):
+        """One-off import of a PicklePersistence file into an empty table; returns True if imported"""
+        t = persistence_table
+        with self.engine.connect() as conn:
+            if conn.execute(select(t.c.kind).limit(1)).first() is not None:
+                return False
+        with open(filepath, 'rb') as f:
+            data = _LegacyUnpickler(f).load()
+
+        batch = {}
+
+        def add(kind, owner, values):
+            for key, value in values.items():
+                batch[(kind, str(owner), str(key))] = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+        for user_id, values in (data.get('user_data') or {}).items():
+            add('user', user_id, values)
+        for chat_id, values in (data.get('chat_data') or {}).items():
+            add('chat', chat_id, values)
+        add('bot', '', data.get('bot_data') or {})
+        if data.get('callback_data') is not None:
+            add('callback', '', {'data': data['callback_data']})
+        for name, states in (data.get('conversations') or {}).items():
+            add('conversation', name, {json.dumps(list(key)): state for key, state in states.items()})
+
+        with self.engine.begin() as conn:
+            self._upsert(conn, [{'kind': k[0], 'owner': k[1], 'key': k[2], 'value': blob,
+                                 'updated_at': datetime.utcnow()} for k, blob in batch.items()])
+        logger.info(f"Imported {len(batch)} persisted entries from {filepath}")
+        return True
+
+    def stats(self):
+        return {
+            'tracked_keys': sum(len(keys) for keys in self._stored.values()),
+            'pending': len(self._pending),
+            'rows_written': self.rows_written,
+            'rows_deleted': self.rows_deleted,
+        }
+
+
+if __name__ == '__main__':
+    import tempfile
+    from sqlalchemy import create_engine
+
+    async def check():
+        # A file database: writes run in worker threads, which wouldn't share a :memory: one
+        persistence = DatabasePersistence(create_engine(f"sqlite:///{tempfile.mkdtemp()}/persistence_check.db"))
+
+        # PTB calls these every round, usually with empty dicts and before anything is stored
+        await persistence.update_bot_data({})
+        await persistence.update_user_data(123, {})
+        await persistence.update_chat_data(456, {})
+        await persistence.flush()
+        assert persistence.rows_written == 0, persistence.stats()
+
+        await persistence.update_user_data(123, {'departments': ['litigation'], 'step': 1})
+        await persistence.flush()
+        assert persistence.rows_written == 2, persistence.stats()
+
+        # Unchanged values aren't rewritten; removed keys are deleted
+        await persistence.update_user_data(123, {'departments': ['litigation']})
+        await persistence.flush()
+        assert (persistence.rows_written, persistence.rows_deleted) == (2, 1), persistence.stats()
+        assert await persistence.get_user_data() == {123: {'departments': ['litigation']}}
+
+        await persistence.update_user_data(123, {})
+        await persistence.flush()
+        assert await persistence.get_user_data() == {}
+        print('ok', persistence.stats())
+
+    asyncio.run(check())
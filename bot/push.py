@@ -0,0 +1,231 @@
+"""
+Push Hub
+Pub/sub that streams notification and presence events to connected Mini-App clients over
+Server-Sent Events. Events are published into the push_events table, so the bot and the
+API's worker processes (gunicorn) reach the same subscribers; the process serving
+/api/events polls the table and fans new rows out to its clients. Each client is an
+asyncio queue on that server's event loop, so a thousand idle connections cost a thousand
+small queues rather than a thousand threads.
+
+The newest events stay in the table so a reconnecting client (Last-Event-ID) catches up
+on what it missed.
+"""
+import os
+import json
+import asyncio
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import MetaData, Table, Column, Integer, String, Text, DateTime, select, delete, func
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+push_events_table = Table(
+    'push_events', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('type', String(64), nullable=False),
+    Column('data', Text, nullable=False),
+    Column('created_at', DateTime, default=datetime.utcnow),
+)
+
+PushEvent = namedtuple('PushEvent', ['id', 'type', 'data'])
+
+# Sent to a client whose queue overflowed; it reloads its data and reconnects
+_RESYNC = object()
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def _default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def format_event(event):
+    """SSE wire format for one PushEvent"""
+    return f"id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data, default=_default)}\n\n"
+
+
+def _row_to_event(row):
+    return PushEvent(row.id, row.type, json.loads(row.data))
+
+
+class PushHub:
+    """Database-backed fan-out of published events to per-client queues.
+
+    Settings default to PUSH_QUEUE_SIZE (events buffered per client before it is told
+    to resync), PUSH_HISTORY (events kept for Last-Event-ID catch-up), PUSH_KEEPALIVE
+    (seconds between comment frames that stop proxies closing idle streams) and
+    PUSH_POLL_INTERVAL (seconds between reads of events published by other processes).
+    """
+
+    def __init__(self, engine, queue_size=None, history=None, keepalive=None, poll_interval=None):
+        self.engine = engine
+        self.queue_size = queue_size or int(os.getenv('PUSH_QUEUE_SIZE', 100))
+        self.history = history or int(os.getenv('PUSH_HISTORY', 256))
+        self.keepalive = keepalive or float(os.getenv('PUSH_KEEPALIVE', 15))
+        self.poll_interval = poll_interval or float(os.getenv('PUSH_POLL_INTERVAL', 1.0))
+        self._events = push_events_table
+        self._subscribers = set()
+        self._loop = None
+        self._wake = None
+        self._poller = None
+        self._started = None  # resolves once the poller knows where the table ends
+        self._last_id = None  # newest event handed to subscribers
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.polls = 0
+        metadata.create_all(engine)
+
+    # --- Publishing (any thread, any process) ---
+
+    def publish(self, event_type, data):
+        """Store an event for every connected client; returns the PushEvent"""
+        with self.engine.begin() as conn:
+            event_id = conn.execute(self._events.insert().values(
+                type=event_type, data=json.dumps(data, default=_default),
+            )).inserted_primary_key[0]
+            if event_id % self.history == 0:
+                # Trim once per `history` events rather than on every publish
+                conn.execute(delete(self._events).where(self._events.c.id <= event_id - self.history))
+        self.published += 1
+        # Subscribers in this process needn't wait for the next poll
+        loop, wake = self._loop, self._wake
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+        return PushEvent(event_id, event_type, data)
+
+    # --- Polling (event loop of the process serving /api/events) ---
+
+    def _fetch(self, after_id, limit=None):
+        """Stored events with id > after_id, oldest first"""
+        query = select(self._events).where(self._events.c.id > after_id).order_by(self._events.c.id)
+        if limit:
+            query = query.limit(limit)
+        with self.engine.connect() as conn:
+            return [_row_to_event(row) for row in conn.execute(query)]
+
+    def _bounds(self):
+        """(oldest, newest) stored event ids; (None, None) when there are none"""
+        with self.engine.connect() as conn:
+            return tuple(conn.execute(select(func.min(self._events.c.id), func.max(self._events.c.id))).one())
+
+    async def _ensure_polling(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # publish() reads the loop first, so its Event must already exist
+            self._wake = asyncio.Event()
+            self._loop = loop
+        if self._poller is None or self._poller.done():
+            self._started = loop.create_future()
+            self._poller = loop.create_task(self._poll(self._started))
+        # Events published from here on reach the new subscriber
+        await asyncio.shield(self._started)
+
+    async def _poll(self, started):
+        """Hand new events to the subscribers; stops when the last one disconnects"""
+        try:
+            # Nobody was listening before this: older events are only for Last-Event-ID replay
+            self._last_id = (await asyncio.to_thread(self._bounds))[1] or 0
+        except Exception as e:
+            started.set_exception(e)
+            return
+        started.set_result(None)
+        while self._subscribers:
+            try:
+                events = await asyncio.to_thread(self._fetch, self._last_id, self.queue_size)
+            except Exception as e:
+                logger.warning(f"Push poll failed: {e}")
+                events = []
+            self.polls += 1
+            for event in events:
+                self._deliver(event)
+                self._last_id = event.id
+            if len(events) == self.queue_size:
+                continue  # more are waiting
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _deliver(self, event):
+        self.delivered += 1
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A stalled client must not hold events (or memory) for everyone else
+                self.dropped += 1
+                self._subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(_RESYNC)
+
+    # --- Subscribing (event loop) ---
+
+    def _since(self, last_event_id):
+        """(stored events after last_event_id, whether none were lost from the history)"""
+        oldest, newest = self._bounds()
+        if newest is None:
+            return [], last_event_id == 0
+        # An id the table never handed out (e.g. before it was reset) can't be matched up either
+        complete = oldest - 1 <= last_event_id <= newest
+        return (self._fetch(last_event_id) if complete else []), complete
+
+    async def stream(self, last_event_id=None):
+        """Async iterator of SSE frames for one client, until it disconnects"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        try:
+            await self._ensure_polling()
+            missed, complete = [], True
+            if last_event_id is not None:
+                missed, complete = await asyncio.to_thread(self._since, last_event_id)
+            # Events read from the history may also arrive on the queue
+            replayed = missed[-1].id if missed else (last_event_id if complete and last_event_id else 0)
+            yield "retry: 3000\n\n"
+            if not complete:
+                # Events were lost while disconnected: the client reloads instead
+                yield "event: resync\ndata: {}\n\n"
+            for event in missed:
+                yield format_event(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is _RESYNC:
+                    yield "event: resync\ndata: {}\n\n"
+                    return
+                if event.id > replayed:
+                    yield format_event(event)
+        finally:
+            self._subscribers.discard(queue)
+
+    def stats(self):
+        return {
+            'subscribers': len(self._subscribers),
+            'published': self.published,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'polls': self.polls,
+            'last_event_id': self._last_id,
+        }
+
+
+def get_push_hub(engine):
+    """Create (once per process) and return the shared PushHub"""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = PushHub(engine)
+        return _hub
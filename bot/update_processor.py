@@ -0,0 +1,146 @@
+"""
+Update Processor
+Concurrent update processing that keeps each chat's updates strictly in order, so
+ConversationHandler flows (onboarding, profile edits) see messages one at a time while
+different users are served in parallel. Also times every handler callback.
+"""
+import os
+import time
+import asyncio
+import logging
+from functools import wraps
+
+from telegram.ext import ApplicationHandlerStop, BaseUpdateProcessor, ConversationHandler
+
+logger = logging.getLogger(__name__)
+
+
+def _chat_key(update):
+    chat = getattr(update, 'effective_chat', None)
+    if chat is not None:
+        return chat.id
+    user = getattr(update, 'effective_user', None)
+    return user.id if user is not None else None
+
+
+class _HandlerTiming:
+    __slots__ = ('calls', 'errors', 'total', 'max')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Runs up to `concurrency` updates at once, one at a time per chat.
+
+    At most `max_in_flight` updates are accepted (running or waiting for their chat);
+    beyond that the application's update queue holds them. Defaults come from
+    BOT_CONCURRENT_UPDATES and BOT_MAX_IN_FLIGHT_UPDATES.
+    """
+
+    def __init__(self, concurrency=None, max_in_flight=None):
+        self.concurrency = concurrency or int(os.getenv('BOT_CONCURRENT_UPDATES', 8))
+        super().__init__(max(max_in_flight or int(os.getenv('BOT_MAX_IN_FLIGHT_UPDATES', 256)), self.concurrency))
+        self._running = asyncio.Semaphore(self.concurrency)
+        self._chats = {}  # chat id -> [lock, updates holding or waiting for it]
+        self._timings = {}
+        self.processed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_process_update(self, update, coroutine):
+        queued_at = time.perf_counter()
+        key = _chat_key(update)
+        if key is None:
+            async with self._running:
+                self._record_wait(queued_at)
+                await coroutine
+            return
+
+        # The chat lock is taken before a running slot, so a chat with a backlog
+        # waits without occupying slots other chats could use
+        entry = self._chats.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._running:
+                    self._record_wait(queued_at)
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[key]
+
+    def _record_wait(self, queued_at):
+        waited = time.perf_counter() - queued_at
+        self.processed += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    # --- Handler timing ---
+
+    def instrument(self, application):
+        """Wrap every registered handler callback (including conversation states) with timing"""
+        for handlers in application.handlers.values():
+            self._instrument_handlers(handlers)
+
+    def _instrument_handlers(self, handlers):
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                self._instrument_handlers(handler.entry_points)
+                for state_handlers in handler.states.values():
+                    self._instrument_handlers(state_handlers)
+                self._instrument_handlers(handler.fallbacks)
+            elif getattr(handler, 'callback', None) is not None and not hasattr(handler.callback, '__timed__'):
+                handler.callback = self._timed(handler.callback)
+
+    def _timed(self, callback):
+        name = getattr(callback, '__name__', repr(callback))
+        timing = self._timings.setdefault(name, _HandlerTiming())
+
+        @wraps(callback)
+        async def timed(update, context):
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            except ApplicationHandlerStop:
+                # Flow control (e.g. check_block stopping a blocked user's update), not a failure
+                raise
+            except Exception:
+                timing.errors += 1
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                timing.calls += 1
+                timing.total += elapsed
+                timing.max = max(timing.max, elapsed)
+
+        timed.__timed__ = True
+        return timed
+
+    def handler_stats(self, limit=None):
+        """[(handler, calls, errors, avg_s, max_s)] sorted by total time spent"""
+        rows = sorted(self._timings.items(), key=lambda item: item[1].total, reverse=True)
+        rows = [(name, t.calls, t.errors, round(t.total / t.calls, 4), round(t.max, 4))
+                for name, t in rows if t.calls]
+        return rows[:limit] if limit else rows
+
+    def stats(self):
+        return {
+            'concurrency': self.concurrency,
+            'max_in_flight': self.max_concurrent_updates,
+            'in_flight': self.current_concurrent_updates,
+            'active_chats': len(self._chats),
+            'processed': self.processed,
+            'avg_wait_s': round(self.wait_total / self.processed, 4) if self.processed else 0.0,
+            'max_wait_s': round(self.wait_max, 4),
+        }
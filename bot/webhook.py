@@ -0,0 +1,181 @@
+"""
+Webhook Server
+ASGI app that receives Telegram updates by webhook instead of long polling and can
+serve the Mini-App API from the same process, along with the Server-Sent Events stream
+(/api/events) that pushes notifications and presence to open Mini-Apps, wherever they were
+published (see bot.push). Used by main() when BOT_MODE=webhook.
+Recorded update JSON can be replayed against it with
+``python -m bot.webhook replay updates.jsonl``.
+"""
+import os
+import sys
+import hmac
+import json
+import logging
+import contextlib
+
+from telegram import Update
+
+from bot.push import get_push_hub
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+DEFAULT_PATH = '/telegram/webhook'
+
+
+def create_app(application, allowed_updates=None, webhook_url=None, secret_token=None, path=None,
+               api_app=None, record_path=None, push_hub=None):
+    """Starlette app running `application` and feeding it updates posted to `path`.
+
+    Settings default to WEBHOOK_URL (public base URL; the webhook is only registered
+    with Telegram when set), WEBHOOK_SECRET, WEBHOOK_PATH and WEBHOOK_RECORD_PATH
+    (append every received update to this file, one JSON per line).
+    `api_app` is a WSGI app (the Flask API) mounted under the remaining paths.
+    `push_hub` defaults to the process's shared PushHub on the bot's database.
+    """
+    from starlette.applications import Starlette
+    from starlette.responses import Response, JSONResponse, StreamingResponse
+    from starlette.routing import Route, Mount
+
+    webhook_url = webhook_url or os.getenv('WEBHOOK_URL')
+    secret_token = secret_token or os.getenv('WEBHOOK_SECRET')
+    path = path or os.getenv('WEBHOOK_PATH', DEFAULT_PATH)
+    record_path = record_path or os.getenv('WEBHOOK_RECORD_PATH')
+    if push_hub is None:
+        from database.pool import init_pool
+        push_hub = get_push_hub(init_pool().engine)
+    if webhook_url and not secret_token:
+        logger.warning("WEBHOOK_SECRET is not set; anyone who finds the webhook URL can post updates")
+
+    async def telegram_webhook(request):
+        if secret_token and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), secret_token):
+            return Response(status_code=403)
+        try:
+            data = await request.json()
+            update = Update.de_json(data, application.bot)
+        except Exception as e:
+            logger.warning(f"Rejected malformed webhook update: {e}")
+            return Response(status_code=400)
+        if record_path:
+            with open(record_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(data) + "\n")
+        # Answer Telegram right away; the application processes the queue concurrently
+        await application.update_queue.put(update)
+        return Response()
+
+    async def health(request):
+        return JSONResponse({
+            'status': 'ok',
+            'pending_updates': application.update_queue.qsize(),
+            'push': push_hub.stats(),
+        })
+
+    # The Mini-App is served from another origin (as with the API's CORS), and its fetch()
+    # sends ngrok-skip-browser-warning and Last-Event-ID, which need a preflight
+    cors_headers = {'Access-Control-Allow-Origin': '*'}
+
+    async def events(request):
+        if request.method == 'OPTIONS':
+            return Response(status_code=204, headers={
+                **cors_headers,
+                'Access-Control-Allow-Methods': 'GET',
+                'Access-Control-Allow-Headers': request.headers.get('Access-Control-Request-Headers', '*'),
+                'Access-Control-Max-Age': '86400',
+            })
+        # Each client is a coroutine and a small queue, not a thread
+        last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_event_id = None
+        return StreamingResponse(
+            push_hub.stream(last_event_id),
+            media_type='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', **cors_headers},
+        )
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        # run_polling/run_webhook normally drive these hooks; here the ASGI server does
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        if webhook_url:
+            await application.bot.set_webhook(
+                url=webhook_url.rstrip('/') + path,
+                secret_token=secret_token,
+                allowed_updates=allowed_updates,
+                max_connections=int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40)),
+            )
+            logger.info(f"Webhook registered at {webhook_url.rstrip('/')}{path}")
+        try:
+            yield
+        finally:
+            # The webhook stays registered so Telegram holds updates during a restart
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+            await application.shutdown()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+
+    routes = [
+        Route(path, telegram_webhook, methods=['POST']),
+        Route('/telegram/health', health, methods=['GET']),
+        Route('/api/events', events, methods=['GET', 'OPTIONS']),
+    ]
+    if api_app is not None:
+        from asgiref.wsgi import WsgiToAsgi
+        routes.append(Mount('/', app=WsgiToAsgi(api_app)))
+    return Starlette(routes=routes, lifespan=lifespan)
+
+
+def run_webhook(application, allowed_updates=None):
+    """Serve the bot (and the Mini-App API when WEBHOOK_SERVE_API=1) with uvicorn.
+
+    Listens on WEBHOOK_HOST:WEBHOOK_PORT (default 0.0.0.0:8080), normally behind a TLS proxy.
+    When the API runs elsewhere (gunicorn), set its PUSH_EVENTS_URL to this server's public
+    /api/events so Mini-Apps subscribe here.
+    """
+    import uvicorn
+
+    api_app = None
+    if os.getenv('WEBHOOK_SERVE_API', '0') == '1':
+        # The Mini-App then finds the event stream next to the API
+        os.environ.setdefault('PUSH_EVENTS_URL', '/api/events')
+        from api.server import app as api_app
+
+    app = create_app(application, allowed_updates=allowed_updates, api_app=api_app)
+    uvicorn.run(
+        app,
+        host=os.getenv('WEBHOOK_HOST', '0.0.0.0'),
+        port=int(os.getenv('WEBHOOK_PORT', 8080)),
+        log_level=os.getenv('WEBHOOK_LOG_LEVEL', 'info'),
+    )
+
+
+def replay(updates_file, url=None, secret_token=None):
+    """Post recorded updates (one JSON object per line) to a running webhook; returns status counts"""
+    import httpx
+
+    url = url or f"http://localhost:{os.getenv('WEBHOOK_PORT', 8080)}{os.getenv('WEBHOOK_PATH', DEFAULT_PATH)}"
+    secret_token = secret_token or os.getenv('WEBHOOK_SECRET')
+    headers = {SECRET_HEADER: secret_token} if secret_token else {}
+    statuses = {}
+    with httpx.Client(timeout=10) as client, open(updates_file, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            status = client.post(url, content=line.strip(), headers={**headers, 'Content-Type': 'application/json'}).status_code
+            statuses[status] = statuses.get(status, 0) + 1
+    return statuses
+
+
+if __name__ == '__main__':
+    # python -m bot.webhook replay updates.jsonl [url]
+    if len(sys.argv) < 3 or sys.argv[1] != 'replay':
+        print("Usage: python -m bot.webhook replay <updates.jsonl> [webhook url]")
+        sys.exit(1)
+    print(replay(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None))
@@ -0,0 +1,157 @@
+"""
+Agenda Service
+Builds a user's agenda (court dates this week, pending tasks, today's time entries and
+the latest broadcast) for both the bot's /myagenda and the Mini-App's /api/agenda.
+Each section is one column-only query, so the number of round trips stays the same
+however many rows the agenda has.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+
+from database.models import Case, CourtDate, ComplianceTask, TimeEntry, Notification
+from database.billing_rollups import rollup_day
+
+AgendaCourtDate = namedtuple('AgendaCourtDate', ['id', 'case_number', 'court_name', 'hearing_date', 'purpose'])
+AgendaTask = namedtuple('AgendaTask', ['id', 'title', 'deadline', 'status'])
+AgendaTimeEntry = namedtuple('AgendaTimeEntry', ['id', 'hours', 'description', 'date'])
+AgendaBroadcast = namedtuple('AgendaBroadcast', ['message', 'created_at'])
+Agenda = namedtuple('Agenda', ['day', 'court_dates', 'tasks', 'time_entries', 'total_hours', 'latest_broadcast'])
+
+# Court dates shown: from now until the end of the 7th day ahead
+COURT_DATE_DAYS = 7
+
+
+def _day_start(now):
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _court_date_filter(user_id, now):
+    week_end = _day_start(now) + timedelta(days=COURT_DATE_DAYS + 1)
+    return (Case.assigned_to == user_id, CourtDate.hearing_date >= now, CourtDate.hearing_date < week_end)
+
+
+def _task_filter(user_id):
+    return (ComplianceTask.assigned_to == user_id, ComplianceTask.status == 'pending')
+
+
+def _time_entry_filter(user_id, now):
+    # Date range instead of func.date() so an index on (user_id, date) applies; entries are
+    # stamped in UTC, so "today" is the UTC day the dashboard's rollups count too
+    entries_start = datetime.combine(rollup_day(now), datetime.min.time())
+    return (TimeEntry.user_id == user_id, TimeEntry.date >= entries_start,
+            TimeEntry.date < entries_start + timedelta(days=1))
+
+
+def load_agenda(session, user_id, now=None, include_broadcast=False):
+    """Return the Agenda for a User.id (4 queries with the broadcast, 3 without)"""
+    now = now or datetime.now()
+
+    court_dates = [AgendaCourtDate(*row) for row in session.query(
+        CourtDate.id, Case.case_number, CourtDate.court_name, CourtDate.hearing_date, CourtDate.purpose
+    ).join(Case, CourtDate.case_id == Case.id).filter(
+        *_court_date_filter(user_id, now)
+    ).order_by(CourtDate.hearing_date).all()]
+
+    tasks = [AgendaTask(*row) for row in session.query(
+        ComplianceTask.id, ComplianceTask.title, ComplianceTask.deadline, ComplianceTask.status
+    ).filter(
+        *_task_filter(user_id)
+    ).order_by(ComplianceTask.deadline).all()]
+
+    time_entries = [
+        AgendaTimeEntry(entry_id, (minutes or 0) / 60, description, date)
+        for entry_id, minutes, description, date in session.query(
+            TimeEntry.id, TimeEntry.duration_minutes, TimeEntry.description, TimeEntry.date
+        ).filter(
+            *_time_entry_filter(user_id, now)
+        ).order_by(TimeEntry.date).all()
+    ]
+
+    latest_broadcast = None
+    if include_broadcast:
+        row = session.query(Notification.message, Notification.created_at).filter(
+            Notification.notification_type == 'broadcast'
+        ).order_by(Notification.created_at.desc()).first()
+        if row:
+            latest_broadcast = AgendaBroadcast(*row)
+
+    return Agenda(
+        day=_day_start(now).date(),
+        court_dates=court_dates,
+        tasks=tasks,
+        time_entries=time_entries,
+        total_hours=sum(entry.hours for entry in time_entries),
+        latest_broadcast=latest_broadcast,
+    )
+
+
+def agenda_version(session, user_id, now=None):
+    """Cheap stand-in for load_agenda() (without the broadcast) in ETags: counts, id sums and
+    key values of the same rows, in one statement of aggregates. Court dates, tasks and time
+    entries are added and removed rather than edited, so these change whenever the agenda does."""
+    now = now or datetime.now()
+
+    court_dates = [
+        select(aggregate).join(Case, CourtDate.case_id == Case.id).where(
+            *_court_date_filter(user_id, now)).scalar_subquery()
+        for aggregate in (func.count(CourtDate.id), func.sum(CourtDate.id), func.max(CourtDate.hearing_date))
+    ]
+    tasks = [
+        select(aggregate).where(*_task_filter(user_id)).scalar_subquery()
+        for aggregate in (func.count(ComplianceTask.id), func.sum(ComplianceTask.id), func.max(ComplianceTask.deadline))
+    ]
+    time_entries = [
+        select(aggregate).where(*_time_entry_filter(user_id, now)).scalar_subquery()
+        for aggregate in (func.count(TimeEntry.id), func.sum(TimeEntry.id), func.sum(TimeEntry.duration_minutes))
+    ]
+
+    row = session.execute(select(*court_dates, *tasks, *time_entries)).one()
+    return (_day_start(now).date(), *row)
+
+
+if __name__ == '__main__':
+    # python -m database.agenda [court_dates ...]  - query count as the agenda grows
+    import sys
+    from sqlalchemy import event, create_engine
+    from sqlalchemy.orm import sessionmaker
+    from database.models import Base, User
+
+    sizes = [int(n) for n in sys.argv[1:]] or [1, 10, 100, 1000]
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    Session = sessionmaker(bind=engine)
+
+    session = Session()
+    user = User(telegram_id=1, full_name='Benchmark User')
+    session.add(user)
+    session.flush()
+    user_id = user.id
+    now = datetime.now()
+    added = 0
+    counts = set()
+    for size in sizes:
+        for i in range(added, size):
+            case = Case(case_number=f'BENCH-{i}', title='Benchmark', assigned_to=user_id)
+            session.add(case)
+            session.flush()
+            session.add(CourtDate(case_id=case.id, court_name='High Court',
+                                  hearing_date=now + timedelta(hours=1 + i % 100), purpose='Hearing'))
+            session.add(ComplianceTask(title=f'Task {i}', assigned_to=user_id, status='pending',
+                                       deadline=now + timedelta(days=i % 30)))
+            session.add(TimeEntry(user_id=user_id, case_id=case.id, date=now, duration_minutes=30,
+                                  description='Benchmark'))
+        added = size
+        session.commit()
+        session.expire_all()
+
+        statements.clear()
+        agenda = load_agenda(session, user_id, include_broadcast=True)
+        counts.add(len(statements))
+        print(f"{size:>6} court dates: {len(statements)} queries "
+              f"({len(agenda.court_dates)} hearings, {len(agenda.tasks)} tasks, {len(agenda.time_entries)} entries)")
+    if len(counts) > 1:
+        sys.exit("Query count grew with the agenda")
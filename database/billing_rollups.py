@@ -0,0 +1,215 @@
+"""
+Billing Rollups
+Incrementally maintained per-user, per-case daily and monthly totals of logged time,
+so dashboards and invoices read a handful of rollup rows instead of summing raw
+TimeEntry rows. Writers call record() in the same transaction as the TimeEntry insert;
+``python -m database.billing_rollups --rebuild`` recomputes everything from time_entries.
+"""
+import logging
+from collections import namedtuple
+from datetime import date, datetime, timezone
+
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, Float, Date, DateTime,
+    select, delete, func, case, inspect
+)
+from sqlalchemy.exc import IntegrityError
+
+from database.models import TimeEntry
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+# case_id 0 stands for time not logged against a case (key columns can't be NULL)
+_ROLLUP_COLUMNS = (
+    ('minutes', Integer),
+    ('billable_minutes', Integer),
+    ('billable_amount', Float),
+    ('entries', Integer),
+)
+
+billing_daily_table = Table(
+    'billing_daily', metadata,
+    Column('user_id', Integer, primary_key=True),
+    Column('day', Date, primary_key=True),
+    Column('case_id', Integer, primary_key=True),
+    *(Column(name, type_, nullable=False, default=0) for name, type_ in _ROLLUP_COLUMNS),
+    Column('updated_at', DateTime, default=datetime.utcnow),
+)
+
+billing_monthly_table = Table(
+    'billing_monthly', metadata,
+    Column('user_id', Integer, primary_key=True),
+    Column('month', Date, primary_key=True),  # first day of the month
+    Column('case_id', Integer, primary_key=True),
+    *(Column(name, type_, nullable=False, default=0) for name, type_ in _ROLLUP_COLUMNS),
+    Column('updated_at', DateTime, default=datetime.utcnow),
+)
+
+BillingTotals = namedtuple('BillingTotals', ['minutes', 'billable_minutes', 'billable_amount', 'entries'])
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def rollup_day(now):
+    """The rollup day a local (naive) datetime falls on: time entries are stamped, and so
+    bucketed, in UTC"""
+    return now.astimezone(timezone.utc).date()
+
+
+def _entry_values(entry):
+    minutes = entry.duration_minutes or 0
+    billable = bool(entry.billable)
+    return {
+        'minutes': minutes,
+        'billable_minutes': minutes if billable else 0,
+        'billable_amount': minutes * (entry.hourly_rate or 0) / 60 if billable else 0.0,
+        'entries': 1,
+    }
+
+
+def _rebuild(conn):
+    """Recompute both tables from time_entries; returns the number of entries rolled up"""
+    te = TimeEntry.__table__
+    minutes = func.coalesce(te.c.duration_minutes, 0)
+    billable = te.c.billable == True
+    rows = conn.execute(select(
+        te.c.user_id, func.coalesce(te.c.case_id, 0), func.date(te.c.date),
+        func.sum(minutes),
+        func.sum(case((billable, minutes), else_=0)),
+        func.sum(case((billable, minutes * func.coalesce(te.c.hourly_rate, 0) / 60.0), else_=0)),
+        func.count(),
+    ).where(te.c.date.isnot(None)).group_by(
+        te.c.user_id, func.coalesce(te.c.case_id, 0), func.date(te.c.date)
+    )).all()
+
+    now = datetime.utcnow()
+    daily = []
+    monthly = {}
+    for user_id, case_id, day, total, billable_total, amount, entries in rows:
+        day = _as_date(day)
+        values = {'minutes': int(total or 0), 'billable_minutes': int(billable_total or 0),
+                  'billable_amount': float(amount or 0), 'entries': entries}
+        daily.append({'user_id': user_id, 'case_id': case_id, 'day': day, **values, 'updated_at': now})
+        month = monthly.setdefault((user_id, case_id, day.replace(day=1)),
+                                   {'minutes': 0, 'billable_minutes': 0, 'billable_amount': 0.0, 'entries': 0})
+        for name, value in values.items():
+            month[name] += value
+
+    conn.execute(delete(billing_daily_table))
+    conn.execute(delete(billing_monthly_table))
+    if daily:
+        conn.execute(billing_daily_table.insert(), daily)
+        conn.execute(billing_monthly_table.insert(), [
+            {'user_id': user_id, 'case_id': case_id, 'month': month, **values, 'updated_at': now}
+            for (user_id, case_id, month), values in monthly.items()
+        ])
+    return sum(row['entries'] for row in daily)
+
+
+def create_tables(engine):
+    """Create billing_daily / billing_monthly if missing; new tables on an existing
+    database are filled from the time entries already logged"""
+    existed = inspect(engine).has_table(billing_daily_table.name)
+    metadata.create_all(engine)
+    if existed:
+        return
+    try:
+        with engine.begin() as conn:
+            count = _rebuild(conn)
+        if count:
+            logger.info(f"Built billing rollups from {count} existing time entries")
+    except IntegrityError:
+        # Another process built them at the same time
+        pass
+
+
+class BillingRollups:
+    """Maintains billing_daily / billing_monthly in the bot's database"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        create_tables(engine)
+
+    # --- Writes ---
+
+    def record(self, session, entry, sign=1):
+        """Add a TimeEntry to the rollups (sign=-1 removes it); call before the session commits"""
+        values = {k: v * sign for k, v in _entry_values(entry).items()}
+        when = _as_date(entry.date or datetime.utcnow())
+        key = {'user_id': entry.user_id, 'case_id': entry.case_id or 0}
+        self._add(session, billing_daily_table, {**key, 'day': when}, values)
+        self._add(session, billing_monthly_table, {**key, 'month': when.replace(day=1)}, values)
+
+    def _add(self, session, t, key, values):
+        now = datetime.utcnow()
+        dialect = self.engine.dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            session.execute(insert(t).values(**key, **values, updated_at=now).on_conflict_do_update(
+                index_elements=list(key),
+                set_={**{name: t.c[name] + values[name] for name in values}, 'updated_at': now},
+            ))
+            return
+
+        # No portable upsert: update, then insert if the row didn't exist
+        where = [t.c[name] == value for name, value in key.items()]
+        updated = session.execute(t.update().where(*where).values(
+            **{name: t.c[name] + values[name] for name in values}, updated_at=now
+        )).rowcount
+        if not updated:
+            session.execute(t.insert().values(**key, **values, updated_at=now))
+
+    # --- Reads ---
+
+    @staticmethod
+    def _totals(row):
+        return BillingTotals(int(row[0] or 0), int(row[1] or 0), float(row[2] or 0), int(row[3] or 0))
+
+    def day_totals(self, session, user_id, day, case_id=None):
+        """BillingTotals for one user and day (all cases, or one)"""
+        t = billing_daily_table
+        query = select(*(func.sum(t.c[name]) for name, _ in _ROLLUP_COLUMNS)).where(
+            t.c.user_id == user_id, t.c.day == _as_date(day))
+        if case_id is not None:
+            query = query.where(t.c.case_id == case_id)
+        return self._totals(session.execute(query).one())
+
+    def month_totals(self, session, user_id, month, case_id=None):
+        """BillingTotals for one user and calendar month (any date in it)"""
+        t = billing_monthly_table
+        query = select(*(func.sum(t.c[name]) for name, _ in _ROLLUP_COLUMNS)).where(
+            t.c.user_id == user_id, t.c.month == _as_date(month).replace(day=1))
+        if case_id is not None:
+            query = query.where(t.c.case_id == case_id)
+        return self._totals(session.execute(query).one())
+
+    # --- Reconciliation ---
+
+    def rebuild(self):
+        with self.engine.begin() as conn:
+            return _rebuild(conn)
+
+
+if __name__ == '__main__':
+    # python -m database.billing_rollups --rebuild  - recompute rollups from time_entries
+    import sys
+    from database.pool import init_pool
+
+    logging.basicConfig(level=logging.INFO)
+    if '--rebuild' not in sys.argv:
+        print("Usage: python -m database.billing_rollups --rebuild")
+        sys.exit(1)
+    manager = init_pool()
+    count = BillingRollups(manager.engine).rebuild()
+    logger.info(f"Rebuilt billing rollups from {count} time entries")
@@ -0,0 +1,146 @@
+"""
+Case List Service
+Keyset pagination over cases, newest update first, for the bot's /casestatus and the
+Mini-App's /api/cases. A case is listed by when it last changed, or when it was opened
+if it was never updated. Pages continue from an opaque (listed_at, id) cursor, so each
+page is one bounded index range however many cases exist; totals come from a separate
+count query that callers ask for only when they show it.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import and_, or_, func
+
+from database.models import Case
+
+# updated_at is the listed_at sort key: created_at for a case that was never updated
+CaseSummary = namedtuple('CaseSummary', [
+    'id', 'case_number', 'title', 'client_name', 'case_type', 'status', 'priority',
+    'filing_date', 'next_court_date', 'deadline', 'updated_at',
+])
+CasePage = namedtuple('CasePage', ['cases', 'next_cursor', 'prev_cursor'])
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 200
+
+_CURSOR_TIME_FORMAT = '%Y%m%d%H%M%S%f'
+
+# Sort key of the case list; migration 3 indexes this exact expression
+listed_at = func.coalesce(Case.updated_at, Case.created_at)
+
+
+def encode_cursor(case):
+    """Cursor pointing at a CaseSummary (short enough for Telegram callback data)"""
+    return f"{case.updated_at.strftime(_CURSOR_TIME_FORMAT)}.{case.id}"
+
+
+def decode_cursor(cursor):
+    """(listed_at, id) for a cursor; raises ValueError if it is malformed"""
+    stamp, _, case_id = cursor.partition('.')
+    return datetime.strptime(stamp, _CURSOR_TIME_FORMAT), int(case_id)
+
+
+def load_case_page(session, assigned_to=None, cursor=None, direction='next', limit=DEFAULT_PAGE_SIZE):
+    """One CasePage of cases (all, or one User.id's), most recently updated first.
+
+    `direction` 'next' continues after `cursor`, 'prev' returns the page before it.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    query = session.query(
+        Case.id, Case.case_number, Case.title, Case.client_name, Case.case_type, Case.status,
+        Case.priority, Case.filing_date, Case.next_court_date, Case.deadline, listed_at
+    )
+    query = _listed(query, assigned_to)
+
+    backwards = direction == 'prev'
+    if cursor:
+        cursor_at, case_id = decode_cursor(cursor)
+        # The redundant bound gives the planner an index range to start from
+        if backwards:
+            query = query.filter(listed_at >= cursor_at, or_(listed_at > cursor_at,
+                                                             and_(listed_at == cursor_at, Case.id > case_id)))
+        else:
+            query = query.filter(listed_at <= cursor_at, or_(listed_at < cursor_at,
+                                                             and_(listed_at == cursor_at, Case.id < case_id)))
+
+    if backwards:
+        query = query.order_by(listed_at.asc(), Case.id.asc())
+    else:
+        query = query.order_by(listed_at.desc(), Case.id.desc())
+
+    # One extra row tells whether another page follows in this direction
+    rows = [CaseSummary(*row) for row in query.limit(limit + 1).all()]
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return CasePage([], None, None)
+
+    has_next = more if not backwards else True
+    has_prev = more if backwards else bool(cursor)
+    return CasePage(
+        cases=rows,
+        next_cursor=encode_cursor(rows[-1]) if has_next else None,
+        prev_cursor=encode_cursor(rows[0]) if has_prev else None,
+    )
+
+
+def _listed(query, assigned_to):
+    """Restrict a query to the cases the list shows; pages, counts and versions all use it"""
+    # A case with neither timestamp has no place in the order (and no cursor)
+    query = query.filter(listed_at.isnot(None))
+    if assigned_to is not None:
+        query = query.filter(Case.assigned_to == assigned_to)
+    return query
+
+
+def count_cases(session, assigned_to=None):
+    """Number of listed cases (all, or one User.id's) - an index-only count, kept off the page query"""
+    return _listed(session.query(func.count(Case.id)), assigned_to).scalar()
+
+
+def case_list_version(session, assigned_to=None):
+    """(count, latest listed_at, id checksum) - changes whenever a listed case is added,
+    removed or updated, without reading the cases themselves"""
+    query = session.query(func.count(Case.id), func.max(listed_at), func.sum(Case.id))
+    return tuple(_listed(query, assigned_to).one())
+
+
+if __name__ == '__main__':
+    # python -m database.case_list [cases ...]  - page latency as the case table grows
+    import sys
+    import time
+    from datetime import timedelta
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from database.models import Base
+    from database.migrations import upgrade
+
+    sizes = [int(n) for n in sys.argv[1:]] or [1000, 10000, 50000]
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    upgrade(engine)
+    session = sessionmaker(bind=engine)()
+
+    now = datetime.now()
+    added = 0
+    for size in sizes:
+        session.bulk_insert_mappings(Case, [
+            {'case_number': f'BENCH-{i}', 'title': 'Benchmark', 'client_name': 'Client', 'status': 'active',
+             'assigned_to': 1 + i % 50, 'updated_at': now - timedelta(minutes=i)}
+            for i in range(added, size)
+        ])
+        session.commit()
+        added = size
+
+        started = time.perf_counter()
+        page = load_case_page(session)
+        for _ in range(20):
+            page = load_case_page(session, cursor=page.next_cursor)
+        paged = (time.perf_counter() - started) / 21
+        started = time.perf_counter()
+        total = count_cases(session, assigned_to=1)
+        counted = time.perf_counter() - started
+        print(f"{size:>7} cases: {paged * 1000:.2f} ms/page (21 pages deep), "
+              f"count for one user {counted * 1000:.2f} ms ({total})")
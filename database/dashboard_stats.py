@@ -0,0 +1,119 @@
+"""
+Dashboard Statistics
+A user's dashboard counters (active cases, today's time entries, court dates this week,
+pending leave, billable hours this month) computed in a single statement, time totals
+read from the billing rollups. A short per-user cache keeps repeated Refresh taps off
+the database; writers invalidate it.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+
+from database.models import Case, CourtDate, LeaveRequest
+from database.billing_rollups import billing_daily_table, billing_monthly_table, rollup_day
+
+DashboardStats = namedtuple('DashboardStats', [
+    'active_cases', 'time_entries_today', 'court_dates_week', 'pending_leave',
+    'billable_hours_month', 'computed_at',
+])
+
+ACTIVE_CASE_STATUSES = ('open', 'in_progress', 'active')
+
+
+def load_dashboard_stats(session, user_id, now=None):
+    """Compute DashboardStats for a User.id in one round trip"""
+    now = now or datetime.now()
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_end = day_start + timedelta(days=8)
+
+    active_cases = select(func.count(Case.id)).where(
+        Case.assigned_to == user_id,
+        Case.status.in_(ACTIVE_CASE_STATUSES)
+    ).scalar_subquery()
+
+    court_dates = select(func.count(CourtDate.id)).join(Case, CourtDate.case_id == Case.id).where(
+        Case.assigned_to == user_id,
+        CourtDate.hearing_date >= now,
+        CourtDate.hearing_date < week_end
+    ).scalar_subquery()
+
+    pending_leave = select(func.count(LeaveRequest.id)).where(
+        LeaveRequest.user_id == user_id,
+        LeaveRequest.status == 'pending'
+    ).scalar_subquery()
+
+    # Time counters come from the billing rollups (one row per case), not raw time entries,
+    # on the rollups' UTC days; hearing dates are local wall-clock times, like `now`
+    today = rollup_day(now)
+    daily = billing_daily_table
+    entries_today = select(func.coalesce(func.sum(daily.c.entries), 0)).where(
+        daily.c.user_id == user_id,
+        daily.c.day == today
+    ).scalar_subquery()
+
+    monthly = billing_monthly_table
+    billable_minutes = select(func.coalesce(func.sum(monthly.c.billable_minutes), 0)).where(
+        monthly.c.user_id == user_id,
+        monthly.c.month == today.replace(day=1)
+    ).scalar_subquery()
+
+    row = session.execute(select(
+        active_cases, entries_today, court_dates, pending_leave, billable_minutes
+    )).one()
+
+    return DashboardStats(
+        active_cases=row[0],
+        time_entries_today=row[1],
+        court_dates_week=row[2],
+        pending_leave=row[3],
+        billable_hours_month=(row[4] or 0) / 60,
+        computed_at=now,
+    )
+
+
+class DashboardStatsCache:
+    """Per-user DashboardStats kept for DASHBOARD_STATS_TTL seconds (LRU-bounded).
+
+    Invalidation is per process; the short TTL bounds staleness for writes made elsewhere.
+    """
+
+    def __init__(self, ttl=None, maxsize=None):
+        self.ttl = ttl if ttl is not None else float(os.getenv('DASHBOARD_STATS_TTL', 10))
+        self.maxsize = maxsize or int(os.getenv('DASHBOARD_STATS_CACHE_SIZE', 1024))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session, user_id):
+        """Cached stats for a User.id, computed with `session` when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] >= time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        stats = load_dashboard_stats(session, user_id)
+        with self._lock:
+            self._entries[user_id] = (stats, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return stats
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses}
+
+
+dashboard_stats = DashboardStatsCache()
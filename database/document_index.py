@@ -0,0 +1,278 @@
+"""
+Document Full-Text Index
+SQLite FTS5 index over uploaded documents (filename, AI summary and extracted text),
+kept in its own file next to the main database and updated as documents are ingested.
+Each document's text is also indexed as passages for retrieval-based follow-ups.
+Both the bot (writer) and the API (reader) open it; WAL mode lets them work concurrently.
+"""
+import os
+import re
+import sqlite3
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    filename, summary, content,
+    file_type UNINDEXED, uploaded_by UNINDEXED, indexed_at UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS document_chunks_fts USING fts5(
+    content,
+    tokenize = 'porter unicode61'
+);
+"""
+
+# Passage rowids are document_id * CHUNK_ROWID_SPAN + chunk_no, so one document's
+# passages form a rowid range FTS5 can seek to directly
+CHUNK_ROWID_SPAN = 1_000_000
+
+# Words too common to help rank passages for a question
+_STOPWORDS = frozenset("""
+a an and are as at be but by can could did do does for from had has have how i if in is it its
+me my of on or our should so than that the their them there these they this to was we were what
+when where which who whom why will with would you your
+""".split())
+
+# bm25 column weights: filename, summary, content
+_RANK = "bm25(documents_fts, 5.0, 2.0, 1.0)"
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+SearchHit = namedtuple('SearchHit', ['document_id', 'filename', 'file_type', 'uploaded_by', 'indexed_at', 'snippet', 'score'])
+SearchPage = namedtuple('SearchPage', ['query', 'total', 'page', 'per_page', 'hits'])
+Passage = namedtuple('Passage', ['chunk_no', 'text', 'score'])
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def default_index_path(database_url=None):
+    """DOCUMENT_INDEX_PATH, else document_index.db beside a SQLite database file (or in the working directory)"""
+    configured = os.getenv('DOCUMENT_INDEX_PATH')
+    if configured:
+        return configured
+    url = str(database_url or '')
+    if url.startswith('sqlite') and ':memory:' not in url:
+        db_file = url.split(':///', 1)[-1]
+        if db_file:
+            return os.path.join(os.path.dirname(os.path.abspath(db_file)), 'document_index.db')
+    return os.path.abspath('document_index.db')
+
+
+def build_match_query(text):
+    """Turn free text into a safe FTS5 query: all terms required, the last one as a prefix"""
+    tokens = _TOKEN.findall(text or '')
+    if not tokens:
+        return None
+    terms = [f'"{t}"' for t in tokens[:-1]]
+    terms.append(f'"{tokens[-1]}"*')
+    return ' '.join(terms)
+
+
+def build_any_query(text):
+    """FTS5 query matching passages with any of the question's meaningful terms"""
+    tokens = [t for t in _TOKEN.findall((text or '').lower()) if t not in _STOPWORDS and len(t) > 1]
+    if not tokens:
+        return None
+    return ' OR '.join(f'"{t}"' for t in dict.fromkeys(tokens))
+
+
+def _chunk_range(document_id):
+    start = document_id * CHUNK_ROWID_SPAN
+    return start, start + CHUNK_ROWID_SPAN - 1
+
+
+class DocumentIndex:
+    """FTS5 index keyed by Document.id (the FTS rowid)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+    def _conn(self):
+        # One connection per thread (Flask request threads, asyncio.to_thread workers)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def reset_connections(self):
+        """Forget connections inherited from a parent process (call in a forked worker)"""
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def add(self, document_id, filename, summary, content, file_type=None, uploaded_by=None, chunks=None):
+        """Index (or re-index) one document, plus its passages for retrieval if given"""
+        chunks = list(chunks or [])[:CHUNK_ROWID_SPAN]
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (document_id,))
+                conn.execute("DELETE FROM document_chunks_fts WHERE rowid BETWEEN ? AND ?", _chunk_range(document_id))
+                base = document_id * CHUNK_ROWID_SPAN
+                conn.executemany(
+                    "INSERT INTO document_chunks_fts (rowid, content) VALUES (?, ?)",
+                    ((base + chunk_no, text) for chunk_no, text in enumerate(chunks))
+                )
+                conn.execute(
+                    "INSERT INTO documents_fts (rowid, filename, summary, content, file_type, uploaded_by, indexed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (document_id, filename or '', summary or '', content or '', file_type, uploaded_by,
+                     datetime.utcnow().isoformat(timespec='seconds'))
+                )
+
+    def remove(self, document_id):
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (document_id,))
+                conn.execute("DELETE FROM document_chunks_fts WHERE rowid BETWEEN ? AND ?", _chunk_range(document_id))
+
+    def clear(self):
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM documents_fts")
+                conn.execute("DELETE FROM document_chunks_fts")
+
+    def indexed_ids(self):
+        return {row[0] for row in self._conn().execute("SELECT rowid FROM documents_fts")}
+
+    def search(self, text, page=1, per_page=10):
+        """Ranked, paginated search; returns a SearchPage (empty for blank queries)"""
+        page = max(int(page), 1)
+        per_page = min(max(int(per_page), 1), 100)
+        match = build_match_query(text)
+        if match is None:
+            return SearchPage(text, 0, page, per_page, [])
+
+        conn = self._conn()
+        total = conn.execute("SELECT count(*) FROM documents_fts WHERE documents_fts MATCH ?", (match,)).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT rowid, filename, file_type, uploaded_by, indexed_at, "
+            f"snippet(documents_fts, -1, '[', ']', '…', 16), {_RANK} AS score "
+            f"FROM documents_fts WHERE documents_fts MATCH ? "
+            f"ORDER BY score LIMIT ? OFFSET ?",
+            (match, per_page, (page - 1) * per_page)
+        ).fetchall()
+        # bm25() is lower-is-better; expose higher-is-better scores
+        hits = [SearchHit(*row[:6], score=round(-row[6], 4)) for row in rows]
+        return SearchPage(text, total, page, per_page, hits)
+
+    def top_passages(self, document_id, question, k=4):
+        """Up to k passages of one document that best match the question (bm25), in document order"""
+        match = build_any_query(question)
+        if match is None:
+            return []
+        start, end = _chunk_range(document_id)
+        rows = self._conn().execute(
+            "SELECT rowid, content, bm25(document_chunks_fts) AS score FROM document_chunks_fts "
+            "WHERE document_chunks_fts MATCH ? AND rowid BETWEEN ? AND ? "
+            "ORDER BY score LIMIT ?",
+            (match, start, end, k)
+        ).fetchall()
+        if not rows:
+            return []
+        # Passages matching only terms found everywhere in the document score ~0; they add nothing
+        cutoff = rows[0][2] * 0.1
+        passages = [Passage(rowid - start, content, round(-score, 4)) for rowid, content, score in rows if score <= cutoff]
+        return sorted(passages, key=lambda p: p.chunk_no)
+
+    def document_text(self, document_id, max_chars):
+        """The first max_chars of a document's indexed text ('' if not indexed)"""
+        row = self._conn().execute(
+            "SELECT substr(content, 1, ?) FROM documents_fts WHERE rowid = ?", (max_chars, document_id)
+        ).fetchone()
+        return row[0] if row else ''
+
+    def has_passages(self, document_id):
+        start, end = _chunk_range(document_id)
+        return self._conn().execute(
+            "SELECT 1 FROM document_chunks_fts WHERE rowid BETWEEN ? AND ? LIMIT 1", (start, end)
+        ).fetchone() is not None
+
+    def stats(self):
+        conn = self._conn()
+        count = conn.execute("SELECT count(*) FROM documents_fts").fetchone()[0]
+        passages = conn.execute("SELECT count(*) FROM document_chunks_fts").fetchone()[0]
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return {'documents': count, 'passages': passages, 'size_mb': round(size / (1024 * 1024), 2), 'path': self.path}
+
+    def optimize(self):
+        """Merge FTS segments (worth running after large backfills)"""
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("INSERT INTO documents_fts(documents_fts) VALUES ('optimize')")
+                conn.execute("INSERT INTO document_chunks_fts(document_chunks_fts) VALUES ('optimize')")
+
+
+def get_document_index(database_url=None):
+    """Create (once per process) and return the shared DocumentIndex"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DocumentIndex(default_index_path(database_url))
+        return _index
+
+
+def backfill(session, index, read_text=None, split_passages=None):
+    """Index Document rows that are missing from the index; returns how many were added.
+
+    read_text(document) supplies the extracted text; by default the upload's
+    ``<file>.txt`` sidecar is used when present, otherwise only the summary is indexed.
+    split_passages(text) returns the document's retrieval passages.
+    """
+    from database.models import Document
+
+    def _sidecar_text(document):
+        path = f"{document.file_path}.txt" if document.file_path else None
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8', errors='replace') as f:
+                return f.read()
+        return ''
+
+    read_text = read_text or _sidecar_text
+    known = index.indexed_ids()
+    added = 0
+    for document in session.query(Document).yield_per(500):
+        if document.id in known:
+            continue
+        text = read_text(document)
+        index.add(document.id, document.filename, document.ai_summary, text,
+                  file_type=document.file_type, uploaded_by=document.uploaded_by,
+                  chunks=split_passages(text) if split_passages and text else None)
+        added += 1
+    if added:
+        index.optimize()
+    return added
+
+
+if __name__ == '__main__':
+    # python -m database.document_index [--rebuild]  - index existing documents
+    import sys
+    from database.pool import init_pool
+    from bot.document_analysis import split_passages
+
+    logging.basicConfig(level=logging.INFO)
+    manager = init_pool()
+    index = get_document_index(manager.engine.url)
+    if '--rebuild' in sys.argv:
+        index.clear()
+    with manager.scope() as session:
+        count = backfill(session, index, split_passages=split_passages)
+    logger.info(f"Indexed {count} documents into {index.path}")
@@ -0,0 +1,253 @@
+"""
+Schema Migrations
+Versioned, forward-only changes to the tables defined in database.models, recorded in
+schema_migrations and applied once per database when the pool starts
+(DB_AUTO_MIGRATE=0 to leave that to ``python -m database.migrations upgrade``).
+
+``python -m database.migrations check`` runs EXPLAIN on the hot bot/API queries against
+a scratch database and exits non-zero if any of them falls back to a full table scan.
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, Index, inspect, select
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from database.models import User, Case, CourtDate, ComplianceTask, TimeEntry, Notification, LeaveRequest
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+schema_migrations_table = Table(
+    'schema_migrations', metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, default=datetime.utcnow),
+)
+
+# (index name, model, columns) - equality columns first, then the range/sort column
+HOT_LOOKUP_INDEXES = [
+    ('ix_users_telegram_id', User, ['telegram_id']),
+    ('ix_users_status', User, ['status']),
+    ('ix_cases_case_number', Case, ['case_number']),
+    ('ix_cases_assigned_to_status', Case, ['assigned_to', 'status']),
+    ('ix_court_dates_hearing_date', CourtDate, ['hearing_date']),
+    ('ix_court_dates_case_id_hearing_date', CourtDate, ['case_id', 'hearing_date']),
+    ('ix_compliance_tasks_assigned_to_status', ComplianceTask, ['assigned_to', 'status']),
+    ('ix_time_entries_user_id_date', TimeEntry, ['user_id', 'date']),
+    ('ix_notifications_type_created_at', Notification, ['notification_type', 'created_at']),
+    ('ix_notifications_created_at', Notification, ['created_at']),
+    ('ix_leave_requests_user_id_status', LeaveRequest, ['user_id', 'status']),
+]
+
+# Keyset pagination of case lists on (updated_at, id), firm-wide and per assignee;
+# superseded by the listed_at indexes of migration 3
+CASE_LIST_INDEXES = [
+    ('ix_cases_updated_at_id', Case, ['updated_at', 'id']),
+    ('ix_cases_assigned_to_updated_at_id', Case, ['assigned_to', 'updated_at', 'id']),
+]
+
+
+def _covered(inspector, table_name, columns):
+    """True if an existing index, unique constraint or primary key starts with `columns`"""
+    existing = [ix['column_names'] for ix in inspector.get_indexes(table_name)]
+    existing += [uq['column_names'] for uq in inspector.get_unique_constraints(table_name)]
+    existing.append(inspector.get_pk_constraint(table_name).get('constrained_columns') or [])
+    return any(list(names[:len(columns)]) == columns for names in existing)
+
+
+def _create_indexes(conn, indexes):
+    inspector = inspect(conn)
+    for name, model, columns in indexes:
+        table = model.__table__
+        if _covered(inspector, table.name, columns):
+            continue
+        Index(name, *(table.c[column] for column in columns)).create(conn)
+        logger.info(f"Created index {name} on {table.name} ({', '.join(columns)})")
+
+
+def _index_case_lists_by_listed_at(conn):
+    """Index the coalesce(updated_at, created_at) key the case list now sorts on, so cases
+    never updated are listed too, and drop the updated_at indexes it replaces"""
+    from database.case_list import listed_at
+
+    table = Case.__table__
+    for index in (Index('ix_cases_listed_at_id', listed_at, table.c.id),
+                  Index('ix_cases_assigned_to_listed_at_id', table.c.assigned_to, listed_at, table.c.id)):
+        index.create(conn)
+        # Index() attaches itself to the table; keep it out of later create_all() calls
+        table.indexes.discard(index)
+    for name, _, _ in CASE_LIST_INDEXES:
+        conn.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+    logger.info("Indexed case lists on coalesce(updated_at, created_at)")
+
+
+def _add_missing_columns(conn, table_name, columns):
+    """ADD COLUMN each (name, SQL type) that an existing table lacks; a table that doesn't
+    exist yet gets them when its module creates it"""
+    inspector = inspect(conn)
+    if not inspector.has_table(table_name):
+        return
+    existing = {column['name'] for column in inspector.get_columns(table_name)}
+    for name, sql_type in columns:
+        if name not in existing:
+            conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {name} {sql_type}")
+            logger.info(f"Added column {table_name}.{name}")
+
+
+# (version, name, function(connection)) - append only; never renumber or edit an applied entry
+MIGRATIONS = [
+    (1, 'hot_lookup_indexes', lambda conn: _create_indexes(conn, HOT_LOOKUP_INDEXES)),
+    (2, 'case_list_indexes', lambda conn: _create_indexes(conn, CASE_LIST_INDEXES)),
+    (3, 'case_list_listed_at_indexes', _index_case_lists_by_listed_at),
+    # bot.analysis_cache tables created before per-chunk results were cached
+    (4, 'analysis_cache_chunk_keys',
+     lambda conn: _add_missing_columns(conn, 'document_analysis_cache', [('chunk_keys', 'TEXT')])),
+]
+
+
+def applied_versions(engine):
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations_table.c.version)).scalars())
+
+
+def upgrade(engine):
+    """Apply pending migrations in order; returns the versions applied by this call"""
+    done = applied_versions(engine)
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            with engine.begin() as conn:
+                # Claim the version first: a second process starting at the same time fails here
+                conn.execute(schema_migrations_table.insert().values(
+                    version=version, name=name, applied_at=datetime.utcnow()))
+                migrate(conn)
+        except (IntegrityError, OperationalError):
+            if version in applied_versions(engine):
+                continue  # applied concurrently by another process
+            raise
+        logger.info(f"Applied schema migration {version} ({name})")
+        applied.append(version)
+    return applied
+
+
+def auto_upgrade(engine):
+    """upgrade() unless DB_AUTO_MIGRATE turns it off"""
+    if os.getenv('DB_AUTO_MIGRATE', '1').strip().lower() in ('0', 'false', 'no', 'off'):
+        return []
+    return upgrade(engine)
+
+
+# --- Query plan check ---
+
+def _hot_queries(session, now):
+    """Run the hot lookups the bot and API make (results unused; statements are captured)"""
+    from database.agenda import load_agenda, agenda_version
+    from database.dashboard_stats import load_dashboard_stats
+    from database.case_list import load_case_page, count_cases
+
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    session.query(User).filter_by(telegram_id=1).first()
+    session.query(User.id, User.telegram_id).filter(User.status == 'active').all()
+    session.query(Case).filter_by(case_number='CL-1').first()
+    session.query(Case).filter_by(assigned_to=1).all()
+    session.query(Notification).filter_by(notification_type='broadcast').order_by(
+        Notification.created_at.desc()).first()
+    session.query(Notification).filter(Notification.created_at >= now - timedelta(hours=48)).order_by(
+        Notification.created_at.desc()).limit(20).all()
+    session.query(LeaveRequest).filter(LeaveRequest.user_id == 1, LeaveRequest.status == 'pending').all()
+    session.query(TimeEntry).filter(
+        TimeEntry.user_id == 1, TimeEntry.date >= day_start, TimeEntry.date < day_start + timedelta(days=1)
+    ).all()
+    load_agenda(session, 1, now=now, include_broadcast=True)
+    agenda_version(session, 1, now=now)
+    load_dashboard_stats(session, 1, now=now)
+    cursor = f"{now:%Y%m%d%H%M%S%f}.1"
+    for assigned_to in (None, 1):
+        load_case_page(session, assigned_to=assigned_to, cursor=cursor)
+        load_case_page(session, assigned_to=assigned_to, cursor=cursor, direction='prev')
+    count_cases(session, assigned_to=1)
+
+
+def _full_scans(conn, statement, parameters):
+    """Plan lines that read a whole table"""
+    if conn.dialect.name == 'sqlite':
+        plan = [row[3] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        return [line for line in plan if line.startswith('SCAN ') and not line.startswith('SCAN CONSTANT')]
+    if conn.dialect.name == 'postgresql':
+        # Tiny tables make sequential scans cheapest; ask whether an index path exists at all
+        conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        plan = [row[0] for row in conn.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+        return [line.strip() for line in plan if 'Seq Scan' in line]
+    raise NotImplementedError(f"No plan check for {conn.dialect.name}")
+
+
+def check_query_plans(engine):
+    """[(statement, full-scan plan lines)] for hot queries that don't use an index"""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        with Session(engine) as session:
+            _hot_queries(session, datetime.now())
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    problems = []
+    with engine.connect() as conn:
+        for statement, parameters in captured:
+            with conn.begin():
+                scans = _full_scans(conn, statement, parameters)
+            if scans:
+                problems.append((statement, scans))
+    return problems
+
+
+if __name__ == '__main__':
+    # python -m database.migrations [upgrade|status|check [database_url]]
+    import sys
+    from sqlalchemy import create_engine
+
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+
+    if command == 'check':
+        from database.models import Base
+        from database.billing_rollups import create_tables as create_billing_rollups
+
+        engine = create_engine(sys.argv[2] if len(sys.argv) > 2 else 'sqlite://')
+        Base.metadata.create_all(engine)
+        create_billing_rollups(engine)
+        upgrade(engine)
+        problems = check_query_plans(engine)
+        for statement, scans in problems:
+            print(' '.join(statement.split()))
+            for line in scans:
+                print(f"    -> {line}")
+        if problems:
+            sys.exit(f"{len(problems)} hot queries fall back to a full scan")
+        print("All hot queries use an index")
+    elif command in ('upgrade', 'status'):
+        from database.pool import init_pool
+
+        os.environ['DB_AUTO_MIGRATE'] = '0'
+        engine = init_pool().engine
+        if command == 'upgrade':
+            print(f"Applied: {upgrade(engine) or 'nothing pending'}")
+        done = applied_versions(engine)
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:>4} {name:<30} {'applied' if version in done else 'pending'}")
+    else:
+        sys.exit("Usage: python -m database.migrations [upgrade|status|check [database_url]]")
@@ -0,0 +1,216 @@
+"""
+Shared Database Engine & Session Management
+One pooled engine per process, with scoped sessions for API requests and bot updates
+"""
+import os
+import time
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
+
+from database.models import init_db
+from database.migrations import auto_upgrade
+
+logger = logging.getLogger(__name__)
+
+# Identifies the current request/update; sessions outside a scope aren't registered
+_current_scope = ContextVar('db_session_scope', default=None)
+_scope_ids = itertools.count(1)
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class PoolMetrics:
+    """Connection checkout counters and pool wait times"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def incr(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'invalidations': self.invalidations,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+            }
+
+
+def _metered_pool_class(metrics):
+    """QueuePool that times how long each checkout waits for a free connection"""
+
+    class MeteredQueuePool(QueuePool):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except Exception:
+                metrics.record_wait(time.perf_counter() - started, timed_out=True)
+                raise
+            metrics.record_wait(time.perf_counter() - started)
+            return conn
+
+    return MeteredQueuePool
+
+
+class SessionManager:
+    """Process-wide pooled engine and scoped session registry.
+
+    Pool settings default to the DB_POOL_* environment variables.
+    """
+
+    def __init__(self, database_url=None, pool_size=None, max_overflow=None,
+                 pool_timeout=None, pool_recycle=None, pool_pre_ping=None):
+        # init_db() creates the schema; we then rebuild the engine with our pool settings
+        base_engine = init_db()
+        url = database_url or base_engine.url
+        base_engine.dispose()
+
+        self.pool_size = pool_size if pool_size is not None else _env_int('DB_POOL_SIZE', 5)
+        self.max_overflow = max_overflow if max_overflow is not None else _env_int('DB_MAX_OVERFLOW', 10)
+        self.pool_timeout = pool_timeout if pool_timeout is not None else _env_int('DB_POOL_TIMEOUT', 30)
+        self.pool_recycle = pool_recycle if pool_recycle is not None else _env_int('DB_POOL_RECYCLE', 1800)
+        self.pool_pre_ping = pool_pre_ping if pool_pre_ping is not None else _env_bool('DB_POOL_PRE_PING', True)
+        self.metrics = PoolMetrics()
+
+        engine_options = {'pool_pre_ping': self.pool_pre_ping}
+        if not self._is_memory_sqlite(str(url)):
+            engine_options.update(
+                poolclass=_metered_pool_class(self.metrics),
+                pool_size=self.pool_size,
+                max_overflow=self.max_overflow,
+                pool_timeout=self.pool_timeout,
+                pool_recycle=self.pool_recycle,
+            )
+        self.engine = create_engine(url, **engine_options)
+        self._register_pool_events()
+        auto_upgrade(self.engine)
+
+        self.Session = scoped_session(sessionmaker(bind=self.engine), scopefunc=self._scopefunc)
+        logger.info(
+            f"Database pool ready (size={self.pool_size}, overflow={self.max_overflow}, "
+            f"recycle={self.pool_recycle}s, pre_ping={self.pool_pre_ping})"
+        )
+
+    @staticmethod
+    def _is_memory_sqlite(url):
+        return url.startswith('sqlite') and (url.endswith(':memory:') or url.rstrip('/') == 'sqlite:')
+
+    @staticmethod
+    def _scopefunc():
+        return _current_scope.get()
+
+    def _register_pool_events(self):
+        metrics = self.metrics
+        event.listen(self.engine, 'connect', lambda *args: metrics.incr('connects'))
+        event.listen(self.engine, 'checkout', lambda *args: metrics.incr('checkouts'))
+        event.listen(self.engine, 'checkin', lambda *args: metrics.incr('checkins'))
+        event.listen(self.engine, 'invalidate', lambda *args: metrics.incr('invalidations'))
+
+    def session(self):
+        """Session for the current scope (request or update); outside a scope, a new
+        Session of its own that the caller closes"""
+        if _current_scope.get() is None:
+            # Keyed by thread it would never be removed in pool threads (asyncio.to_thread
+            # workers), keeping a session - and any connection it holds - per thread
+            return self.Session.session_factory()
+        return self.Session()
+
+    def remove(self):
+        """Close and discard the current scope's session"""
+        if _current_scope.get() is not None:
+            self.Session.remove()
+
+    @contextmanager
+    def scope(self):
+        """Give the enclosed block (e.g. one bot update) its own session"""
+        token = _current_scope.set(next(_scope_ids))
+        try:
+            yield self.Session()
+        finally:
+            self.Session.remove()
+            _current_scope.reset(token)
+
+    def init_flask(self, app):
+        """Give each Flask request its own scope, removed when the request ends"""
+        from flask import g
+
+        @app.before_request
+        def _open_scope():
+            g.db_scope = _current_scope.set(next(_scope_ids))
+
+        @app.teardown_appcontext
+        def _remove_session(exception=None):
+            token = g.pop('db_scope', None)
+            if token is not None:
+                self.Session.remove()
+                _current_scope.reset(token)
+
+    def after_fork(self):
+        """Drop pooled connections inherited from a parent process without closing them
+        (the parent still owns them); call first thing in a forked worker"""
+        self.engine.dispose(close=False)
+        self.remove()
+
+    def pool_metrics(self):
+        """Pool occupancy plus checkout/wait counters"""
+        stats = self.metrics.snapshot()
+        pool = self.engine.pool
+        if isinstance(pool, QueuePool):
+            stats.update({
+                'pool_size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': pool.overflow(),
+                'max_overflow': self.max_overflow,
+            })
+        return stats
+
+
+def init_pool(**options):
+    """Create (once per process) and return the shared SessionManager"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = SessionManager(**options)
+        return _manager
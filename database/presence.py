@@ -0,0 +1,250 @@
+"""
+Presence Tracker
+Keeps each staff member's last activity in memory. The bot's update middleware and the
+API record activity with touch(); a background thread writes the coalesced last_seen
+values to the users table every PRESENCE_FLUSH_INTERVAL seconds, as one batched UPDATE,
+and reloads what other processes wrote. Online status is answered from memory.
+
+    python -m database.presence [users] [touches]  - per-touch cost vs a write per update
+"""
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, bindparam, or_
+
+from database.models import User
+
+logger = logging.getLogger(__name__)
+
+PresenceChange = namedtuple('PresenceChange', ['user_id', 'is_online', 'last_seen'])
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+class PresenceTracker:
+    """In-memory last_seen per User.id with periodic batched writes.
+
+    Settings default to PRESENCE_FLUSH_INTERVAL (seconds between writes and reloads)
+    and PRESENCE_ONLINE_WINDOW (seconds of inactivity before a user counts as offline).
+    Listeners added with add_listener() get a PresenceChange whenever a user comes
+    online or goes offline; they may be called from the flush thread.
+    """
+
+    def __init__(self, engine, flush_interval=None, online_window=None):
+        self.engine = engine
+        self.flush_interval = flush_interval or float(os.getenv('PRESENCE_FLUSH_INTERVAL', 30))
+        self.online_window = timedelta(seconds=online_window or float(os.getenv('PRESENCE_ONLINE_WINDOW', 300)))
+        self._users = User.__table__
+        self._seen = {}     # user id -> last_seen (this process's activity and the last reload)
+        self._pending = {}  # user id -> last_seen not yet written
+        self._online = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.touches = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.failures = 0
+        self.last_flush_ms = 0.0
+
+    def add_listener(self, callback):
+        """Call callback(PresenceChange) when a user's online status changes"""
+        self._listeners.append(callback)
+
+    def _notify(self, changes):
+        for change in changes:
+            for callback in self._listeners:
+                try:
+                    callback(change)
+                except Exception as e:
+                    logger.warning(f"Presence listener failed: {e}")
+
+    # --- Recording ---
+
+    def touch(self, user_id, when=None):
+        """Record activity by a User.id; costs a dict update, not a DB write"""
+        self._ensure_running()
+        when = when or datetime.utcnow()
+        with self._lock:
+            self.touches += 1
+            previous = self._seen.get(user_id)
+            if previous is not None and previous >= when:
+                return
+            self._seen[user_id] = when
+            self._pending[user_id] = when
+            if user_id in self._online:
+                return
+            self._online.add(user_id)
+        self._notify([PresenceChange(user_id, True, when)])
+
+    # --- Reading ---
+
+    def last_seen(self, user_id):
+        self._ensure_running()
+        with self._lock:
+            return self._seen.get(user_id)
+
+    def is_online(self, user_id, now=None):
+        seen = self.last_seen(user_id)
+        return seen is not None and (now or datetime.utcnow()) - seen < self.online_window
+
+    def snapshot(self):
+        """{User.id: last_seen} for every user seen so far"""
+        self._ensure_running()
+        with self._lock:
+            return dict(self._seen)
+
+    # --- Flushing ---
+
+    def flush(self):
+        """Write pending last_seen values in one batch, reload other processes' values
+        and report online/offline transitions; returns the number of rows written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        started = time.perf_counter()
+        try:
+            with self.engine.begin() as conn:
+                if pending:
+                    users = self._users
+                    # Never move last_seen backwards (another process may have written later)
+                    conn.execute(
+                        update(users)
+                        .where(users.c.id == bindparam('user_id'))
+                        .where(or_(users.c.last_seen.is_(None), users.c.last_seen < bindparam('seen')))
+                        .values(last_seen=bindparam('seen')),
+                        [{'user_id': user_id, 'seen': seen} for user_id, seen in pending.items()]
+                    )
+                stored = conn.execute(
+                    select(self._users.c.id, self._users.c.last_seen).where(self._users.c.last_seen.is_not(None))
+                ).all()
+        except Exception as e:
+            # Keep the values for the next attempt unless newer activity replaced them
+            with self._lock:
+                for user_id, seen in pending.items():
+                    self._pending.setdefault(user_id, seen)
+                self.failures += 1
+            logger.warning(f"Presence flush failed: {e}")
+            return 0
+
+        now = datetime.utcnow()
+        with self._lock:
+            for user_id, seen in stored:
+                current = self._seen.get(user_id)
+                if current is None or seen > current:
+                    self._seen[user_id] = seen
+            online = {user_id for user_id, seen in self._seen.items() if now - seen < self.online_window}
+            changes = (
+                [PresenceChange(user_id, True, self._seen[user_id]) for user_id in online - self._online]
+                + [PresenceChange(user_id, False, self._seen[user_id]) for user_id in self._online - online]
+            )
+            self._online = online
+            self.flushes += 1
+            self.rows_written += len(pending)
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+        self._notify(changes)
+        return len(pending)
+
+    def _ensure_running(self):
+        # Started on first use, and again in a forked worker (threads don't survive fork)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._seen.clear()
+            self._pending.clear()
+            self._online.clear()
+        # Load the stored values before anyone is answered from memory
+        self.flush()
+        self._thread = threading.Thread(target=self._run, name='presence-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        stop = self._stop
+        while not stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stop the flush thread and write what is pending"""
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.flush()
+        self._pid = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tracked': len(self._seen),
+                'online': len(self._online),
+                'pending': len(self._pending),
+                'touches': self.touches,
+                'flushes': self.flushes,
+                'rows_written': self.rows_written,
+                'failures': self.failures,
+                'last_flush_ms': self.last_flush_ms,
+                'flush_interval': self.flush_interval,
+            }
+
+
+def get_presence_tracker(engine):
+    """Create (once per process) and return the shared PresenceTracker"""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = PresenceTracker(engine)
+        return _tracker
+
+
+if __name__ == '__main__':
+    import sys
+    import tempfile
+
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    touches = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkdtemp()}/presence_bench.db"
+    from database.pool import init_pool
+
+    db = init_pool()
+    session = db.session()
+    session.bulk_insert_mappings(User, [
+        {'telegram_id': 10 ** 6 + i, 'full_name': f'Staff {i}', 'status': 'active'} for i in range(users)
+    ])
+    session.commit()
+    ids = [user_id for (user_id,) in session.query(User.id)]
+
+    # Before: one UPDATE transaction per update
+    started = time.perf_counter()
+    for i in range(touches // 10):
+        session.query(User).filter_by(id=ids[i % users]).update({'last_seen': datetime.utcnow()})
+        session.commit()
+    per_write = (time.perf_counter() - started) / (touches // 10)
+    session.close()
+
+    tracker = PresenceTracker(db.engine, flush_interval=3600)
+    tracker.snapshot()
+    started = time.perf_counter()
+    for i in range(touches):
+        tracker.touch(ids[i % users])
+    per_touch = (time.perf_counter() - started) / touches
+    started = time.perf_counter()
+    written = tracker.flush()
+    flush_ms = (time.perf_counter() - started) * 1000
+    tracker.close()
+
+    print(f"write per update: {per_write * 1e6:8.1f} us/update")
+    print(f"presence touch:   {per_touch * 1e6:8.1f} us/update, then one {flush_ms:.1f} ms flush "
+          f"of {written} rows for {touches} updates")
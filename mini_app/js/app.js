@@ -35,14 +35,54 @@ try {
 const API_BASE_URL = 'https://tomoko-pericarditic-regretfully.ngrok-free.dev/api';
 const USER_ID = tg.initDataUnsafe?.user?.id || 12345;
 
+// Conditional GETs: responses are kept with their ETag (in localStorage, so they survive
+// closing the Mini-App) and reused when the server answers 304 Not Modified
+const RESPONSE_CACHE_PREFIX = 'apiCache:';
+
+function readCachedResponse(url) {
+    try {
+        return JSON.parse(localStorage.getItem(RESPONSE_CACHE_PREFIX + url));
+    } catch (error) {
+        return null;
+    }
+}
+
+function writeCachedResponse(url, etag, data) {
+    try {
+        localStorage.setItem(RESPONSE_CACHE_PREFIX + url, JSON.stringify({ etag, data }));
+    } catch (error) {
+        // Storage full or unavailable: the next request simply downloads the body again
+    }
+}
+
+// GET a JSON endpoint, revalidating any cached copy; null when the request fails
+async function cachedGet(url) {
+    const headers = { 'ngrok-skip-browser-warning': 'true' };
+    const cached = readCachedResponse(url);
+    if (cached?.etag) headers['If-None-Match'] = cached.etag;
+
+    const response = await fetch(url, { headers });
+    if (response.status === 304 && cached) return cached.data;
+    if (!response.ok) return null;
+
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag) writeCachedResponse(url, etag, data);
+    return data;
+}
+
 // Data storage
 let userData = null;
 let statsData = { activeCases: 0, courtDates: 0, billableHours: 0 };
+// Set once the server's dashboard counters arrive; they win over client-side estimates
+let hasServerStats = false;
 let agendaData = [];
 let allCasesData = []; // Store original cases for filtering
 let casesData = [];    // Displayed cases
+let casesCursor = null; // next_cursor of the last cases page loaded (null when all are loaded)
 let notificationsData = [];
 let staffData = [];
+let eventsUrl = null;   // where pushed events stream from; null when the server doesn't push
 
 // Loading states
 function showLoading() {
@@ -63,27 +103,29 @@ function hideLoading() {
     }
 }
 
+// Map user profile payload
+function applyUserProfile(data) {
+    userData = {
+        name: data.full_name,
+        position: data.position,
+        department: data.departments,
+        email: data.email,
+        phone: data.phone,
+        employeeId: `CLF - ${data.id} `,
+        specialization: data.role, // Mapping role to specialization for now
+        barNumber: "N/A", // Not in API yet
+        joinDate: "N/A" // Not in API yet
+    };
+    return userData;
+}
+
 // Fetch user profile
 async function fetchUserProfile() {
     if (!USER_ID) return;
     try {
-        const response = await fetch(`${API_BASE_URL}/user/${USER_ID}`, {
-            headers: { 'ngrok-skip-browser-warning': 'true' }
-        });
-        if (response.ok) {
-            const data = await response.json();
-            userData = {
-                name: data.full_name,
-                position: data.position,
-                department: data.departments,
-                email: data.email,
-                phone: data.phone,
-                employeeId: `CLF - ${data.id} `,
-                specialization: data.role, // Mapping role to specialization for now
-                barNumber: "N/A", // Not in API yet
-                joinDate: "N/A" // Not in API yet
-            };
-            return userData;
+        const data = await cachedGet(`${API_BASE_URL}/user/${USER_ID}`);
+        if (data) {
+            return applyUserProfile(data);
         }
     } catch (error) {
         console.error('Error fetching user profile:', error);
@@ -92,29 +134,35 @@ async function fetchUserProfile() {
     return null;
 }
 
+// Map cases payload (append adds a further page to those already loaded)
+function applyCases(data, append = false) {
+    const page = (data.cases || []).map(c => ({
+        id: c.id,
+        caseNumber: c.case_number,
+        title: c.title,
+        client: c.client_name,
+        type: c.case_type,
+        status: c.status,
+        priority: c.priority,
+        nextCourtDate: c.next_court_date,
+        deadline: c.deadline
+    }));
+    allCasesData = append ? allCasesData.concat(page) : page;
+    casesCursor = data.next_cursor || null;
+    casesData = [...allCasesData];
+    if (!hasServerStats) {
+        statsData.activeCases = allCasesData.filter(c => c.status === 'active').length;
+    }
+    return allCasesData;
+}
+
 // Fetch cases
 async function fetchCases() {
     if (!USER_ID) return [];
     try {
-        const response = await fetch(`${API_BASE_URL}/cases/${USER_ID}`, {
-            headers: { 'ngrok-skip-browser-warning': 'true' }
-        });
-        if (response.ok) {
-            const data = await response.json();
-            allCasesData = (data.cases || []).map(c => ({
-                id: c.id,
-                caseNumber: c.case_number,
-                title: c.title,
-                client: c.client_name,
-                type: c.case_type,
-                status: c.status,
-                priority: c.priority,
-                nextCourtDate: c.next_court_date,
-                deadline: c.deadline
-            }));
-            casesData = [...allCasesData];
-            statsData.activeCases = allCasesData.filter(c => c.status === 'active').length;
-            return allCasesData;
+        const data = await cachedGet(`${API_BASE_URL}/cases/${USER_ID}`);
+        if (data) {
+            return applyCases(data);
         }
     } catch (error) {
         console.error('Error fetching cases:', error);
@@ -123,47 +171,65 @@ async function fetchCases() {
     return [];
 }
 
-// Fetch agenda
-async function fetchAgenda() {
-    if (!USER_ID) return { court_dates: [], tasks: [], time_entries: [], total_hours: 0 };
+// Fetch the next page of cases
+async function loadMoreCases() {
+    if (!USER_ID || !casesCursor) return;
     try {
-        const response = await fetch(`${API_BASE_URL}/agenda/${USER_ID}`, {
-            headers: { 'ngrok-skip-browser-warning': 'true' }
+        const data = await cachedGet(`${API_BASE_URL}/cases/${USER_ID}?cursor=${encodeURIComponent(casesCursor)}`);
+        if (data) {
+            applyCases(data, true);
+            filterCases();
+        }
+    } catch (error) {
+        console.error('Error fetching more cases:', error);
+    }
+}
+
+// Map agenda payload
+function applyAgenda(data) {
+    if (!hasServerStats) {
+        statsData.courtDates = data.court_dates?.length || 0;
+        statsData.billableHours = data.total_hours || 0;
+    }
+
+    // Map to agenda items for display
+    agendaData = [];
+
+    // Add court dates
+    if (data.court_dates) {
+        data.court_dates.forEach(cd => {
+            const date = new Date(cd.hearing_date);
+            agendaData.push({
+                time: date.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
+                title: "Court Appearance",
+                description: `${cd.court_name} - ${cd.purpose || 'Hearing'} `,
+                type: "court"
+            });
         });
-        if (response.ok) {
-            const data = await response.json();
-            statsData.courtDates = data.court_dates?.length || 0;
-            statsData.billableHours = data.total_hours || 0;
-
-            // Map to agenda items for display
-            agendaData = [];
-
-            // Add court dates
-            if (data.court_dates) {
-                data.court_dates.forEach(cd => {
-                    const date = new Date(cd.hearing_date);
-                    agendaData.push({
-                        time: date.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
-                        title: "Court Appearance",
-                        description: `${cd.court_name} - ${cd.purpose || 'Hearing'} `,
-                        type: "court"
-                    });
-                });
-            }
+    }
 
-            // Add tasks
-            if (data.tasks) {
-                data.tasks.forEach(t => {
-                    agendaData.push({
-                        time: "Anytime",
-                        title: "Task",
-                        description: t.title,
-                        type: "deadline"
-                    });
-                });
-            }
+    // Add tasks
+    if (data.tasks) {
+        data.tasks.forEach(t => {
+            agendaData.push({
+                time: "Anytime",
+                title: "Task",
+                description: t.title,
+                type: "deadline"
+            });
+        });
+    }
 
-            return data;
+    return data;
+}
+
+// Fetch agenda
+async function fetchAgenda() {
+    if (!USER_ID) return { court_dates: [], tasks: [], time_entries: [], total_hours: 0 };
+    try {
+        const data = await cachedGet(`${API_BASE_URL}/agenda/${USER_ID}`);
+        if (data) {
+            return applyAgenda(data);
         }
     } catch (error) {
         console.error('Error fetching agenda:', error);
@@ -173,24 +239,56 @@ async function fetchAgenda() {
     return { court_dates: [], tasks: [], time_entries: [], total_hours: 0 };
 }
 
+// Map dashboard counters payload (same numbers as the bot's dashboard)
+function applyStats(data) {
+    hasServerStats = true;
+    statsData.activeCases = data.active_cases || 0;
+    statsData.courtDates = data.court_dates_week || 0;
+    statsData.billableHours = data.billable_hours_month || 0;
+    return statsData;
+}
+
+// Fetch dashboard counters
+async function fetchStats() {
+    if (!USER_ID) return statsData;
+    try {
+        const data = await cachedGet(`${API_BASE_URL}/stats/${USER_ID}`);
+        if (data) {
+            return applyStats(data);
+        }
+    } catch (error) {
+        console.error('Error fetching stats:', error);
+    }
+
+    return statsData;
+}
+
+// Map one notification from the API (or a pushed event)
+function mapNotification(n) {
+    return {
+        id: n.id,
+        title: n.title,
+        message: n.message,
+        created_at: n.created_at,
+        time: new Date(n.created_at).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
+        type: n.priority === 'urgent' ? 'alert' : 'info',
+        icon: n.priority === 'urgent' ? '🚨' : '📢',
+        urgent: n.priority === 'urgent'
+    };
+}
+
+// Map notifications payload
+function applyNotifications(data) {
+    notificationsData = (data.notifications || []).map(mapNotification);
+    return notificationsData;
+}
+
 // Fetch notifications
 async function fetchNotifications() {
     try {
-        const response = await fetch(`${API_BASE_URL}/notifications`, {
-            headers: { 'ngrok-skip-browser-warning': 'true' }
-        });
-        if (response.ok) {
-            const data = await response.json();
-            notificationsData = (data.notifications || []).map(n => ({
-                id: n.id,
-                title: n.title,
-                message: n.message,
-                time: new Date(n.created_at).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
-                type: n.priority === 'urgent' ? 'alert' : 'info',
-                icon: n.priority === 'urgent' ? '🚨' : '📢',
-                urgent: n.priority === 'urgent'
-            }));
-            return notificationsData;
+        const data = await cachedGet(`${API_BASE_URL}/notifications`);
+        if (data) {
+            return applyNotifications(data);
         }
     } catch (error) {
         console.error('Error fetching notifications:', error);
@@ -198,27 +296,29 @@ async function fetchNotifications() {
     return [];
 }
 
+// Map staff payload
+function applyStaff(data) {
+    staffData = (data.staff || []).map(s => ({
+        id: s.id,
+        name: s.full_name,
+        role: s.position,
+        photo: s.photo_file_id ? `https://api.telegram.org/file/bot${tg.initDataUnsafe?.hash}/${s.photo_file_id}` : `https://ui-avatars.com/api/?name=${encodeURIComponent(s.full_name)}&background=3b82f6&color=fff`,
+        status: s.is_online ? 'online' : 'offline',
+        location: s.latitude ? 'Location Shared' : 'Unknown',
+        lat: s.latitude || null,
+        lng: s.longitude || null,
+        lastSeen: s.last_seen ? new Date(s.last_seen).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }) : 'Unknown'
+    }));
+
+    return staffData;
+}
+
 // Fetch staff
 async function fetchStaff() {
     try {
-        const response = await fetch(`${API_BASE_URL}/staff`, {
-            headers: { 'ngrok-skip-browser-warning': 'true' }
-        });
-        if (response.ok) {
-            const data = await response.json();
-            staffData = (data.staff || []).map(s => ({
-                id: s.id,
-                name: s.full_name,
-                role: s.position,
-                photo: s.photo_file_id ? `https://api.telegram.org/file/bot${tg.initDataUnsafe?.hash}/${s.photo_file_id}` : `https://ui-avatars.com/api/?name=${encodeURIComponent(s.full_name)}&background=3b82f6&color=fff`,
-                status: s.is_online ? 'online' : 'offline',
-                location: s.latitude ? 'Location Shared' : 'Unknown',
-                lat: s.latitude || null,
-                lng: s.longitude || null,
-                lastSeen: s.last_seen ? new Date(s.last_seen).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }) : 'Unknown'
-            }));
-
-            return staffData;
+        const data = await cachedGet(`${API_BASE_URL}/staff`);
+        if (data) {
+            return applyStaff(data);
         }
     } catch (error) {
         console.error('Error fetching staff:', error);
@@ -227,6 +327,21 @@ async function fetchStaff() {
     return [];
 }
 
+// Fetch all startup data in one round trip
+async function fetchBootstrap() {
+    const data = await cachedGet(`${API_BASE_URL}/bootstrap/${USER_ID}`);
+    if (!data) throw new Error('Bootstrap failed');
+
+    if (data.user) applyUserProfile(data.user);
+    if (data.cases) applyCases(data.cases);
+    if (data.agenda) applyAgenda(data.agenda);
+    if (data.stats) applyStats(data.stats);
+    if (data.notifications) applyNotifications(data.notifications);
+    if (data.staff) applyStaff(data.staff);
+    eventsUrl = data.events_url ? new URL(data.events_url, API_BASE_URL).href : null;
+    return data;
+}
+
 // Open staff location on map (using OpenStreetMap - free)
 function viewStaffLocation(lat, lng, name) {
     if (!lat || !lng) {
@@ -311,14 +426,20 @@ async function initApp() {
     try {
         console.log('Starting App Initialization...');
 
-        // 1. Fetch all data in parallel
-        await Promise.all([
-            fetchUserProfile(),
-            fetchCases(),
-            fetchAgenda(),
-            fetchNotifications(),
-            fetchStaff()
-        ]);
+        // 1. Fetch all data (single bootstrap call, per-section calls as fallback)
+        try {
+            await fetchBootstrap();
+        } catch (error) {
+            console.warn('Bootstrap unavailable, fetching sections individually:', error);
+            await Promise.all([
+                fetchUserProfile(),
+                fetchCases(),
+                fetchAgenda(),
+                fetchStats(),
+                fetchNotifications(),
+                fetchStaff()
+            ]);
+        }
 
         // 2. Render all sections
         renderProfile();
@@ -331,6 +452,7 @@ async function initApp() {
 
         // 3. Post-render setup
         setupScrollAnimations();
+        connectEvents();
 
         // 4. Handle deep linking
         const urlParams = new URLSearchParams(window.location.search);
@@ -352,48 +474,6 @@ async function initApp() {
 }
 
 
-function renderNotifications() {
-    const list = document.getElementById('notificationsList');
-    if (!list) return;
-
-    // Get broadcast from URL
-    const urlParams = new URLSearchParams(window.location.search);
-    const broadcastMsg = urlParams.get('broadcast');
-    const broadcastTime = urlParams.get('time');
-
-    let notifications = [...notificationsData];
-
-    // Add broadcast if exists and not already in list (simple check)
-    if (broadcastMsg) {
-        notifications.unshift({
-            id: 'broadcast',
-            title: '📢 System Broadcast',
-            message: decodeURIComponent(broadcastMsg),
-            time: broadcastTime || 'Just now',
-            type: 'urgent',
-            icon: '📢'
-        });
-    }
-
-    if (notifications.length === 0) {
-        list.innerHTML = '<p style="color: var(--text-secondary); text-align: center; padding: 1rem;">No new notifications</p>';
-        return;
-    }
-
-    list.innerHTML = notifications.map(n => `
-        <div class="notification-item ${n.type}">
-            <div class="notification-icon">${n.icon}</div>
-            <div class="notification-content">
-                <div class="notification-header">
-                    <span class="notification-title">${n.title}</span>
-                    <span class="notification-time">${n.time}</span>
-                </div>
-                <p class="notification-message">${n.message}</p>
-            </div>
-        </div>
-    `).join('');
-}
-
 // Animate number counting
 function animateValue(id, start, end, duration, isDecimal = false) {
     const element = document.getElementById(id);
@@ -633,7 +713,11 @@ function renderCases() {
         `;
     }).join('');
 
-    casesList.innerHTML = casesHTML;
+    const loadMore = casesCursor ? `
+        <button class="btn-small" onclick="loadMoreCases()" style="width: 100%; margin-top: 0.5rem;">Load more cases</button>
+    ` : '';
+
+    casesList.innerHTML = casesHTML + loadMore;
 }
 
 function viewCase(id) {
@@ -1265,6 +1349,111 @@ async function deleteNotification(id) {
     }
 }
 
+// Live updates: new notifications, deletions and presence pushed by the server.
+// The stream is read with fetch() rather than EventSource, which can't send the ngrok header
+let eventsStarted = false;
+let lastEventId = null;
+
+const eventHandlers = {
+    notification(data) {
+        const notification = mapNotification(data);
+        if (notificationsData.some(n => n.id === notification.id)) return;
+        notificationsData.unshift(notification);
+        renderNotifications();
+        if (tg.HapticFeedback) tg.HapticFeedback.notificationOccurred('success');
+    },
+
+    notification_deleted({ id }) {
+        notificationsData = notificationsData.filter(n => n.id !== id);
+        renderNotifications();
+    },
+
+    presence(presence) {
+        const member = staffData.find(s => s.id === presence.id);
+        if (!member) return;
+        member.status = presence.is_online ? 'online' : 'offline';
+        if (presence.last_seen) {
+            // Server times are UTC
+            member.lastSeen = new Date(presence.last_seen + 'Z').toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+        }
+        renderStaff();
+    },
+
+    // Events were missed (slow connection or server restart): reload what they affect
+    async resync() {
+        await Promise.all([fetchNotifications(), fetchStaff()]);
+        renderNotifications();
+        renderStaff();
+    }
+};
+
+// Only when bootstrap advertised an events_url (something serves the stream)
+function connectEvents() {
+    if (eventsStarted || !eventsUrl || typeof TextDecoder === 'undefined') return;
+    eventsStarted = true;
+    streamEvents();
+}
+
+// Keep one stream open, reconnecting with Last-Event-ID to catch up on what was missed
+async function streamEvents() {
+    let retryMs = 3000;
+    let failures = 0;
+    while (true) {
+        try {
+            const headers = { 'ngrok-skip-browser-warning': 'true', 'Accept': 'text/event-stream' };
+            if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+            const response = await fetch(eventsUrl, { headers, cache: 'no-store' });
+            if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+            failures = 0;
+            retryMs = await readEventStream(response.body, retryMs);
+        } catch (error) {
+            failures++;
+            console.warn('Event stream interrupted:', error);
+        }
+        // Back off while the server is unreachable, up to a minute between attempts
+        await new Promise(resolve => setTimeout(resolve, Math.min(retryMs * 2 ** failures, 60000)));
+    }
+}
+
+// Dispatch each event of a text/event-stream body; returns the server's retry delay
+async function readEventStream(body, retryMs) {
+    const reader = body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let event = { id: null, type: 'message', data: [] };
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) return retryMs;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split(/\r\n|\r|\n/);
+        buffer = lines.pop();
+        for (const line of lines) {
+            if (line === '') {
+                if (event.id !== null) lastEventId = event.id;
+                const handler = eventHandlers[event.type];
+                if (handler && event.data.length) {
+                    try {
+                        await handler(JSON.parse(event.data.join('\n')));
+                    } catch (error) {
+                        console.error(`Error handling ${event.type} event:`, error);
+                    }
+                }
+                event = { id: null, type: 'message', data: [] };
+                continue;
+            }
+            if (line.startsWith(':')) continue; // keep-alive comment
+            const colon = line.indexOf(':');
+            const field = colon === -1 ? line : line.slice(0, colon);
+            let fieldValue = colon === -1 ? '' : line.slice(colon + 1);
+            if (fieldValue.startsWith(' ')) fieldValue = fieldValue.slice(1);
+            if (field === 'event') event.type = fieldValue;
+            else if (field === 'data') event.data.push(fieldValue);
+            else if (field === 'id') event.id = fieldValue;
+            else if (field === 'retry' && /^\d+$/.test(fieldValue)) retryMs = Number(fieldValue);
+        }
+    }
+}
+
 // Modal functions
 function showModal(title, content) {
     document.getElementById('modalTitle').textContent = title;
@@ -0,0 +1,65 @@
+"""
+Shared fixtures. Modules that open the shared pool (database.pool, api.server) read
+DATABASE_URL at import, so it points at a throwaway SQLite file before any test imports them.
+"""
+import os
+import itertools
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/tests.db")
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A file-backed SQLite engine of its own (worker threads can't share a :memory: one)"""
+    engine = create_engine(f"sqlite:///{tmp_path}/test.db")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    """A session on `engine` with the models' tables created and every migration applied"""
+    from sqlalchemy.orm import Session
+    from database.models import Base
+    from database.migrations import upgrade
+
+    Base.metadata.create_all(engine)
+    upgrade(engine)
+    with Session(engine) as session:
+        yield session
+
+
+# --- Mini-App API (on the shared DATABASE_URL database) ---
+
+_telegram_ids = itertools.count(5_000_000)
+
+
+@pytest.fixture(scope='session')
+def server():
+    from api import server
+    server.app.testing = True
+    return server
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+@pytest.fixture
+def add_user(server):
+    """add_user(status='active', **fields) commits a User to the API's database and
+    returns its telegram_id"""
+    from database.models import User
+
+    def add(status='active', **fields):
+        with server.db.scope() as session:
+            user = User(telegram_id=next(_telegram_ids), full_name='Test User', status=status, **fields)
+            session.add(user)
+            session.commit()
+            return user.telegram_id
+    return add
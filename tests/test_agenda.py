@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+from database.models import User, Case, CourtDate, ComplianceTask, TimeEntry, Notification
+from database.agenda import load_agenda, agenda_version, COURT_DATE_DAYS
+
+NOW = datetime(2026, 3, 2, 9, 30)
+# Time entries are stamped in UTC
+NOW_UTC = NOW.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _user_with_agenda(session, court_dates):
+    user = User(telegram_id=1, full_name='Agenda User')
+    session.add(user)
+    session.flush()
+    for i in range(court_dates):
+        case = Case(case_number=f'AG-{i}', title='Agenda', assigned_to=user.id)
+        session.add(case)
+        session.flush()
+        session.add(CourtDate(case_id=case.id, court_name='High Court',
+                              hearing_date=NOW + timedelta(hours=1 + i % 100), purpose='Hearing'))
+        session.add(ComplianceTask(title=f'Task {i}', assigned_to=user.id, status='pending',
+                                   deadline=NOW + timedelta(days=i % 30)))
+        session.add(TimeEntry(user_id=user.id, case_id=case.id, date=NOW_UTC, duration_minutes=30,
+                              description='Drafting'))
+    session.commit()
+    session.expire_all()
+    return user.id
+
+
+@pytest.fixture
+def statements(engine):
+    captured = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: captured.append(args[2]))
+    return captured
+
+
+@pytest.mark.parametrize('court_dates', [1, 10, 100])
+def test_load_agenda_issues_four_queries_regardless_of_court_date_count(session, statements, court_dates):
+    user_id = _user_with_agenda(session, court_dates)
+    statements.clear()
+
+    agenda = load_agenda(session, user_id, now=NOW, include_broadcast=True)
+
+    assert len(statements) == 4
+    assert (len(agenda.court_dates), len(agenda.tasks), len(agenda.time_entries)) == (court_dates,) * 3
+
+
+def test_load_agenda_without_the_broadcast_issues_three_queries(session, statements):
+    user_id = _user_with_agenda(session, 5)
+    statements.clear()
+
+    agenda = load_agenda(session, user_id, now=NOW)
+
+    assert len(statements) == 3
+    assert agenda.latest_broadcast is None
+
+
+def test_load_agenda_sections(session):
+    user_id = _user_with_agenda(session, 2)
+    case = Case(case_number='AG-LATER', title='Later', assigned_to=user_id)
+    session.add(case)
+    session.flush()
+    session.add_all([
+        CourtDate(case_id=case.id, court_name='High Court', purpose='Past',
+                  hearing_date=NOW - timedelta(hours=1)),
+        CourtDate(case_id=case.id, court_name='High Court', purpose='Beyond the week',
+                  hearing_date=NOW + timedelta(days=COURT_DATE_DAYS + 1)),
+        ComplianceTask(title='Done', assigned_to=user_id, status='completed', deadline=NOW),
+        TimeEntry(user_id=user_id, case_id=case.id, date=NOW_UTC - timedelta(days=1), duration_minutes=90),
+        Notification(message='Office closed Friday', notification_type='broadcast', created_at=NOW),
+    ])
+    session.commit()
+
+    agenda = load_agenda(session, user_id, now=NOW, include_broadcast=True)
+
+    assert agenda.day == NOW.date()
+    assert [court_date.case_number for court_date in agenda.court_dates] == ['AG-0', 'AG-1']
+    assert [task.title for task in agenda.tasks] == ['Task 0', 'Task 1']
+    assert agenda.total_hours == 1.0
+    assert agenda.latest_broadcast.message == 'Office closed Friday'
+
+
+def test_agenda_version_is_one_statement_that_tracks_the_agenda(session, statements):
+    user_id = _user_with_agenda(session, 3)
+    statements.clear()
+    version = agenda_version(session, user_id, now=NOW)
+    assert len(statements) == 1
+
+    task = session.query(ComplianceTask).filter_by(title='Task 0').one()
+    task.status = 'completed'
+    session.commit()
+    after_task = agenda_version(session, user_id, now=NOW)
+
+    session.add(TimeEntry(user_id=user_id, date=NOW_UTC, duration_minutes=15))
+    session.commit()
+    after_entry = agenda_version(session, user_id, now=NOW)
+
+    assert len({version, after_task, after_entry}) == 3
+    assert agenda_version(session, user_id, now=NOW) == after_entry
+    # The first hearing has passed an hour later
+    assert agenda_version(session, user_id, now=NOW + timedelta(hours=1, minutes=1)) != after_entry
@@ -0,0 +1,148 @@
+import json
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from bot.ai_client import AIClient, AIClientError
+
+
+class StubOpenAI(ThreadingHTTPServer):
+    """Local chat-completions endpoint: answers with the queued `failures` (status codes)
+    first, then with a reply, after `latency` seconds"""
+
+    daemon_threads = True
+
+    def __init__(self, failures=(), latency=0.0, retry_after=None):
+        super().__init__(('127.0.0.1', 0), _StubHandler)
+        self.failures = list(failures)
+        self.latency = latency
+        self.retry_after = retry_after
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        stub = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with stub.lock:
+            stub.requests += 1
+            stub.in_flight += 1
+            stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+            status = stub.failures.pop(0) if stub.failures else 200
+        time.sleep(stub.latency)
+        with stub.lock:
+            stub.in_flight -= 1
+
+        if status == 200:
+            payload = {
+                'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': f"echo: {body['messages'][-1]['content']}"}}],
+                'usage': {'prompt_tokens': 7, 'completion_tokens': 3, 'total_tokens': 10},
+            }
+        else:
+            payload = {'error': {'message': f'stub error {status}', 'type': 'stub', 'code': None}}
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if status == 429 and stub.retry_after is not None:
+            self.send_header('Retry-After', str(stub.retry_after))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(**options):
+        server = StubOpenAI(**options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _client(server, **options):
+    options = {'max_retries': 2, 'backoff_base': 0.01, 'backoff_max': 1.0, **options}
+    return AIClient(api_key='test', base_url=server.base_url, **options)
+
+
+async def _chat(client, *prompts):
+    try:
+        return await asyncio.gather(*(client.chat([{'role': 'user', 'content': prompt}]) for prompt in prompts))
+    finally:
+        await client.close()
+
+
+def test_chat_returns_the_reply_and_records_usage(stub_server):
+    client = _client(stub_server())
+
+    replies = asyncio.run(_chat(client, 'hello'))
+
+    assert replies == ['echo: hello']
+    stats = client.stats()
+    assert (stats['calls'], stats['failures'], stats['retries']) == (1, 0, 0)
+    assert (stats['prompt_tokens'], stats['completion_tokens']) == (7, 3)
+
+
+def test_rate_limits_are_retried_after_the_servers_delay(stub_server):
+    server = stub_server(failures=[429], retry_after=0.3)
+    client = _client(server)
+
+    started = time.perf_counter()
+    replies = asyncio.run(_chat(client, 'hello'))
+
+    assert replies == ['echo: hello']
+    assert time.perf_counter() - started >= 0.3
+    assert (server.requests, client.retries) == (2, 1)
+
+
+def test_server_errors_fail_once_retries_are_used_up(stub_server):
+    server = stub_server(failures=[500, 502, 503])
+    client = _client(server)
+
+    with pytest.raises(AIClientError):
+        asyncio.run(_chat(client, 'hello'))
+
+    assert server.requests == 3
+    assert (client.retries, client.failures, client.calls) == (2, 1, 0)
+
+
+def test_client_errors_are_not_retried(stub_server):
+    server = stub_server(failures=[400])
+    client = _client(server)
+
+    with pytest.raises(AIClientError):
+        asyncio.run(_chat(client, 'hello'))
+
+    assert (server.requests, client.retries) == (1, 0)
+
+
+def test_concurrent_calls_are_capped(stub_server):
+    server = stub_server(latency=0.05)
+    client = _client(server, max_concurrency=3)
+
+    replies = asyncio.run(_chat(client, *(f'prompt {i}' for i in range(12))))
+
+    assert replies == [f'echo: prompt {i}' for i in range(12)]
+    assert server.max_in_flight == 3
+    assert client.stats()['in_flight'] == 0
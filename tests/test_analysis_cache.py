@@ -0,0 +1,52 @@
+from sqlalchemy import MetaData, Table, Column, String, Text, Integer, BigInteger, DateTime, inspect
+
+from database.models import Base
+from database.migrations import upgrade
+from bot.analysis_cache import AnalysisCache
+
+
+def _old_cache_table(engine):
+    """document_analysis_cache as created before chunk_keys existed"""
+    Table(
+        'document_analysis_cache', MetaData(),
+        Column('sha256', String(64), primary_key=True),
+        Column('file_unique_id', String(128), index=True),
+        Column('filename', String(255)),
+        Column('document_id', Integer),
+        Column('text_content', Text),
+        Column('ai_summary', Text),
+        Column('size_bytes', BigInteger, nullable=False),
+        Column('created_at', DateTime),
+        Column('last_used_at', DateTime, index=True),
+    ).create(engine)
+
+
+def test_migration_adds_chunk_keys_to_an_existing_cache_table(engine):
+    Base.metadata.create_all(engine)
+    _old_cache_table(engine)
+
+    upgrade(engine)
+    cache = AnalysisCache(engine)
+    cache.store('a' * 64, 'file-1', 'brief.pdf', 'Full text', 'Summary', document_id=3, chunk_keys=['k1', 'k2'])
+
+    assert 'chunk_keys' in {column['name'] for column in inspect(engine).get_columns('document_analysis_cache')}
+    assert cache.lookup(file_unique_id='file-1').chunk_keys == ['k1', 'k2']
+
+
+def test_migration_on_a_new_database_leaves_the_table_to_the_cache(engine):
+    Base.metadata.create_all(engine)
+    upgrade(engine)
+
+    cache = AnalysisCache(engine)
+
+    assert cache.lookup(sha256='b' * 64) is None
+
+
+def test_excerpts_come_from_the_cached_full_text(engine):
+    cache = AnalysisCache(engine)
+    full_text = "Page one. " * 2000 + "Closing clause on the last page."
+    cache.store('c' * 64, 'file-2', 'bundle.pdf', full_text, 'Summary')
+
+    assert cache.text_excerpt('c' * 64, 9) == 'Page one.'
+    assert cache.text_excerpt('c' * 64, len(full_text)).endswith('Closing clause on the last page.')
+    assert cache.lookup(sha256='c' * 64).text_content == full_text
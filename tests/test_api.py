@@ -0,0 +1,52 @@
+def test_document_search_requires_an_onboarded_user(client):
+    response = client.get('/api/documents/search/1?q=lease')
+
+    assert response.status_code == 404
+
+
+def test_document_search_refuses_blocked_users(client, add_user):
+    telegram_id = add_user(status='blocked')
+
+    response = client.get(f'/api/documents/search/{telegram_id}?q=lease')
+
+    assert response.status_code == 403
+
+
+def test_document_search_for_an_active_user(server, client, add_user):
+    telegram_id = add_user()
+    server.document_index.add(9_000_001, 'lease.pdf', 'Summary of a lease', 'Lease termination clause')
+
+    response = client.get(f'/api/documents/search/{telegram_id}?q=termination')
+
+    assert response.status_code == 200
+    assert [hit['id'] for hit in response.get_json()['results']] == [9_000_001]
+
+
+def test_bootstrap_advertises_the_event_stream_only_when_configured(server, client, add_user, monkeypatch):
+    telegram_id = add_user()
+
+    without_push = client.get(f'/api/bootstrap/{telegram_id}?sections=user')
+    monkeypatch.setattr(server, 'PUSH_EVENTS_URL', '/api/events')
+    with_push = client.get(f'/api/bootstrap/{telegram_id}?sections=user',
+                           headers={'If-None-Match': without_push.headers['ETag']})
+
+    assert without_push.get_json()['events_url'] is None
+    # A cached bootstrap from before push was configured is not reused
+    assert with_push.status_code == 200
+    assert with_push.get_json()['events_url'] == '/api/events'
+
+
+def test_deleting_a_notification_publishes_the_deletion(server, client):
+    from database.models import Notification
+
+    with server.db.scope() as session:
+        notification = Notification(message='Office closed Friday', notification_type='broadcast')
+        session.add(notification)
+        session.commit()
+        notification_id = notification.id
+
+    response = client.delete(f'/api/notifications/{notification_id}')
+
+    assert response.status_code == 200
+    event = server.push_hub._fetch(0)[-1]
+    assert (event.type, event.data) == ('notification_deleted', {'id': notification_id})
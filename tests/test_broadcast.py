@@ -0,0 +1,82 @@
+import time
+import asyncio
+from datetime import timedelta
+
+from telegram.error import RetryAfter, Forbidden
+
+from bot.broadcast import BroadcastDispatcher, Recipient
+
+
+class FakeBot:
+    """Records send_message calls; `failures` maps chat_id -> exceptions to raise first"""
+
+    def __init__(self, failures=None):
+        self.failures = {chat: list(errors) for chat, errors in (failures or {}).items()}
+        self.sent = []
+        self.calls = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.calls.append((chat_id, time.monotonic()))
+        errors = self.failures.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append(chat_id)
+
+
+def _dispatcher(engine, **options):
+    options = {'rate': 1000, 'burst': 1000, 'chat_interval': 0, 'concurrency': 4, **options}
+    return BroadcastDispatcher(engine, **options)
+
+
+def _recipients(count):
+    return [Recipient(user_id, 1000 + user_id) for user_id in range(1, count + 1)]
+
+
+def test_sends_to_every_recipient_and_records_status(engine):
+    dispatcher = _dispatcher(engine)
+    bot = FakeBot()
+
+    result = asyncio.run(dispatcher.send(bot, 1, _recipients(10), "hello"))
+
+    assert (result.total, result.sent, result.failed, result.blocked) == (10, 10, 0, 0)
+    assert sorted(bot.sent) == [r.telegram_id for r in _recipients(10)]
+    assert dispatcher.delivery_counts(1) == {'sent': 10}
+
+
+def test_retry_after_pauses_sending_then_delivers(engine):
+    dispatcher = _dispatcher(engine, concurrency=1)
+    bot = FakeBot(failures={1001: [RetryAfter(timedelta(seconds=0.3))]})
+
+    result = asyncio.run(dispatcher.send(bot, 1, _recipients(3), "hello"))
+
+    assert result.sent == 3
+    first_try, retry = [at for chat, at in bot.calls if chat == 1001]
+    assert retry - first_try >= 0.3
+    # Nothing else went out during the pause either
+    assert all(at >= first_try + 0.3 for chat, at in bot.calls if chat != 1001)
+
+
+def test_forbidden_marks_the_recipient_blocked_without_retrying(engine):
+    dispatcher = _dispatcher(engine)
+    bot = FakeBot(failures={1002: [Forbidden("bot was blocked by the user")]})
+
+    result = asyncio.run(dispatcher.send(bot, 1, _recipients(3), "hello"))
+
+    assert (result.sent, result.blocked) == (2, 1)
+    assert [chat for chat, _ in bot.calls].count(1002) == 1
+    assert dispatcher.delivery_counts(1) == {'sent': 2, 'blocked': 1}
+
+
+def test_resume_skips_recipients_already_delivered(engine):
+    dispatcher = _dispatcher(engine)
+    recipients = _recipients(6)
+    # A previous run delivered to the first half before the process stopped
+    dispatcher._create_deliveries(1, recipients)
+    dispatcher._record(1, [(r.telegram_id, 'sent', 1, None) for r in recipients[:3]])
+    bot = FakeBot()
+
+    result = asyncio.run(dispatcher.send(bot, 1, recipients, "hello"))
+
+    assert sorted(bot.sent) == [r.telegram_id for r in recipients[3:]]
+    assert (result.total, result.sent) == (6, 6)
+    assert dispatcher.delivery_counts(1) == {'sent': 6}
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from database.models import Case
+from database.case_list import load_case_page, count_cases, case_list_version
+
+
+def _add_cases(session, count, now, never_updated=()):
+    session.bulk_insert_mappings(Case, [
+        {'case_number': f'CL-{i}', 'title': 'Case', 'client_name': 'Client', 'status': 'active',
+         'assigned_to': 1, 'created_at': now - timedelta(days=1, minutes=i),
+         'updated_at': now - timedelta(minutes=i)}
+        for i in range(count)
+    ])
+    # The model's default would fill in an updated_at left out of the insert
+    session.execute(update(Case).where(Case.case_number.in_([f'CL-{i}' for i in never_updated]))
+                    .values(updated_at=None))
+    session.commit()
+
+
+def _all_pages(session, **filters):
+    page = load_case_page(session, limit=3, **filters)
+    cases = list(page.cases)
+    while page.next_cursor:
+        page = load_case_page(session, cursor=page.next_cursor, limit=3, **filters)
+        cases += page.cases
+    return cases
+
+
+def test_cases_never_updated_are_listed_by_creation_time(session):
+    now = datetime(2026, 3, 2, 12, 0)
+    _add_cases(session, 8, now, never_updated={2, 5})
+
+    cases = _all_pages(session)
+
+    assert [case.case_number for case in cases] == [f'CL-{i}' for i in (0, 1, 3, 4, 6, 7, 2, 5)]
+    assert cases[-1].updated_at == now - timedelta(days=1, minutes=5)
+
+
+def test_count_and_version_agree_with_the_pages(session):
+    _add_cases(session, 7, datetime(2026, 3, 2, 12, 0), never_updated={0, 6})
+
+    listed = _all_pages(session, assigned_to=1)
+
+    assert count_cases(session) == count_cases(session, assigned_to=1) == len(listed) == 7
+    assert case_list_version(session, assigned_to=1)[0] == 7
+
+
+def test_prev_cursor_returns_the_page_before(session):
+    _add_cases(session, 7, datetime(2026, 3, 2, 12, 0), never_updated={3})
+
+    first = load_case_page(session, limit=3)
+    second = load_case_page(session, cursor=first.next_cursor, limit=3)
+    back = load_case_page(session, cursor=second.prev_cursor, direction='prev', limit=3)
+
+    assert back.cases == first.cases
+    assert back.prev_cursor is None or back.prev_cursor == first.prev_cursor
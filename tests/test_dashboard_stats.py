@@ -0,0 +1,61 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from database.models import User, TimeEntry
+from database.agenda import load_agenda
+from database.billing_rollups import BillingRollups
+from database.dashboard_stats import load_dashboard_stats
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    """Run with the local clock five hours behind UTC"""
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _log_time(session, rollups, user_id, when_utc, minutes):
+    entry = TimeEntry(user_id=user_id, date=when_utc, duration_minutes=minutes, billable=True,
+                      description='Drafting')
+    session.add(entry)
+    rollups.record(session, entry)
+    session.commit()
+
+
+def test_time_counters_use_the_utc_day_entries_are_stamped_with(session, engine, new_york):
+    rollups = BillingRollups(engine)
+    user = User(telegram_id=1, full_name='Late Worker')
+    session.add(user)
+    session.commit()
+    # 21:30 on 2 March in New York is 02:30 on 3 March UTC
+    now = datetime(2026, 3, 2, 21, 30)
+    _log_time(session, rollups, user.id, datetime(2026, 3, 3, 2, 0), 60)
+    _log_time(session, rollups, user.id, datetime(2026, 3, 2, 15, 0), 30)
+
+    stats = load_dashboard_stats(session, user.id, now=now)
+    agenda = load_agenda(session, user.id, now=now)
+
+    assert stats.time_entries_today == len(agenda.time_entries) == 1
+    assert agenda.total_hours == 1.0
+    assert stats.billable_hours_month == 1.5
+
+
+def test_billable_hours_reset_with_the_utc_month(session, engine, new_york):
+    rollups = BillingRollups(engine)
+    user = User(telegram_id=1, full_name='Month End')
+    session.add(user)
+    session.commit()
+    _log_time(session, rollups, user.id, datetime(2026, 3, 31, 23, 0), 120)
+    _log_time(session, rollups, user.id, datetime(2026, 4, 1, 1, 0), 45)
+
+    # 31 March, 22:00 in New York is already April in UTC
+    stats = load_dashboard_stats(session, user.id, now=datetime(2026, 3, 31, 22, 0))
+
+    assert stats.billable_hours_month == pytest.approx(0.75)
+    assert stats.billable_hours_month == pytest.approx(
+        load_dashboard_stats(session, user.id, now=datetime(2026, 4, 1, 12, 0)).billable_hours_month)
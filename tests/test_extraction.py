@@ -0,0 +1,65 @@
+import os
+import time
+import asyncio
+
+import pytest
+
+from bot.extraction import ExtractionPool, ExtractionError
+
+
+def _sleep_then_return(seconds, value):
+    time.sleep(seconds)
+    return value
+
+
+def _crash():
+    os._exit(1)
+
+
+@pytest.fixture
+def pool():
+    pool = ExtractionPool(max_workers=2, timeout=0.5)
+    yield pool
+    pool.shutdown()
+
+
+def test_a_timeout_recycles_the_pool_and_retries_the_job_killed_with_it(pool):
+    async def innocent():
+        # Still running when the stuck job times out at 0.5s and its pool is torn down
+        await asyncio.sleep(0.3)
+        return await pool._run(_sleep_then_return, 0.35, 'innocent')
+
+    async def main():
+        return await asyncio.gather(pool._run(_sleep_then_return, 30, 'stuck'), innocent(),
+                                    return_exceptions=True)
+
+    started = time.monotonic()
+    stuck, result = asyncio.run(main())
+
+    assert isinstance(stuck, ExtractionError)
+    assert result == 'innocent'
+    assert time.monotonic() - started >= 0.85  # ran again on the new pool
+    assert (pool.timeouts, pool.recycles, pool.completed) == (1, 1, 1)
+
+
+def test_timed_out_generations_are_forgotten_once_collected(pool):
+    async def main():
+        for _ in range(5):
+            with pytest.raises(ExtractionError):
+                await pool._run(_sleep_then_return, 30, 'stuck')
+        return await pool._run(_sleep_then_return, 0, 'ok')
+
+    assert asyncio.run(main()) == 'ok'
+    assert pool.timeouts == 5
+    assert pool._timed_out == set()
+    assert pool._pending == {}
+
+
+def test_a_crashing_job_fails_without_a_retry(pool):
+    async def main():
+        with pytest.raises(ExtractionError, match='crashed'):
+            await pool._run(_crash)
+        return await pool._run(_sleep_then_return, 0, 'ok')
+
+    assert asyncio.run(main()) == 'ok'
+    assert (pool.failed, pool.recycles) == (1, 1)
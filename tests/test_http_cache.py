@@ -0,0 +1,58 @@
+import pytest
+from flask import Flask
+
+from api.http_cache import conditional_json, init_compression
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    init_compression(app)
+    app.config['version'] = 1
+    app.config['builds'] = 0
+
+    @app.route('/items')
+    def items():
+        def build():
+            app.config['builds'] += 1
+            return {'items': [{'id': i, 'title': f'Item {i}'} for i in range(200)]}
+        return conditional_json(app.config['version'], build)
+
+    return app
+
+
+def test_304_carries_the_etag_of_the_compressed_representation(app):
+    client = app.test_client()
+    first = client.get('/items', headers={'Accept-Encoding': 'gzip'})
+    etag = first.headers['ETag']
+
+    again = client.get('/items', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+
+    assert first.headers['Content-Encoding'] == 'gzip' and etag.endswith('-gzip"')
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+    assert 'Accept-Encoding' in again.headers['Vary']
+    assert app.config['builds'] == 1
+
+
+def test_304_for_an_uncompressed_representation_keeps_the_plain_etag(app):
+    client = app.test_client()
+    etag = client.get('/items', headers={'Accept-Encoding': 'identity'}).headers['ETag']
+
+    again = client.get('/items', headers={'If-None-Match': etag})
+
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+    assert not etag.endswith('-gzip"')
+
+
+def test_a_new_version_is_sent_in_full(app):
+    client = app.test_client()
+    etag = client.get('/items', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+    app.config['version'] = 2
+
+    changed = client.get('/items', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert app.config['builds'] == 2
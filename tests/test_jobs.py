@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from bot.jobs import JobQueue, jobs_table
+
+
+async def _noop(application, payload, job):
+    return None
+
+
+def _queue(engine):
+    queue = JobQueue(engine, max_attempts=2, lease_seconds=60)
+    queue.register('analysis', _noop)
+    return queue
+
+
+def _expire_lease(engine, job_id):
+    with engine.begin() as conn:
+        conn.execute(update(jobs_table).where(jobs_table.c.id == job_id).values(
+            locked_until=datetime.utcnow() - timedelta(seconds=1)))
+
+
+def test_claim_takes_queued_job_and_counts_the_attempt(engine):
+    queue = _queue(engine)
+    job_id = queue.enqueue('analysis', {'document_id': 1})
+
+    job = queue._claim()
+
+    assert job.id == job_id
+    assert job.status == 'running'
+    assert job.attempts == 1
+    assert queue._claim() is None
+
+
+def test_expired_lease_is_reclaimed_while_attempts_remain(engine):
+    queue = _queue(engine)
+    job_id = queue.enqueue('analysis', {'document_id': 1})
+    queue._claim()
+    _expire_lease(engine, job_id)
+
+    job = queue._claim()
+
+    assert job.id == job_id
+    assert job.attempts == 2
+
+
+def test_job_that_kills_its_worker_fails_after_max_attempts(engine):
+    queue = _queue(engine)
+    job_id = queue.enqueue('analysis', {'document_id': 1})
+    for _ in range(2):
+        assert queue._claim().id == job_id
+        # The process dies mid-job: no _fail(), only an expired lease
+        _expire_lease(engine, job_id)
+
+    assert queue._claim() is None
+    job = queue.get(job_id)
+    assert job.status == 'failed'
+    assert job.finished_at is not None
+    assert 'lease expired' in job.last_error
+
+
+def test_idempotency_key_reuses_the_job(engine):
+    queue = _queue(engine)
+    first = queue.enqueue('analysis', {}, idempotency_key='doc:1')
+    assert queue.enqueue('analysis', {}, idempotency_key='doc:1') == first
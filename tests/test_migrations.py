@@ -0,0 +1,34 @@
+from sqlalchemy import inspect
+
+from database.models import Base
+from database.billing_rollups import create_tables as create_billing_rollups
+from database.migrations import MIGRATIONS, HOT_LOOKUP_INDEXES, upgrade, applied_versions, check_query_plans
+
+
+def test_upgrade_applies_every_migration_once(engine):
+    Base.metadata.create_all(engine)
+
+    assert upgrade(engine) == [version for version, _, _ in MIGRATIONS]
+    assert upgrade(engine) == []
+    assert applied_versions(engine) == {version for version, _, _ in MIGRATIONS}
+
+
+def test_upgrade_creates_the_hot_lookup_indexes(engine):
+    Base.metadata.create_all(engine)
+    upgrade(engine)
+
+    inspector = inspect(engine)
+    for _, model, columns in HOT_LOOKUP_INDEXES:
+        indexed = [index['column_names'] for index in inspector.get_indexes(model.__table__.name)]
+        indexed += [unique['column_names'] for unique in inspector.get_unique_constraints(model.__table__.name)]
+        assert any(names[:len(columns)] == columns for names in indexed), (model.__table__.name, columns)
+
+
+def test_all_hot_queries_use_an_index(engine):
+    Base.metadata.create_all(engine)
+    create_billing_rollups(engine)
+    upgrade(engine)
+
+    problems = check_query_plans(engine)
+
+    assert problems == [], "\n".join(f"{' '.join(statement.split())}\n  -> {scans}" for statement, scans in problems)
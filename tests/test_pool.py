@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from flask import Flask
+
+from database.pool import init_pool
+
+
+@pytest.fixture
+def db():
+    return init_pool()
+
+
+def _registered(db):
+    return len(db.Session.registry.registry)
+
+
+def test_a_scope_shares_one_session_and_removes_it(db):
+    with db.scope() as session:
+        assert db.session() is session
+        session.connection()
+        assert session.in_transaction()
+
+    assert not session.in_transaction()
+    assert _registered(db) == 0
+
+
+def test_sessions_outside_a_scope_are_not_kept_per_thread(db):
+    def work():
+        session = db.session()
+        try:
+            return session.connection().exec_driver_sql('SELECT 1').scalar()
+        finally:
+            session.close()
+
+    async def main():
+        return await asyncio.gather(*(asyncio.to_thread(work) for _ in range(20)))
+
+    assert asyncio.run(main()) == [1] * 20
+    assert db.session() is not db.session()
+    assert _registered(db) == 0
+
+
+def test_to_thread_inside_a_scope_uses_the_scopes_session(db):
+    async def main():
+        with db.scope() as session:
+            return session, await asyncio.to_thread(db.session)
+
+    session, in_thread = asyncio.run(main())
+
+    assert in_thread is session
+    assert _registered(db) == 0
+
+
+def test_each_flask_request_gets_a_scope(db):
+    app = Flask(__name__)
+    db.init_flask(app)
+    seen = []
+
+    @app.route('/')
+    def view():
+        seen.append(db.session())
+        assert db.session() is seen[-1]
+        return 'ok'
+
+    client = app.test_client()
+    client.get('/')
+    client.get('/')
+
+    assert seen[0] is not seen[1]
+    assert _registered(db) == 0
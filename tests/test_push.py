@@ -0,0 +1,90 @@
+import json
+import asyncio
+import threading
+
+from bot.push import PushHub
+
+
+def _hubs(engine, **options):
+    """A subscribing hub and a publishing one, as in the bot and an API worker process"""
+    options = {'poll_interval': 0.05, 'keepalive': 5, **options}
+    return PushHub(engine, **options), PushHub(engine, **options)
+
+
+def _frames(frame):
+    """(event type, data) of an SSE frame, None for anything else"""
+    fields = dict(line.split(': ', 1) for line in frame.strip().splitlines() if not line.startswith(':'))
+    if 'event' not in fields:
+        return None
+    return fields['event'], json.loads(fields['data'])
+
+
+async def _read(stream, count, timeout=5):
+    events = []
+    while len(events) < count:
+        event = _frames(await asyncio.wait_for(anext(stream), timeout))
+        if event:
+            events.append(event)
+    return events
+
+
+def test_events_published_by_another_process_reach_subscribers(engine):
+    subscriber, publisher = _hubs(engine)
+
+    async def run():
+        stream = subscriber.stream()
+        assert await anext(stream) == "retry: 3000\n\n"
+        # The API publishes from a worker thread of its own process
+        thread = threading.Thread(target=lambda: [publisher.publish('notification_deleted', {'id': i})
+                                                  for i in range(3)])
+        thread.start()
+        events = await _read(stream, 3)
+        thread.join()
+        await stream.aclose()
+        return events
+
+    events = asyncio.run(run())
+
+    assert events == [('notification_deleted', {'id': i}) for i in range(3)]
+    assert publisher.stats()['published'] == 3
+    assert subscriber.stats()['subscribers'] == 0
+
+
+def test_reconnecting_clients_catch_up_from_the_table(engine):
+    subscriber, publisher = _hubs(engine)
+    first = publisher.publish('presence', {'id': 1, 'is_online': True})
+    publisher.publish('presence', {'id': 1, 'is_online': False})
+    publisher.publish('notification_deleted', {'id': 9})
+
+    async def run():
+        stream = subscriber.stream(last_event_id=first.id)
+        await anext(stream)
+        missed = await _read(stream, 2)
+        publisher.publish('notification_deleted', {'id': 10})
+        live = await _read(stream, 1)
+        await stream.aclose()
+        return missed, live
+
+    missed, live = asyncio.run(run())
+
+    assert missed == [('presence', {'id': 1, 'is_online': False}), ('notification_deleted', {'id': 9})]
+    assert live == [('notification_deleted', {'id': 10})]
+
+
+def test_clients_behind_the_trimmed_history_resync(engine):
+    subscriber, publisher = _hubs(engine, history=4)
+    for i in range(9):
+        publisher.publish('notification_deleted', {'id': i})
+
+    async def run(last_event_id):
+        stream = subscriber.stream(last_event_id=last_event_id)
+        await anext(stream)
+        event = await _read(stream, 1)
+        await stream.aclose()
+        return event
+
+    # Ids 1-4 were trimmed when id 8 was published
+    assert asyncio.run(run(1)) == [('resync', {})]
+    assert asyncio.run(run(4)) == [('notification_deleted', {'id': 4})]
+    # An id from before the table was reset
+    assert asyncio.run(run(1000)) == [('resync', {})]
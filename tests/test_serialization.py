@@ -0,0 +1,94 @@
+import json
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from api import serialization
+from api.serialization import dumps, json_response, rows_to_dicts
+from database.models import User, Case
+
+PAYLOAD = {
+    'id': 7,
+    'name': 'Adaeze Okafor',
+    'last_seen': datetime(2026, 3, 2, 9, 30, 15, 250000),
+    'filing_date': date(2026, 1, 5),
+    'deadline': None,
+    'hours': 1.5,
+    'tags': ['civil', 'urgent'],
+}
+EXPECTED = {
+    'id': 7,
+    'name': 'Adaeze Okafor',
+    'last_seen': '2026-03-02T09:30:15.250000',
+    'filing_date': '2026-01-05',
+    'deadline': None,
+    'hours': 1.5,
+    'tags': ['civil', 'urgent'],
+}
+
+
+def test_dumps_writes_datetimes_as_iso_8601():
+    pytest.importorskip('orjson')
+
+    assert json.loads(dumps(PAYLOAD)) == EXPECTED
+
+
+def test_dumps_without_orjson_gives_the_same_json(monkeypatch):
+    monkeypatch.setattr(serialization, 'orjson', None)
+
+    encoded = dumps(PAYLOAD)
+
+    assert isinstance(encoded, bytes)
+    assert json.loads(encoded) == EXPECTED
+
+
+def test_dumps_rejects_unknown_types(monkeypatch):
+    monkeypatch.setattr(serialization, 'orjson', None)
+
+    with pytest.raises(TypeError):
+        dumps({'value': object()})
+
+
+def test_json_response():
+    with Flask(__name__).app_context():
+        response = json_response({'created': datetime(2026, 3, 2)}, status=201)
+
+    assert (response.status_code, response.mimetype) == (201, 'application/json')
+    assert json.loads(response.get_data()) == {'created': '2026-03-02T00:00:00'}
+
+
+def test_rows_to_dicts_maps_columns_in_select_order():
+    Row = namedtuple('Row', ['id', 'title'])
+
+    assert rows_to_dicts([Row(1, 'Lease'), (2, 'Probate')], ['id', 'title']) == [
+        {'id': 1, 'title': 'Lease'}, {'id': 2, 'title': 'Probate'},
+    ]
+
+
+def test_cases_endpoint_serializes_every_page(server, client, add_user):
+    telegram_id = add_user()
+    now = datetime(2026, 3, 2, 9, 30)
+    with server.db.scope() as session:
+        user_id = session.query(User.id).filter_by(telegram_id=telegram_id).scalar()
+        session.bulk_insert_mappings(Case, [
+            {'case_number': f'SER-{i}', 'title': 'Matter', 'client_name': 'Client', 'status': 'active',
+             'assigned_to': user_id, 'filing_date': now, 'updated_at': now - timedelta(minutes=i)}
+            for i in range(25)
+        ])
+        session.commit()
+
+    cases, cursor = [], None
+    while True:
+        response = client.get(f'/api/cases/{telegram_id}?limit=10' + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        page = json.loads(response.get_data())
+        cases += page['cases']
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    assert [case['case_number'] for case in cases] == [f'SER-{i}' for i in range(25)]
+    assert cases[0]['filing_date'] == '2026-03-02T09:30:00'
+    assert cases[0]['next_court_date'] is None
@@ -0,0 +1,100 @@
+import json
+import time
+import socket
+import threading
+
+import pytest
+
+pytest.importorskip('starlette')
+uvicorn = pytest.importorskip('uvicorn')
+
+from starlette.testclient import TestClient
+from telegram.ext import Application, MessageHandler, filters
+
+from bot.load_test import LocalRequest, synthetic_updates
+from bot.webhook import create_app, replay, SECRET_HEADER, DEFAULT_PATH
+
+
+def _application(handled):
+    application = Application.builder().token('1:webhook-test').request(LocalRequest(latency=0)).updater(None).build()
+
+    async def record(update, context):
+        handled.append(update.update_id)
+
+    application.add_handler(MessageHandler(filters.ALL, record))
+    return application
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_posted_updates_reach_the_application(tmp_path):
+    handled = []
+    record_path = tmp_path / 'updates.jsonl'
+    app = create_app(_application(handled), secret_token='s3cret', record_path=str(record_path))
+    updates = synthetic_updates(20, chats=5, slow_share=0)
+
+    with TestClient(app) as client:
+        statuses = [client.post(DEFAULT_PATH, json=data, headers={SECRET_HEADER: 's3cret'}).status_code
+                    for data in updates]
+        _wait_for(lambda: len(handled) == len(updates))
+
+    assert statuses == [200] * len(updates)
+    assert sorted(handled) == [data['update_id'] for data in updates]
+    assert [json.loads(line) for line in record_path.read_text().splitlines()] == updates
+
+
+def test_rejects_wrong_secret_and_malformed_updates():
+    handled = []
+    app = create_app(_application(handled), secret_token='s3cret')
+    update = synthetic_updates(1, chats=1, slow_share=0)[0]
+
+    with TestClient(app) as client:
+        forged = client.post(DEFAULT_PATH, json=update, headers={SECRET_HEADER: 'guess'})
+        missing = client.post(DEFAULT_PATH, json=update)
+        malformed = client.post(DEFAULT_PATH, content=b'{not json', headers={SECRET_HEADER: 's3cret'})
+
+    assert (forged.status_code, missing.status_code, malformed.status_code) == (403, 403, 400)
+    assert handled == []
+
+
+def test_replay_posts_recorded_updates_to_a_running_server(tmp_path):
+    handled = []
+    updates_file = tmp_path / 'recorded.jsonl'
+    updates = synthetic_updates(50, chats=10, slow_share=0)
+    updates_file.write_text(''.join(json.dumps(data) + '\n' for data in updates) + '\n')
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(
+        create_app(_application(handled), secret_token='s3cret'), host='127.0.0.1', port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        _wait_for(lambda: server.started)
+        statuses = replay(str(updates_file), url=f'http://127.0.0.1:{port}{DEFAULT_PATH}', secret_token='s3cret')
+        _wait_for(lambda: len(handled) == len(updates))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+    assert statuses == {200: len(updates)}
+    assert sorted(handled) == [data['update_id'] for data in updates]
+
+
+def test_events_answer_the_cors_preflight():
+    app = create_app(_application([]))
+    headers = {'Origin': 'https://mini-app.example', 'Access-Control-Request-Method': 'GET',
+               'Access-Control-Request-Headers': 'ngrok-skip-browser-warning,last-event-id'}
+
+    with TestClient(app) as client:
+        response = client.options('/api/events', headers=headers)
+
+    assert response.status_code == 204
+    assert response.headers['Access-Control-Allow-Origin'] == '*'
+    assert response.headers['Access-Control-Allow-Headers'] == 'ngrok-skip-browser-warning,last-event-id'